@@ -32,7 +32,9 @@ from aidial_assistant.application.assistant_application import (  # noqa: E402
     AssistantApplication,
 )
 
-app.add_chat_completion(
-    "assistant",
-    AssistantApplication(config_dir, tools_supporting_deployments),
+assistant_application = AssistantApplication(
+    config_dir, tools_supporting_deployments
 )
+app.add_chat_completion("assistant", assistant_application)
+app.add_event_handler("startup", assistant_application.astart)
+app.add_event_handler("shutdown", assistant_application.aclose)
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+
+from aidial_assistant.application.project_conf import AddonWarmUpConf
+from aidial_assistant.commands.compiled_plugin import CompiledPluginCache
+from aidial_assistant.utils.metadata_cache import MetadataCache
+from aidial_assistant.utils.open_ai_plugin import get_open_ai_plugin_info
+from aidial_assistant.utils.spec_cache import SpecCache
+
+logger = logging.getLogger(__name__)
+
+
+class AddonWarmUp:
+    """Loads and compiles the configured addons on startup and revalidates them periodically.
+    The startup handler waits for the initial load, so the app isn't reported ready before it's done.
+    Addons that fail to load are logged and skipped: they're loaded on demand as usual.
+    """
+
+    def __init__(
+        self,
+        conf: AddonWarmUpConf,
+        load_timeout: float,
+        cache: MetadataCache,
+        spec_cache: SpecCache | None = None,
+        compiled_plugins: CompiledPluginCache | None = None,
+    ):
+        self.conf = conf
+        self.load_timeout = load_timeout
+        self.cache = cache
+        self.spec_cache = spec_cache
+        self.compiled_plugins = compiled_plugins
+        self._refresh_task: asyncio.Task | None = None
+
+    async def astart(self):
+        if not self.conf.urls:
+            return
+
+        await self.load()
+        if self.conf.refresh_interval is not None:
+            self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def aclose(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    async def load(self, revalidate: bool = False) -> int:
+        """Returns the number of the addons loaded successfully."""
+        results = await asyncio.gather(
+            *(self._load(url, revalidate) for url in self.conf.urls),
+            return_exceptions=True,
+        )
+
+        loaded = 0
+        for url, result in zip(self.conf.urls, results):
+            if isinstance(result, Exception):
+                logger.warning(
+                    f"Failed to warm up addon {url}", exc_info=result
+                )
+            else:
+                loaded += 1
+
+        logger.info(f"Warmed up {loaded} of {len(self.conf.urls)} addons")
+        return loaded
+
+    async def _load(self, url: str, revalidate: bool):
+        info = await asyncio.wait_for(
+            get_open_ai_plugin_info(
+                url, self.cache, revalidate, self.spec_cache
+            ),
+            self.load_timeout,
+        )
+        if self.compiled_plugins is not None:
+            self.compiled_plugins.get(info)
+
+    async def _refresh(self):
+        while True:
+            await asyncio.sleep(self.conf.refresh_interval)  # type: ignore
+            await self.load(revalidate=True)
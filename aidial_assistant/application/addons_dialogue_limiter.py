@@ -1,3 +1,6 @@
+import hashlib
+import json
+
 from typing_extensions import override
 
 from aidial_assistant.chain.command_chain import (
@@ -10,25 +13,68 @@ from aidial_assistant.model.model_client import (
 )
 
 
+def _message_key(message: ChatCompletionMessageParam) -> str:
+    return hashlib.sha256(
+        json.dumps(message, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def _max_message_tokens(message: ChatCompletionMessageParam) -> int:
+    # Without a local tokenizer: a token spans at least one byte,
+    # and the serialized message covers the chat markup as well.
+    return len(json.dumps(message).encode())
+
+
+def _common_prefix_length(first: list, second: list) -> int:
+    length = 0
+    for first_item, second_item in zip(first, second):
+        if first_item != second_item:
+            break
+        length += 1
+
+    return length
+
+
 class AddonsDialogueLimiter(ModelRequestLimiter):
     def __init__(self, max_dialogue_tokens: int, model_client: ModelClient):
         self.max_dialogue_tokens = max_dialogue_tokens
         self.model_client = model_client
 
         self._dialogue_tokens = 0
+        self._initial_messages: list[ChatCompletionMessageParam] | None = None
         self._initial_tokens: int | None = None
+        # Prompt sizes reported by the model for the initial and the last verified messages
+        self._initial_prompt_tokens: int | None = None
+        self._last_messages: list[ChatCompletionMessageParam] = []
+        self._last_prompt_tokens: int | None = None
+        # Running total of the messages from the previous count
+        self._tokens = 0
+        self._message_keys: list[str] = []
+        self._message_tokens: dict[str, int] = {}
 
     @override
     async def verify_limit(self, messages: list[ChatCompletionMessageParam]):
+        estimated_tokens = await self._estimate_dialogue_tokens(messages)
+        # Chains may extend the same list on every step, so the limiter keeps snapshots
+        self._last_messages = list(messages)
+        self._last_prompt_tokens = None
+        if self._initial_messages is None:
+            self._initial_messages = self._last_messages
+            return
+
+        if (
+            estimated_tokens is not None
+            and estimated_tokens <= self.max_dialogue_tokens
+        ):
+            return
+
         if self._initial_tokens is None:
-            self._initial_tokens = await self.model_client.count_tokens(
-                messages
+            self._initial_tokens = await self._count_tokens(
+                self._initial_messages
             )
-            return
 
         self._dialogue_tokens = (
-            await self.model_client.count_tokens(messages)
-            - self._initial_tokens
+            await self._count_tokens(messages) - self._initial_tokens
         )
 
         if self._dialogue_tokens > self.max_dialogue_tokens:
@@ -36,3 +82,80 @@ class AddonsDialogueLimiter(ModelRequestLimiter):
                 f"Addons dialogue limit exceeded. Max tokens: {self.max_dialogue_tokens},"
                 f" actual tokens: {self._dialogue_tokens}."
             )
+
+    @override
+    def on_prompt_tokens(self, prompt_tokens: int):
+        # The reported size is the baseline only if it is reported for the initial messages
+        if self._last_messages == self._initial_messages:
+            self._initial_prompt_tokens = prompt_tokens
+        self._last_prompt_tokens = prompt_tokens
+
+    @override
+    def remaining_tokens(self) -> int | None:
+        dialogue_tokens = (
+            self._dialogue_tokens
+            if self._initial_prompt_tokens is None
+            or self._last_prompt_tokens is None
+            else self._last_prompt_tokens - self._initial_prompt_tokens
+        )
+
+        return max(self.max_dialogue_tokens - dialogue_tokens, 0)
+
+    async def _estimate_dialogue_tokens(
+        self, messages: list[ChatCompletionMessageParam]
+    ) -> int | None:
+        """Returns the dialogue size based on the prompt size reported for the previous step
+        and the size of the messages added since. Returns None if the model hasn't reported it.
+        """
+        if (
+            self._initial_prompt_tokens is None
+            or self._last_prompt_tokens is None
+        ):
+            return None
+
+        common_length = _common_prefix_length(self._last_messages, messages)
+        added_tokens = 0
+        for message in messages[common_length:]:
+            added_tokens += (
+                await self.model_client.count_message_tokens(message)
+                if self.model_client.counts_tokens_locally
+                else _max_message_tokens(message)
+            )
+
+        return (
+            self._last_prompt_tokens
+            - self._initial_prompt_tokens
+            + added_tokens
+        )
+
+    async def _count_tokens(
+        self, messages: list[ChatCompletionMessageParam]
+    ) -> int:
+        if not self.model_client.counts_tokens_locally:
+            # The model endpoint counts whole requests only, so the messages are counted in one request
+            return await self.model_client.count_tokens(messages)
+
+        return await self._count_tokens_incrementally(messages)
+
+    async def _count_tokens_incrementally(
+        self, messages: list[ChatCompletionMessageParam]
+    ) -> int:
+        """Counts only the messages that differ from the previous count.
+        Chains append messages to the dialogue, but the last message may be rewritten
+        (e.g. by a protocol reminder), so the diverged tail of the previous count is subtracted.
+        """
+        keys = [_message_key(message) for message in messages]
+        common_length = _common_prefix_length(self._message_keys, keys)
+
+        for key in self._message_keys[common_length:]:
+            self._tokens -= self._message_tokens[key]
+
+        for key, message in zip(keys[common_length:], messages[common_length:]):
+            if key not in self._message_tokens:
+                self._message_tokens[
+                    key
+                ] = await self.model_client.count_message_tokens(message)
+            self._tokens += self._message_tokens[key]
+
+        self._message_keys = keys
+        return self._tokens
@@ -3,6 +3,7 @@ from pathlib import Path
 from typing import NamedTuple
 
 from aidial_assistant.application.project_conf import (
+    AddonsConf,
     ChatConf,
     OpenAIConf,
     read_conf,
@@ -12,6 +13,7 @@ from aidial_assistant.application.project_conf import (
 class Args(NamedTuple):
     chat_conf: ChatConf
     openai_conf: OpenAIConf
+    addons_conf: AddonsConf
 
 
 def add_yaml_conf(
@@ -41,15 +43,29 @@ def parse_args(config_dir: Path) -> Args:
         default=str(config_dir / "open_ai.yaml"),
         help="Path to OpenIA configuration file",
     )
+    add_yaml_conf(
+        parser,
+        "--addons-conf",
+        default=str(config_dir / "addons.yaml"),
+        help="Path to addons configuration file",
+    )
 
     parsed_args, _ = parser.parse_known_args()
 
     chat_conf = read_conf(ChatConf, Path(parsed_args.chat_conf))
     openai_conf = read_conf(OpenAIConf, Path(parsed_args.openai_conf))
+    addons_conf_path = Path(parsed_args.addons_conf)
+    # The addons settings are optional, the defaults apply without the file
+    addons_conf = (
+        read_conf(AddonsConf, addons_conf_path)
+        if addons_conf_path.exists()
+        else AddonsConf()
+    )
 
     args = Args(
         chat_conf=chat_conf,
         openai_conf=openai_conf,
+        addons_conf=addons_conf,
     )
 
     return args
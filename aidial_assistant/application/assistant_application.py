@@ -6,10 +6,10 @@ from aidial_sdk.chat_completion import FinishReason
 from aidial_sdk.chat_completion.base import ChatCompletion
 from aidial_sdk.chat_completion.request import Addon, Message, Request, Role
 from aidial_sdk.chat_completion.response import Response
-from openai.lib.azure import AsyncAzureOpenAI
 from openai.types.chat import ChatCompletionToolParam
 from pydantic import BaseModel
 
+from aidial_assistant.application.addon_warm_up import AddonWarmUp
 from aidial_assistant.application.addons_dialogue_limiter import (
     AddonsDialogueLimiter,
 )
@@ -27,32 +27,49 @@ from aidial_assistant.chain.command_chain import (
     CommandDict,
 )
 from aidial_assistant.chain.history import History, ScopedMessage
+from aidial_assistant.commands.addon_context import AddonContext
+from aidial_assistant.commands.compiled_plugin import CompiledPluginCache
 from aidial_assistant.commands.reply import Reply
 from aidial_assistant.commands.run_plugin import PluginInfo, RunPlugin
 from aidial_assistant.commands.run_tool import RunTool
+from aidial_assistant.model.client_pool import OpenAIClientPool
+from aidial_assistant.model.completion_cache import CompletionCache
 from aidial_assistant.model.model_client import (
     ModelClient,
     ReasonLengthException,
 )
+from aidial_assistant.model.rate_limiter import AdmissionController
+from aidial_assistant.model.sse_transport import SSETransport
+from aidial_assistant.model.token_count_cache import TokenCountCache
+from aidial_assistant.model.tokenizer import TokenizerRegistry
+from aidial_assistant.open_api.bulkhead import Bulkheads
+from aidial_assistant.open_api.response_cache import ResponseCache
 from aidial_assistant.tools_chain.tools_chain import (
     CommandToolDict,
     ToolsChain,
     convert_commands_to_tools,
 )
+from aidial_assistant.utils.deadline import deadline_scope
 from aidial_assistant.utils.exceptions import (
     RequestParameterValidationError,
     unhandled_exception_handler,
 )
+from aidial_assistant.utils.metadata_cache import MetadataCache
 from aidial_assistant.utils.open_ai import construct_tool
 from aidial_assistant.utils.open_ai_plugin import (
     AddonTokenSource,
-    get_open_ai_plugin_info,
+    get_open_ai_plugin_infos,
     get_plugin_auth,
 )
+from aidial_assistant.utils.requests import close_session, open_session
+from aidial_assistant.utils.spec_cache import SpecCache
 from aidial_assistant.utils.state import State, parse_history
 
 logger = logging.getLogger(__name__)
 
+# 2023-12-01-preview is needed to support tools
+API_VERSION = "2023-12-01-preview"
+
 
 class AddonReference(BaseModel):
     name: str | None
@@ -95,6 +112,29 @@ def _validate_messages(messages: list[Message]) -> None:
         )
 
 
+def _get_request_timeout(
+    request: Request, request_timeout: float, header: str
+) -> float:
+    """Returns the time limit of the request. The header can only shorten the configured one."""
+    value = request.headers.get(header)
+    if value is None:
+        return request_timeout
+
+    try:
+        timeout = float(value)
+    except ValueError:
+        timeout = 0
+
+    # Also rejects NaN
+    if not timeout > 0:
+        raise RequestParameterValidationError(
+            f"The {header} header must be a positive number of seconds.",
+            param=header,
+        )
+
+    return min(timeout, request_timeout)
+
+
 def _construct_tool(name: str, description: str) -> ChatCompletionToolParam:
     return construct_tool(
         name,
@@ -134,6 +174,84 @@ class AssistantApplication(ChatCompletion):
     ):
         self.args = parse_args(config_dir)
         self.tools_supporting_deployments = tools_supporting_deployments
+        self.tokenizer_registry = TokenizerRegistry.from_conf(
+            self.args.openai_conf.tokenizers
+        )
+        token_count_cache_conf = self.args.openai_conf.token_count_cache
+        self.token_count_cache = TokenCountCache(
+            token_count_cache_conf.max_entries,
+            token_count_cache_conf.max_bytes,
+        )
+        self.client_pool = OpenAIClientPool(
+            self.args.openai_conf.connection_pool
+        )
+        self.admission_controllers = {
+            deployment: AdmissionController(deployment, conf)
+            for deployment, conf in self.args.openai_conf.rate_limits.items()
+        }
+        self.metadata_cache = MetadataCache(
+            self.args.addons_conf.metadata_cache
+        )
+        spec_cache_directory = self.args.addons_conf.spec_cache.directory
+        self.spec_cache = (
+            None
+            if spec_cache_directory is None
+            else SpecCache(spec_cache_directory)
+        )
+        compiled_plugin_cache_conf = self.args.addons_conf.compiled_plugin_cache
+        self.compiled_plugins = CompiledPluginCache(
+            compiled_plugin_cache_conf.max_entries,
+            compiled_plugin_cache_conf.max_bytes,
+        )
+        self.addon_warm_up = AddonWarmUp(
+            self.args.addons_conf.warm_up,
+            self.args.addons_conf.load_timeout,
+            self.metadata_cache,
+            self.spec_cache,
+            self.compiled_plugins,
+        )
+        response_cache_conf = self.args.addons_conf.response_cache
+        self.addon_context = AddonContext(
+            max_response_bytes=self.args.addons_conf.max_response_bytes,
+            max_concurrent_commands=self.args.addons_conf.max_concurrent_commands,
+            response_cache=ResponseCache(response_cache_conf)
+            if response_cache_conf.enabled
+            else None,
+            bulkheads=Bulkheads(self.args.addons_conf.bulkheads),
+            compiled_plugins=self.compiled_plugins,
+        )
+        completion_cache_conf = self.args.openai_conf.completion_cache
+        self.completion_cache = CompletionCache.create(completion_cache_conf)
+        self.completion_cache_deployments = set(
+            completion_cache_conf.deployments
+        )
+
+    async def astart(self):
+        await open_session(self.args.addons_conf.http_client)
+        await self.addon_warm_up.astart()
+
+    async def aclose(self):
+        await self.client_pool.aclose()
+        await self.addon_warm_up.aclose()
+        await self.metadata_cache.aclose()
+        await close_session()
+
+    async def _create_transport(
+        self, request: Request, admitted: bool
+    ) -> SSETransport | None:
+        if request.model not in self.args.openai_conf.sse_transport_deployments:
+            return None
+
+        endpoint = self.args.openai_conf.api_base
+        return SSETransport(
+            http_client=await self.client_pool.get_http_client(
+                endpoint, API_VERSION
+            ),
+            endpoint=endpoint,
+            api_version=API_VERSION,
+            api_key=request.api_key,
+            admitted=admitted,
+        )
 
     @unhandled_exception_handler
     async def chat_completion(
@@ -142,15 +260,46 @@ class AssistantApplication(ChatCompletion):
         _validate_messages(request.messages)
         addon_references = _validate_addons(request.addons)
         chat_args = _get_request_args(request)
+        deadline_conf = self.args.chat_conf.deadline
+        timeout = _get_request_timeout(
+            request, self.args.openai_conf.request_timeout, deadline_conf.header
+        )
+
+        with deadline_scope(timeout, deadline_conf.reserve):
+            await self._chat_completion(
+                request, response, addon_references, chat_args
+            )
 
+    async def _chat_completion(
+        self,
+        request: Request,
+        response: Response,
+        addon_references: list[AddonReference],
+        chat_args: dict[str, str],
+    ) -> None:
+        admission_controller = (
+            None
+            if request.model is None
+            else self.admission_controllers.get(request.model)
+        )
         model = ModelClient(
-            client=AsyncAzureOpenAI(
-                azure_endpoint=self.args.openai_conf.api_base,
+            client=await self.client_pool.get_client(
+                endpoint=self.args.openai_conf.api_base,
+                api_version=API_VERSION,
                 api_key=request.api_key,
-                # 2023-12-01-preview is needed to support tools
-                api_version="2023-12-01-preview",
+                # The admission controller retries rate limited requests itself
+                admitted=admission_controller is not None,
             ),
             model_args=chat_args,
+            tokenizer=self.tokenizer_registry.get(request.model),
+            token_count_cache=self.token_count_cache,
+            transport=await self._create_transport(
+                request, admitted=admission_controller is not None
+            ),
+            admission_controller=admission_controller,
+            completion_cache=self.completion_cache
+            if request.model in self.completion_cache_deployments
+            else None,
         )
 
         token_source = AddonTokenSource(
@@ -161,8 +310,13 @@ class AssistantApplication(ChatCompletion):
         plugins: list[PluginInfo] = []
         # DIAL Core has own names for addons, so in stages we need to map them to the names used by the user
         addon_name_mapping: dict[str, str] = {}
-        for addon_reference in addon_references:
-            info = await get_open_ai_plugin_info(addon_reference.url)
+        infos = await get_open_ai_plugin_infos(
+            [addon_reference.url for addon_reference in addon_references],
+            self.args.addons_conf.load_timeout,
+            self.metadata_cache,
+            self.spec_cache,
+        )
+        for addon_reference, info in zip(addon_references, infos):
             plugins.append(
                 PluginInfo(
                     info=info,
@@ -182,11 +336,21 @@ class AssistantApplication(ChatCompletion):
 
         if request.model in self.tools_supporting_deployments:
             await AssistantApplication._run_native_tools_chat(
-                model, plugins, addon_name_mapping, request, response
+                model,
+                plugins,
+                addon_name_mapping,
+                self.addon_context,
+                request,
+                response,
             )
         else:
             await AssistantApplication._run_emulated_tools_chat(
-                model, plugins, addon_name_mapping, request, response
+                model,
+                plugins,
+                addon_name_mapping,
+                self.addon_context,
+                request,
+                response,
             )
 
     @staticmethod
@@ -194,6 +358,7 @@ class AssistantApplication(ChatCompletion):
         model: ModelClient,
         addons: list[PluginInfo],
         addon_name_mapping: dict[str, str],
+        addon_context: AddonContext,
         request: Request,
         response: Response,
     ):
@@ -201,7 +366,12 @@ class AssistantApplication(ChatCompletion):
         max_addons_dialogue_tokens = 1000
 
         def create_command(addon: PluginInfo):
-            return lambda: RunPlugin(model, addon, max_addons_dialogue_tokens)
+            return lambda: RunPlugin(
+                model,
+                addon,
+                max_addons_dialogue_tokens,
+                addon_context,
+            )
 
         command_dict: CommandDict = {
             addon.info.ai_plugin.name_for_model: create_command(addon)
@@ -216,7 +386,10 @@ class AssistantApplication(ChatCompletion):
         command_dict[Reply.token()] = Reply
 
         chain = CommandChain(
-            model_client=model, name="ASSISTANT", command_dict=command_dict
+            model_client=model,
+            name="ASSISTANT",
+            command_dict=command_dict,
+            max_concurrent_commands=addon_context.max_concurrent_commands,
         )
         addon_descriptions = {
             addon.info.ai_plugin.name_for_model: addon.info.open_api.info.description
@@ -274,6 +447,7 @@ class AssistantApplication(ChatCompletion):
         model: ModelClient,
         plugins: list[PluginInfo],
         addon_name_mapping: dict[str, str],
+        addon_context: AddonContext,
         request: Request,
         response: Response,
     ):
@@ -284,7 +458,10 @@ class AssistantApplication(ChatCompletion):
             plugin: PluginInfo,
         ) -> Tuple[CommandConstructor, ChatCompletionToolParam]:
             return lambda: RunTool(
-                model, plugin, max_addons_dialogue_tokens
+                model,
+                plugin,
+                max_addons_dialogue_tokens,
+                addon_context,
             ), _construct_tool(
                 plugin.info.ai_plugin.name_for_model,
                 plugin.info.ai_plugin.description_for_human,
@@ -294,7 +471,11 @@ class AssistantApplication(ChatCompletion):
             plugin.info.ai_plugin.name_for_model: create_command_tool(plugin)
             for plugin in plugins
         }
-        chain = ToolsChain(model, commands)
+        chain = ToolsChain(
+            model,
+            commands,
+            max_concurrent_commands=addon_context.max_concurrent_commands,
+        )
 
         choice = response.create_single_choice()
         choice.open()
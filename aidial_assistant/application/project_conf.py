@@ -2,8 +2,17 @@ from pathlib import Path
 from typing import Type, TypeVar
 
 import yaml
-from pydantic import BaseModel, PositiveInt, parse_obj_as
+from pydantic import BaseModel, PositiveFloat, PositiveInt, parse_obj_as
 
+from aidial_assistant.model.client_pool import ConnectionPoolConf
+from aidial_assistant.model.completion_cache import CompletionCacheConf
+from aidial_assistant.model.rate_limiter import RateLimitConf
+from aidial_assistant.model.tokenizer import TokenizerConf
+from aidial_assistant.open_api.bulkhead import BulkheadsConf
+from aidial_assistant.open_api.response_cache import ResponseCacheConf
+from aidial_assistant.utils.cache import CacheConf
+from aidial_assistant.utils.metadata_cache import MetadataCacheConf
+from aidial_assistant.utils.requests import HTTPClientConf
 from aidial_assistant.utils.yaml_loader import Loader
 
 
@@ -12,10 +21,58 @@ class OpenAIConf(BaseModel):
     temperature: float
     request_timeout: int
     api_base: str
+    tokenizers: list[TokenizerConf] = []
+    token_count_cache: CacheConf = CacheConf()
+    connection_pool: ConnectionPoolConf = ConnectionPoolConf()
+    sse_transport_deployments: list[str] = []
+    """Deployments streamed by parsing the SSE protocol directly instead of using the openai client."""
+    rate_limits: dict[str, RateLimitConf] = {}
+    """Admission control per deployment. Requests to other deployments are sent as is."""
+    completion_cache: CompletionCacheConf = CompletionCacheConf()
+
+
+class DeadlineConf(BaseModel):
+    header: str = "x-request-timeout"
+    """Request header with the time limit of the request in seconds. It can only shorten request_timeout."""
+    reserve: PositiveFloat = 30
+    """Seconds kept for the final answer: once less is left, the addons are no longer called."""
 
 
 class ChatConf(BaseModel):
     buffer_size: PositiveInt
+    deadline: DeadlineConf = DeadlineConf()
+
+
+class SpecCacheConf(BaseModel):
+    directory: Path | None = None
+    """Directory to keep the parsed OpenAPI specs in. The cache is disabled without it."""
+
+
+class AddonWarmUpConf(BaseModel):
+    urls: list[str] = []
+    """Addons to load on startup, so that the first requests don't pay for it."""
+    refresh_interval: PositiveFloat | None = 300
+    """Seconds between the background revalidations of the addons. None disables them."""
+
+
+class AddonsConf(BaseModel):
+    load_timeout: PositiveFloat = 30
+    """Maximum time in seconds to fetch the manifest and the OpenAPI spec of an addon."""
+    metadata_cache: MetadataCacheConf = MetadataCacheConf()
+    http_client: HTTPClientConf = HTTPClientConf()
+    max_response_bytes: PositiveInt = 512 * 1024
+    """Addon responses are cut off at this size."""
+    response_cache: ResponseCacheConf = ResponseCacheConf()
+    max_concurrent_commands: PositiveInt = 1
+    """Maximum number of addon commands (or tool calls) of one model reply executed at once."""
+    bulkheads: BulkheadsConf = BulkheadsConf()
+    """Limits of the concurrent requests to each addon host, shared by all requests."""
+    warm_up: AddonWarmUpConf = AddonWarmUpConf()
+    spec_cache: SpecCacheConf = SpecCacheConf()
+    compiled_plugin_cache: CacheConf = CacheConf(
+        max_entries=256, max_bytes=64 * 1024 * 1024
+    )
+    """Addons compiled into the prompts and the tools, sized by the length of their API schemas."""
 
 
 T = TypeVar("T")
@@ -1,13 +1,18 @@
+import asyncio
 import json
 import logging
+import time
 from abc import ABC, abstractmethod
+from functools import partial
 from typing import Any, AsyncIterator, Tuple, cast
 
 from openai import BadRequestError
+from opentelemetry import metrics
 
 from aidial_assistant.application.prompts import ENFORCE_JSON_FORMAT_TEMPLATE
 from aidial_assistant.chain.callbacks.args_callback import ArgsCallback
 from aidial_assistant.chain.callbacks.chain_callback import ChainCallback
+from aidial_assistant.chain.callbacks.command_callback import CommandCallback
 from aidial_assistant.chain.callbacks.result_callback import ResultCallback
 from aidial_assistant.chain.command_result import (
     CommandInvocation,
@@ -23,6 +28,7 @@ from aidial_assistant.chain.model_response_reader import (
     CommandsReader,
     skip_to_json_start,
 )
+from aidial_assistant.chain.result_shaper import shape_responses
 from aidial_assistant.commands.base import (
     Command,
     CommandConstructor,
@@ -35,13 +41,26 @@ from aidial_assistant.json_stream.json_parser import JsonParser, string_node
 from aidial_assistant.json_stream.json_string import JsonString
 from aidial_assistant.model.model_client import (
     ChatCompletionMessageParam,
+    ExtraResultsCallback,
     ModelClient,
 )
-from aidial_assistant.utils.stream import CumulativeStream
+from aidial_assistant.utils.deadline import (
+    final_answer_scope,
+    is_nearly_exhausted,
+)
+from aidial_assistant.utils.stream import CumulativeStream, PrefetchStream
 
 logger = logging.getLogger(__name__)
 
+_meter = metrics.get_meter(__name__)
+_stream_overlap = _meter.create_histogram(
+    "command_chain.stream_overlap",
+    unit="s",
+    description="Time the commands of a model reply were executed while the reply was still streaming",
+)
+
 DEFAULT_MAX_RETRY_COUNT = 3
+DEFAULT_MAX_CONCURRENT_COMMANDS = 1
 
 # Some relatively large number to avoid CxSAST warning about potential DoS attack.
 # Later, the upper limit will be provided by the DIAL Core (proxy).
@@ -50,15 +69,62 @@ MAX_MODEL_COMPLETION_CHUNKS = 32000
 CommandDict = dict[str, CommandConstructor]
 
 
+def _record_interval(
+    intervals: list[Tuple[float, float]], started_at: float, _: asyncio.Future
+):
+    intervals.append((started_at, time.monotonic()))
+
+
+def _overlap(intervals: list[Tuple[float, float]], end: float) -> float:
+    """Returns the time covered by the intervals before the end."""
+    total = 0.0
+    covered_until = float("-inf")
+    for start, finish in sorted(intervals):
+        start = max(start, covered_until)
+        finish = min(finish, end)
+        if finish > start:
+            total += finish - start
+        covered_until = max(covered_until, finish)
+
+    return total
+
+
 class LimitExceededException(Exception):
     pass
 
 
+class DeadlineExceededException(LimitExceededException):
+    pass
+
+
+def verify_deadline():
+    if is_nearly_exhausted():
+        raise DeadlineExceededException(
+            "The time limit of the request is nearly reached."
+        )
+
+
 class ModelRequestLimiter(ABC):
     @abstractmethod
     async def verify_limit(self, messages: list[ChatCompletionMessageParam]):
         pass
 
+    def on_prompt_tokens(self, prompt_tokens: int):
+        """Called with the prompt size the model reported for the last verified messages."""
+
+    def remaining_tokens(self) -> int | None:
+        """Returns how many tokens the dialogue can grow by after the last verified messages.
+        None means the limiter doesn't track the budget."""
+        return None
+
+
+class LimiterResultsCallback(ExtraResultsCallback):
+    def __init__(self, model_request_limiter: ModelRequestLimiter):
+        self.model_request_limiter = model_request_limiter
+
+    def on_prompt_tokens(self, prompt_tokens: int):
+        self.model_request_limiter.on_prompt_tokens(prompt_tokens)
+
 
 class CommandChain:
     def __init__(
@@ -68,6 +134,7 @@ class CommandChain:
         command_dict: CommandDict,
         max_completion_tokens: int | None = None,
         max_retry_count: int = DEFAULT_MAX_RETRY_COUNT,
+        max_concurrent_commands: int = DEFAULT_MAX_CONCURRENT_COMMANDS,
     ):
         self.name = name
         self.model_client = model_client
@@ -78,6 +145,7 @@ class CommandChain:
             else {"max_tokens": max_completion_tokens}
         )
         self.max_retry_count = max_retry_count
+        self.max_concurrent_commands = max_concurrent_commands
 
     def _log_message(self, role: str, content: str | None):
         logger.debug(f"[{self.name}] {role}: {content or ''}")
@@ -97,6 +165,9 @@ class CommandChain:
         try:
             messages = history.to_protocol_messages()
             while True:
+                if not dialogue.is_empty():
+                    verify_deadline()
+
                 dialogue_turn = await self._run_with_protocol_failure_retries(
                     callback,
                     messages + dialogue.messages,
@@ -117,6 +188,11 @@ class CommandChain:
                 else history.to_user_messages()
             )
             await self._generate_result(messages, callback)
+        except DeadlineExceededException as e:
+            # The addon results gathered so far are complete, so they are all kept
+            await self._generate_result(
+                history.to_best_effort_messages(str(e), dialogue), callback
+            )
         except (BadRequestError, LimitExceededException) as e:
             if dialogue.is_empty() or (
                 isinstance(e, BadRequestError) and e.code == "429"
@@ -146,20 +222,36 @@ class CommandChain:
                 )
                 if model_request_limiter:
                     await model_request_limiter.verify_limit(all_messages)
-
-                chunk_stream = CumulativeStream(
-                    self.model_client.agenerate(
-                        all_messages, **self.model_extra_args  # type: ignore
+                    model_stream = PrefetchStream(
+                        self.model_client.agenerate(
+                            all_messages,
+                            LimiterResultsCallback(model_request_limiter),
+                            **self.model_extra_args,  # type: ignore
+                        )
                     )
-                )
+                else:
+                    model_stream = PrefetchStream(
+                        self.model_client.agenerate(
+                            all_messages, **self.model_extra_args  # type: ignore
+                        )
+                    )
+                # The model keeps streaming into the buffer while the parser waits for the commands
+                chunk_stream = CumulativeStream(model_stream)
                 try:
                     commands, responses = await self._run_commands(
-                        chunk_stream, callback
+                        chunk_stream, callback, model_stream
                     )
 
                     if responses:
                         request_text = commands_to_text(commands)
-                        response_text = responses_to_text(responses)
+                        response_text = responses_to_text(
+                            shape_responses(
+                                responses,
+                                model_request_limiter
+                                and model_request_limiter.remaining_tokens(),
+                                request_text,
+                            )
+                        )
 
                         callback.on_state(request_text, response_text)
                         return DialogueTurn(
@@ -191,6 +283,7 @@ class CommandChain:
                         )
                     )
                 finally:
+                    await model_stream.aclose()
                     self._log_message("assistant", chunk_stream.buffer)
         except (BadRequestError, LimitExceededException) as e:
             if last_error:
@@ -203,39 +296,68 @@ class CommandChain:
             raise
 
     async def _run_commands(
-        self, chunk_stream: AsyncIterator[str], callback: ChainCallback
+        self,
+        chunk_stream: AsyncIterator[str],
+        callback: ChainCallback,
+        model_stream: PrefetchStream[str],
     ) -> Tuple[list[CommandInvocation], list[CommandResult]]:
         char_stream = ChunkedCharStream(chunk_stream)
         await skip_to_json_start(char_stream)
 
         root_node = await JsonParser().parse(char_stream)
         commands: list[CommandInvocation] = []
-        responses: list[CommandResult] = []
+        executions: list[asyncio.Future[CommandResult]] = []
+        execution_intervals: list[Tuple[float, float]] = []
+        semaphore = asyncio.Semaphore(self.max_concurrent_commands)
         request_reader = CommandsReader(root_node)
-        async for invocation in request_reader.parse_invocations():
-            command_name = await invocation.parse_name()
-            command = self._create_command(command_name)
-            args = await invocation.parse_args()
-            if isinstance(command, FinalCommand):
-                if len(responses) > 0:
-                    continue
-                message = string_node(await args.get("message"))
-                await CommandChain._to_result(
-                    message
-                    if isinstance(message, JsonString)
-                    else message.to_chunks(),
-                    callback.result_callback(),
-                )
-                break
-            else:
-                response = await CommandChain._execute_command(
-                    command_name, command, args, callback
-                )
+        try:
+            async for invocation in request_reader.parse_invocations():
+                command_name = await invocation.parse_name()
+                command = self._create_command(command_name)
+                args = await invocation.parse_args()
+                if isinstance(command, FinalCommand):
+                    if len(executions) > 0:
+                        continue
+                    message = string_node(await args.get("message"))
+                    await CommandChain._to_result(
+                        message
+                        if isinstance(message, JsonString)
+                        else message.to_chunks(),
+                        callback.result_callback(),
+                    )
+                    break
+                else:
+                    execution = await CommandChain._start_command(
+                        command_name, command, args, callback, semaphore
+                    )
+                    execution.add_done_callback(
+                        partial(
+                            _record_interval,
+                            execution_intervals,
+                            time.monotonic(),
+                        )
+                    )
+                    if self.max_concurrent_commands == 1:
+                        await asyncio.wait([execution])
 
-                commands.append(
-                    cast(CommandInvocation, invocation.node.value())
+                    commands.append(
+                        cast(CommandInvocation, invocation.node.value())
+                    )
+                    executions.append(execution)
+
+            # The responses are in the order of the commands regardless of their completion order
+            responses = list(await asyncio.gather(*executions))
+            if execution_intervals:
+                _stream_overlap.record(
+                    _overlap(
+                        execution_intervals,
+                        model_stream.finished_at or time.monotonic(),
+                    )
                 )
-                responses.append(response)
+        finally:
+            for execution in executions:
+                execution.cancel()
+            await asyncio.gather(*executions, return_exceptions=True)
 
         return commands, responses
 
@@ -252,9 +374,10 @@ class CommandChain:
         messages: list[ChatCompletionMessageParam],
         callback: ChainCallback,
     ):
-        stream = self.model_client.agenerate(messages)
-
-        await CommandChain._to_result(stream, callback.result_callback())
+        # The best effort answer is given even if the time is up
+        with final_answer_scope():
+            stream = self.model_client.agenerate(messages)
+            await CommandChain._to_result(stream, callback.result_callback())
 
     @staticmethod
     def _reinforce_json_format(
@@ -293,24 +416,64 @@ class CommandChain:
             pass
 
     @staticmethod
-    async def _execute_command(
+    async def _start_command(
         name: str,
         command: Command,
         args: JsonObject,
         chain_callback: ChainCallback,
-    ) -> CommandResult:
+        semaphore: asyncio.Semaphore,
+    ) -> asyncio.Future[CommandResult]:
+        """Reads the arguments and starts the command. The arguments come from the model stream,
+        so they are read before the next command. The command stage stays open until the command completes or is cancelled.
+        """
+        command_callback = chain_callback.command_callback()
+        command_callback.__enter__()
         try:
-            with chain_callback.command_callback() as command_callback:
-                command_callback.on_command(name)
-                response = await command.execute(
-                    await CommandChain._to_args(
-                        args, command_callback.args_callback()
-                    ),
-                    command_callback.execution_callback(),
-                )
+            command_callback.on_command(name)
+            parsed_args = await CommandChain._to_args(
+                args, command_callback.args_callback()
+            )
+        except BaseException as e:
+            error = CommandChain._close_command(name, command_callback, e)
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(error)
+            return future
+
+        started = False
+
+        async def execute() -> CommandResult:
+            nonlocal started
+            started = True
+            try:
+                async with semaphore:
+                    response = await command.execute(
+                        parsed_args, command_callback.execution_callback()
+                    )
                 command_callback.on_result(response)
+            except BaseException as e:
+                return CommandChain._close_command(name, command_callback, e)
+
+            command_callback.__exit__(None, None, None)
+            return {"status": Status.SUCCESS, "response": response.text}
+
+        def close_if_not_started(_: asyncio.Future[CommandResult]):
+            # A task cancelled before its first step never runs the coroutine, e.g. if a later command is malformed
+            if not started:
+                error = asyncio.CancelledError()
+                command_callback.__exit__(type(error), error, None)
+
+        execution = asyncio.create_task(execute())
+        execution.add_done_callback(close_if_not_started)
+        return execution
+
+    @staticmethod
+    def _close_command(
+        name: str, command_callback: CommandCallback, error: BaseException
+    ) -> CommandResult:
+        """Closes the command stage with the error. Returns the error response unless the error is fatal."""
+        command_callback.__exit__(type(error), error, error.__traceback__)
+        if not isinstance(error, Exception):
+            raise error
 
-                return {"status": Status.SUCCESS, "response": response.text}
-        except Exception as e:
-            logger.exception(f"Failed to execute command {name}")
-            return {"status": Status.ERROR, "response": str(e)}
+        logger.exception(f"Failed to execute command {name}", exc_info=error)
+        return {"status": Status.ERROR, "response": str(error)}
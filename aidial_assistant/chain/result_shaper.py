@@ -0,0 +1,112 @@
+import json
+from typing import Any, Iterator, NamedTuple
+
+from aidial_assistant.chain.command_result import CommandResult
+from aidial_assistant.model.model_client import CHARS_PER_TOKEN
+from aidial_assistant.utils.text import TRUNCATION_MARKER
+
+ELLIPSIS = "..."
+
+# A result is never shaped below this size, even if the budget is exhausted:
+# the limiter is the one to decide whether the dialogue can go on.
+MIN_RESULT_CHARS = 256
+
+
+class _Limits(NamedTuple):
+    max_items: int
+    max_depth: int
+    max_string_length: int
+
+
+def _limits() -> Iterator[_Limits]:
+    """Yields progressively stricter limits."""
+    limits = _Limits(max_items=64, max_depth=8, max_string_length=1024)
+    while True:
+        yield limits
+        if limits == _Limits(1, 1, 32):
+            return
+
+        limits = _Limits(
+            max_items=max(limits.max_items // 2, 1),
+            max_depth=max(limits.max_depth - 1, 1),
+            max_string_length=max(limits.max_string_length // 2, 32),
+        )
+
+
+def _shape(value: Any, limits: _Limits, depth: int = 0) -> Any:
+    if isinstance(value, str):
+        if len(value) > limits.max_string_length:
+            return value[: limits.max_string_length] + ELLIPSIS
+        return value
+
+    if isinstance(value, list):
+        if depth >= limits.max_depth:
+            return f"[{ELLIPSIS}]"
+
+        items = [
+            _shape(item, limits, depth + 1)
+            for item in value[: limits.max_items]
+        ]
+        if len(value) > limits.max_items:
+            items.append(
+                f"{ELLIPSIS} {len(value) - limits.max_items} more items"
+            )
+        return items
+
+    if isinstance(value, dict):
+        if depth >= limits.max_depth:
+            return f"{{{ELLIPSIS}}}"
+
+        entries = list(value.items())
+        fields = {
+            key: _shape(item, limits, depth + 1)
+            for key, item in entries[: limits.max_items]
+        }
+        if len(entries) > limits.max_items:
+            fields[ELLIPSIS] = f"{len(entries) - limits.max_items} more fields"
+        return fields
+
+    return value
+
+
+def shape_result(text: str, max_chars: int) -> str:
+    """Fits the result into max_chars. JSON is reduced structurally by trimming long arrays,
+    eliding deep nesting and clipping long strings; anything else is cut off."""
+    if len(text) <= max_chars:
+        return text
+
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError:
+        value = None
+
+    if isinstance(value, (list, dict)):
+        for limits in _limits():
+            shaped = json.dumps(_shape(value, limits), ensure_ascii=False)
+            if len(shaped) <= max_chars:
+                return shaped
+
+    return (
+        text[: max(max_chars - len(TRUNCATION_MARKER), 0)] + TRUNCATION_MARKER
+    )
+
+
+def shape_responses(
+    responses: list[CommandResult],
+    remaining_tokens: int | None,
+    request_text: str = "",
+) -> list[CommandResult]:
+    """Shares the remaining dialogue budget equally between the responses.
+    The request the responses are given for is taken out of the budget first."""
+    if remaining_tokens is None or not responses:
+        return responses
+
+    budget = remaining_tokens * CHARS_PER_TOKEN - len(request_text)
+    max_chars = max(budget // len(responses), MIN_RESULT_CHARS)
+    return [
+        CommandResult(
+            status=response["status"],
+            response=shape_result(response["response"], max_chars),
+        )
+        for response in responses
+    ]
@@ -0,0 +1,28 @@
+from typing import NamedTuple
+
+from aidial_assistant.chain.command_chain import DEFAULT_MAX_CONCURRENT_COMMANDS
+from aidial_assistant.commands.compiled_plugin import (
+    CompiledPlugin,
+    CompiledPluginCache,
+    compile_plugin,
+)
+from aidial_assistant.open_api.bulkhead import Bulkheads
+from aidial_assistant.open_api.requester import DEFAULT_MAX_RESPONSE_BYTES
+from aidial_assistant.open_api.response_cache import ResponseCache
+from aidial_assistant.utils.open_ai_plugin import OpenAIPluginInfo
+
+
+class AddonContext(NamedTuple):
+    """Settings and shared state the addon commands are executed with."""
+
+    max_response_bytes: int = DEFAULT_MAX_RESPONSE_BYTES
+    max_concurrent_commands: int = DEFAULT_MAX_CONCURRENT_COMMANDS
+    response_cache: ResponseCache | None = None
+    bulkheads: Bulkheads | None = None
+    compiled_plugins: CompiledPluginCache | None = None
+
+    def compile_plugin(self, info: OpenAIPluginInfo) -> CompiledPlugin:
+        if self.compiled_plugins is None:
+            return compile_plugin(info)
+
+        return self.compiled_plugins.get(info)
@@ -0,0 +1,110 @@
+from typing import Any, NamedTuple
+
+from jinja2 import Template
+from langchain_community.tools.openapi.utils.api_models import (
+    APIOperation,
+    APIPropertyBase,
+)
+from openai.types.chat import ChatCompletionToolParam
+
+from aidial_assistant.application.prompts import (
+    ADDON_BEST_EFFORT_TEMPLATE,
+    ADDON_SYSTEM_DIALOG_MESSAGE,
+)
+from aidial_assistant.open_api.operation_selector import (
+    OpenAPIOperations,
+    collect_operations,
+)
+from aidial_assistant.open_api.requester import ParamMapping
+from aidial_assistant.utils.cache import LRUCache
+from aidial_assistant.utils.open_ai import construct_tool
+from aidial_assistant.utils.open_ai_plugin import OpenAIPluginInfo
+
+
+def _construct_property(p: APIPropertyBase) -> dict[str, Any]:
+    parameter = {
+        "type": p.type,
+        "description": p.description,
+    }
+    return {k: v for k, v in parameter.items() if v is not None}
+
+
+def construct_operation_tool(op: APIOperation) -> ChatCompletionToolParam:
+    properties = {}
+    required = []
+    for p in op.properties:
+        properties[p.name] = _construct_property(p)
+
+        if p.required:
+            required.append(p.name)
+
+    if op.request_body is not None:
+        for p in op.request_body.properties:
+            properties[p.name] = _construct_property(p)
+
+            if p.required:
+                required.append(p.name)
+
+    return construct_tool(
+        op.operation_id, op.description or "", properties, required
+    )
+
+
+class CompiledPlugin(NamedTuple):
+    """Everything derived from the plugin spec that doesn't depend on the query."""
+
+    operations: OpenAPIOperations
+    param_mappings: dict[str, ParamMapping]
+    tools: dict[str, ChatCompletionToolParam]
+    api_schema: str
+    system_message_template: Template
+    best_effort_template: Template
+
+
+def compile_plugin(info: OpenAIPluginInfo) -> CompiledPlugin:
+    ops = collect_operations(info.open_api, info.ai_plugin.api.url)
+    api_schema = "\n\n".join([op.to_typescript() for op in ops.values()])  # type: ignore
+
+    return CompiledPlugin(
+        operations=ops,
+        param_mappings={
+            name: ParamMapping.from_operation(op) for name, op in ops.items()
+        },
+        tools={name: construct_operation_tool(op) for name, op in ops.items()},
+        api_schema=api_schema,
+        system_message_template=ADDON_SYSTEM_DIALOG_MESSAGE.build(
+            command_names=ops.keys(),
+            api_description=info.ai_plugin.description_for_model,
+            api_schema=api_schema,
+        ),
+        best_effort_template=ADDON_BEST_EFFORT_TEMPLATE.build(
+            api_schema=api_schema
+        ),
+    )
+
+
+_CompiledPluginKey = tuple[str, str, str]
+
+
+class CompiledPluginCache:
+    """Compiles each plugin once per spec version."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self._plugins: LRUCache[_CompiledPluginKey, CompiledPlugin] = LRUCache(
+            max_entries,
+            max_bytes,
+            lambda key, plugin: len(plugin.api_schema),
+        )
+
+    def get(self, info: OpenAIPluginInfo) -> CompiledPlugin:
+        key = (
+            info.open_api_hash,
+            info.ai_plugin.api.url,
+            info.ai_plugin.description_for_model,
+        )
+        plugin = self._plugins.get(key)
+        if plugin is None:
+            plugin = compile_plugin(info)
+            self._plugins.put(key, plugin)
+
+        return plugin
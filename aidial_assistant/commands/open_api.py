@@ -3,12 +3,16 @@ from typing import Any
 from langchain.tools.openapi.utils.api_models import APIOperation
 from typing_extensions import override
 
+from aidial_assistant.commands.addon_context import AddonContext
 from aidial_assistant.commands.base import (
     Command,
     ExecutionCallback,
     ResultObject,
 )
-from aidial_assistant.open_api.requester import OpenAPIEndpointRequester
+from aidial_assistant.open_api.requester import (
+    OpenAPIEndpointRequester,
+    ParamMapping,
+)
 
 
 class OpenAPIChatCommand(Command):
@@ -16,14 +20,27 @@ class OpenAPIChatCommand(Command):
     def token() -> str:
         return "open-api-chat-command"
 
-    def __init__(self, op: APIOperation, plugin_auth: str | None):
+    def __init__(
+        self,
+        op: APIOperation,
+        plugin_auth: str | None,
+        param_mapping: ParamMapping | None = None,
+        context: AddonContext = AddonContext(),
+    ):
         self.op = op
         self.plugin_auth = plugin_auth
+        self.param_mapping = param_mapping
+        self.context = context
 
     @override
     async def execute(
         self, args: dict[str, Any], execution_callback: ExecutionCallback
     ) -> ResultObject:
         return await OpenAPIEndpointRequester(
-            self.op, self.plugin_auth
+            self.op,
+            self.plugin_auth,
+            self.param_mapping,
+            self.context.max_response_bytes,
+            self.context.response_cache,
+            self.context.bulkheads,
         ).execute(args)
@@ -2,15 +2,12 @@ from langchain.tools import APIOperation
 from pydantic.main import BaseModel
 from typing_extensions import override
 
-from aidial_assistant.application.prompts import (
-    ADDON_BEST_EFFORT_TEMPLATE,
-    ADDON_SYSTEM_DIALOG_MESSAGE,
-)
 from aidial_assistant.chain.command_chain import (
     CommandChain,
     CommandConstructor,
 )
 from aidial_assistant.chain.history import History, ScopedMessage
+from aidial_assistant.commands.addon_context import AddonContext
 from aidial_assistant.commands.base import (
     Command,
     ExecutionCallback,
@@ -25,7 +22,6 @@ from aidial_assistant.model.model_client import (
     ModelClient,
     ReasonLengthException,
 )
-from aidial_assistant.open_api.operation_selector import collect_operations
 from aidial_assistant.utils.open_ai import user_message
 from aidial_assistant.utils.open_ai_plugin import OpenAIPluginInfo
 
@@ -41,10 +37,12 @@ class RunPlugin(Command):
         model_client: ModelClient,
         plugin: PluginInfo,
         max_completion_tokens: int,
+        context: AddonContext = AddonContext(),
     ):
         self.model_client = model_client
         self.plugin = plugin
         self.max_completion_tokens = max_completion_tokens
+        self.context = context
 
     @staticmethod
     def token():
@@ -61,32 +59,29 @@ class RunPlugin(Command):
     async def _run_plugin(
         self, query: str, execution_callback: ExecutionCallback
     ) -> ResultObject:
-        info = self.plugin.info
-        ops = collect_operations(info.open_api, info.ai_plugin.api.url)
-        api_schema = "\n\n".join([op.to_typescript() for op in ops.values()])  # type: ignore
+        compiled_plugin = self.context.compile_plugin(self.plugin.info)
 
-        def create_command(op: APIOperation):
-            return lambda: OpenAPIChatCommand(op, self.plugin.auth)
+        def create_command(name: str, op: APIOperation):
+            return lambda: OpenAPIChatCommand(
+                op,
+                self.plugin.auth,
+                compiled_plugin.param_mappings[name],
+                self.context,
+            )
 
         command_dict: dict[str, CommandConstructor] = {}
-        for name, op in ops.items():
+        for name, op in compiled_plugin.operations.items():
             # The function is necessary to capture the current value of op.
             # Otherwise, only first op will be used for all commands
-            command_dict[name] = create_command(op)
+            command_dict[name] = create_command(name, op)
         if Reply.token() in command_dict:
             Exception(f"Operation with name '{Reply.token()}' is not allowed.")
 
         command_dict[Reply.token()] = Reply
 
         history = History(
-            assistant_system_message_template=ADDON_SYSTEM_DIALOG_MESSAGE.build(
-                command_names=ops.keys(),
-                api_description=info.ai_plugin.description_for_model,
-                api_schema=api_schema,
-            ),
-            best_effort_template=ADDON_BEST_EFFORT_TEMPLATE.build(
-                api_schema=api_schema
-            ),
+            assistant_system_message_template=compiled_plugin.system_message_template,
+            best_effort_template=compiled_plugin.best_effort_template,
             scoped_messages=[
                 ScopedMessage(message=user_message(query), user_index=0)
             ],
@@ -97,6 +92,7 @@ class RunPlugin(Command):
             name="PLUGIN:" + self.plugin.info.ai_plugin.name_for_model,
             command_dict=command_dict,
             max_completion_tokens=self.max_completion_tokens,
+            max_concurrent_commands=self.context.max_concurrent_commands,
         )
 
         callback = PluginChainCallback(execution_callback)
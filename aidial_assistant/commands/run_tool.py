@@ -1,12 +1,9 @@
 from typing import Any
 
-from langchain_community.tools.openapi.utils.api_models import (
-    APIOperation,
-    APIPropertyBase,
-)
-from openai.types.chat import ChatCompletionToolParam
+from langchain_community.tools.openapi.utils.api_models import APIOperation
 from typing_extensions import override
 
+from aidial_assistant.commands.addon_context import AddonContext
 from aidial_assistant.commands.base import (
     Command,
     ExecutionCallback,
@@ -21,55 +18,26 @@ from aidial_assistant.model.model_client import (
     ModelClient,
     ReasonLengthException,
 )
-from aidial_assistant.open_api.operation_selector import collect_operations
 from aidial_assistant.tools_chain.tools_chain import (
     CommandTool,
     CommandToolDict,
     ToolsChain,
 )
-from aidial_assistant.utils.open_ai import (
-    construct_tool,
-    system_message,
-    user_message,
-)
-
-
-def _construct_property(p: APIPropertyBase) -> dict[str, Any]:
-    parameter = {
-        "type": p.type,
-        "description": p.description,
-    }
-    return {k: v for k, v in parameter.items() if v is not None}
-
-
-def _construct_tool(op: APIOperation) -> ChatCompletionToolParam:
-    properties = {}
-    required = []
-    for p in op.properties:
-        properties[p.name] = _construct_property(p)
-
-        if p.required:
-            required.append(p.name)
-
-    if op.request_body is not None:
-        for p in op.request_body.properties:
-            properties[p.name] = _construct_property(p)
-
-            if p.required:
-                required.append(p.name)
-
-    return construct_tool(
-        op.operation_id, op.description or "", properties, required
-    )
+from aidial_assistant.utils.open_ai import system_message, user_message
 
 
 class RunTool(Command):
     def __init__(
-        self, model: ModelClient, plugin: PluginInfo, max_completion_tokens: int
+        self,
+        model: ModelClient,
+        plugin: PluginInfo,
+        max_completion_tokens: int,
+        context: AddonContext = AddonContext(),
     ):
         self.model = model
         self.plugin = plugin
         self.max_completion_tokens = max_completion_tokens
+        self.context = context
 
     @staticmethod
     def token():
@@ -81,20 +49,30 @@ class RunTool(Command):
     ) -> ResultObject:
         query = get_required_field(args, "query")
 
-        ops = collect_operations(
-            self.plugin.info.open_api, self.plugin.info.ai_plugin.api.url
-        )
+        compiled_plugin = self.context.compile_plugin(self.plugin.info)
 
-        def create_command_tool(op: APIOperation) -> CommandTool:
-            return lambda: OpenAPIChatCommand(
-                op, self.plugin.auth
-            ), _construct_tool(op)
+        def create_command_tool(name: str, op: APIOperation) -> CommandTool:
+            return (
+                lambda: OpenAPIChatCommand(
+                    op,
+                    self.plugin.auth,
+                    compiled_plugin.param_mappings[name],
+                    self.context,
+                ),
+                compiled_plugin.tools[name],
+            )
 
         commands: CommandToolDict = {
-            name: create_command_tool(op) for name, op in ops.items()
+            name: create_command_tool(name, op)
+            for name, op in compiled_plugin.operations.items()
         }
 
-        chain = ToolsChain(self.model, commands, self.max_completion_tokens)
+        chain = ToolsChain(
+            self.model,
+            commands,
+            self.max_completion_tokens,
+            self.context.max_concurrent_commands,
+        )
 
         messages = [
             system_message(self.plugin.info.ai_plugin.description_for_model),
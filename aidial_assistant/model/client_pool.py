@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from typing import NamedTuple
+
+import httpx
+from openai import DEFAULT_CONNECTION_LIMITS
+from openai.lib.azure import AsyncAzureOpenAI
+from pydantic import BaseModel, PositiveFloat, PositiveInt
+from typing_extensions import override
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPoolConf(BaseModel):
+    max_connections: PositiveInt = DEFAULT_CONNECTION_LIMITS.max_connections
+    """Concurrent model requests of the whole process to the endpoint. Requests beyond it wait for a connection."""
+    max_keepalive_connections: PositiveInt = (
+        DEFAULT_CONNECTION_LIMITS.max_keepalive_connections
+    )
+    keepalive_expiry: PositiveFloat = 30
+    idle_timeout: PositiveFloat = 600
+    """Pools that haven't been used for this number of seconds are closed.
+    Must exceed the request timeout, since closing a pool aborts the requests in flight."""
+
+
+class AdmittedAzureOpenAI(AsyncAzureOpenAI):
+    """Retries failed requests as usual, except the rate limited ones: those are retried
+    by the admission controller, which pauses all requests to the deployment."""
+
+    @override
+    def _should_retry(self, response: httpx.Response) -> bool:
+        return response.status_code != 429 and super()._should_retry(response)
+
+
+class _PoolKey(NamedTuple):
+    endpoint: str
+    api_version: str
+
+
+class _PooledClient(NamedTuple):
+    http_client: httpx.AsyncClient
+    last_used: float
+
+
+class OpenAIClientPool:
+    """Process-wide HTTP connection pools shared by the OpenAI clients of all requests.
+    A connection pool is kept per (endpoint, api_version), while the api key is set per request.
+    """
+
+    def __init__(self, conf: ConnectionPoolConf):
+        self.conf = conf
+        self._clients: dict[_PoolKey, _PooledClient] = {}
+
+    async def get_client(
+        self,
+        endpoint: str,
+        api_version: str,
+        api_key: str,
+        admitted: bool = False,
+    ) -> AsyncAzureOpenAI:
+        """Admitted clients leave the rate limited requests to the admission controller."""
+        client_class = AdmittedAzureOpenAI if admitted else AsyncAzureOpenAI
+        return client_class(
+            azure_endpoint=endpoint,
+            api_key=api_key,
+            api_version=api_version,
+            http_client=await self.get_http_client(endpoint, api_version),
+        )
+
+    async def get_http_client(
+        self, endpoint: str, api_version: str
+    ) -> httpx.AsyncClient:
+        now = time.monotonic()
+        await self._evict_idle(now)
+
+        key = _PoolKey(endpoint, api_version)
+        pooled_client = self._clients.get(key)
+        http_client = (
+            self._create_http_client()
+            if pooled_client is None
+            else pooled_client.http_client
+        )
+        self._clients[key] = _PooledClient(http_client, now)
+
+        return http_client
+
+    async def aclose(self):
+        clients = self._clients.values()
+        self._clients = {}
+        await asyncio.gather(
+            *(client.http_client.aclose() for client in clients)
+        )
+
+    def _create_http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.conf.max_connections,
+                max_keepalive_connections=self.conf.max_keepalive_connections,
+                keepalive_expiry=self.conf.keepalive_expiry,
+            ),
+            follow_redirects=True,
+        )
+
+    async def _evict_idle(self, now: float):
+        idle_keys = [
+            key
+            for key, client in self._clients.items()
+            if now - client.last_used > self.conf.idle_timeout
+        ]
+        idle_clients = [self._clients.pop(key) for key in idle_keys]
+        for key in idle_keys:
+            logger.debug(f"Closing idle connection pool for {key.endpoint}")
+
+        await asyncio.gather(
+            *(client.http_client.aclose() for client in idle_clients)
+        )
@@ -0,0 +1,260 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, AsyncIterator, Literal
+
+from aidial_sdk.utils.merge_chunks import merge
+from openai.types.chat import ChatCompletionMessageParam
+from pydantic import BaseModel, PositiveFloat, PositiveInt, root_validator
+
+from aidial_assistant.model.model_chunk import ModelChunk
+from aidial_assistant.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class CompletionCacheConf(BaseModel):
+    deployments: list[str] = []
+    """Deployments whose completions are cached. Only requests with zero temperature are cached."""
+    backend: Literal["memory", "disk"] = "memory"
+    directory: Path | None = None
+    """Required by the disk backend."""
+    ttl: PositiveFloat = 600
+    max_entries: PositiveInt = 1000
+    max_bytes: PositiveInt = 64 * 1024 * 1024
+
+    @root_validator(skip_on_failure=True)
+    def validate_directory(cls, values):
+        if values["backend"] == "disk" and values["directory"] is None:
+            raise ValueError("The disk backend requires a directory.")
+
+        return values
+
+
+def _serialize(chunk: ModelChunk) -> str:
+    return json.dumps(chunk._asdict())
+
+
+def _deserialize(data: str) -> ModelChunk:
+    return ModelChunk(**json.loads(data))
+
+
+def merge_model_chunks(chunks: list[ModelChunk]) -> ModelChunk:
+    """Combines a streamed completion into a single chunk."""
+    tool_calls = [
+        copy.deepcopy(chunk.tool_calls) for chunk in chunks if chunk.tool_calls
+    ]
+    return ModelChunk(
+        content="".join(chunk.content for chunk in chunks if chunk.content)
+        or None,
+        tool_calls=merge(*tool_calls) if tool_calls else None,
+        finish_reason=next(
+            (c.finish_reason for c in reversed(chunks) if c.finish_reason),
+            None,
+        ),
+        usage=next((c.usage for c in reversed(chunks) if c.usage), None),
+        discarded_messages=next(
+            (
+                c.discarded_messages
+                for c in reversed(chunks)
+                if c.discarded_messages is not None
+            ),
+            None,
+        ),
+    )
+
+
+async def replay(chunk: ModelChunk) -> AsyncIterator[ModelChunk]:
+    yield chunk
+
+
+class CompletionCacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> ModelChunk | None:
+        pass
+
+    @abstractmethod
+    async def put(self, key: str, chunk: ModelChunk):
+        pass
+
+
+class MemoryCompletionCacheBackend(CompletionCacheBackend):
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        # Completions are kept serialized, so that the cached values can't be mutated by the callers.
+        self._cache: LRUCache[str, str] = LRUCache(
+            max_entries,
+            max_bytes,
+            lambda key, value: len(key) + len(value),
+            ttl,
+        )
+
+    async def get(self, key: str) -> ModelChunk | None:
+        data = self._cache.get(key)
+        return None if data is None else _deserialize(data)
+
+    async def put(self, key: str, chunk: ModelChunk):
+        self._cache.put(key, _serialize(chunk))
+
+
+class DiskCompletionCacheBackend(CompletionCacheBackend):
+    """Keeps a file per completion, so the cache can be shared by several workers.
+    The files are read and written in a worker thread to keep the event loop free.
+    Every max_entries // 10 writes, the least recently written files are removed
+    if the cache exceeds its limits, so it may overshoot them in between.
+    """
+
+    def __init__(
+        self, directory: Path, max_entries: int, max_bytes: int, ttl: float
+    ):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.eviction_interval = max(max_entries // 10, 1)
+        self._writes_since_eviction = 0
+        directory.mkdir(parents=True, exist_ok=True)
+
+    async def get(self, key: str) -> ModelChunk | None:
+        return await asyncio.to_thread(self._read, key)
+
+    async def put(self, key: str, chunk: ModelChunk):
+        self._writes_since_eviction += 1
+        evict = self._writes_since_eviction >= self.eviction_interval
+        if evict:
+            self._writes_since_eviction = 0
+
+        await asyncio.to_thread(self._write, key, chunk, evict)
+
+    def _read(self, key: str) -> ModelChunk | None:
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+
+            return _deserialize(path.read_text())
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning(f"Removing corrupted cache entry {path}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def _write(self, key: str, chunk: ModelChunk, evict: bool):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(_serialize(chunk))
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        if evict:
+            self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _evict(self):
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        now = time.time()
+        for mtime, size, path in entries:
+            if (
+                len(entries) <= self.max_entries
+                and total_bytes <= self.max_bytes
+                and now - mtime <= self.ttl
+            ):
+                break
+
+            path.unlink(missing_ok=True)
+            entries = entries[1:]
+            total_bytes -= size
+
+
+class CompletionCache:
+    """Cache of complete model responses for deterministic (zero temperature) requests."""
+
+    def __init__(self, backend: CompletionCacheBackend):
+        self.backend = backend
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def create(conf: CompletionCacheConf) -> "CompletionCache":
+        if conf.backend == "disk":
+            assert conf.directory is not None
+            return CompletionCache(
+                DiskCompletionCacheBackend(
+                    conf.directory, conf.max_entries, conf.max_bytes, conf.ttl
+                )
+            )
+
+        return CompletionCache(
+            MemoryCompletionCacheBackend(
+                conf.max_entries, conf.max_bytes, conf.ttl
+            )
+        )
+
+    @staticmethod
+    def key(
+        model_args: dict[str, Any],
+        messages: list[ChatCompletionMessageParam],
+        extra_body: dict[str, Any],
+    ) -> str | None:
+        """Returns None if the request isn't deterministic."""
+        if model_args.get("temperature") != 0:
+            return None
+
+        request = {
+            "model_args": model_args,
+            "messages": messages,
+            "extra_body": extra_body,
+        }
+        return hashlib.sha256(
+            json.dumps(request, sort_keys=True).encode()
+        ).hexdigest()
+
+    async def get(self, key: str) -> ModelChunk | None:
+        chunk = await self.backend.get(key)
+        if chunk is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+
+        return chunk
+
+    async def record(
+        self, key: str, chunks: AsyncIterator[ModelChunk]
+    ) -> AsyncIterator[ModelChunk]:
+        """Passes the chunks through and caches the completion once the stream is over."""
+        received: list[ModelChunk] = []
+        async for chunk in chunks:
+            received.append(chunk)
+            yield chunk
+
+        await self.backend.put(key, merge_model_chunks(received))
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
@@ -0,0 +1,108 @@
+from typing import Any, NamedTuple
+
+from openai.types.chat import ChatCompletionChunk
+from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCall
+
+from aidial_assistant.utils.open_ai import Usage
+
+
+class ModelChunk(NamedTuple):
+    """The parts of a streamed completion chunk the assistant makes use of."""
+
+    content: str | None
+    tool_calls: list[dict[str, Any]] | None
+    finish_reason: str | None
+    usage: Usage | None
+    discarded_messages: int | list[int] | None
+
+
+def _get_field(obj: Any, name: str) -> Any:
+    """Reads a field of either a dict or a pydantic model, including the extra fields of the latter."""
+    if isinstance(obj, dict):
+        return obj.get(name)
+
+    return getattr(obj, name, None)
+
+
+def _tool_call_delta_to_dict(tool_call: ChoiceDeltaToolCall) -> dict[str, Any]:
+    result: dict[str, Any] = {"index": tool_call.index}
+    if tool_call.id is not None:
+        result["id"] = tool_call.id
+    if tool_call.type is not None:
+        result["type"] = tool_call.type
+
+    function = tool_call.function
+    if function is not None:
+        result["function"] = {
+            key: value
+            for key, value in (
+                ("name", function.name),
+                ("arguments", function.arguments),
+            )
+            if value is not None
+        }
+
+    return result
+
+
+def from_openai_chunk(chunk: ChatCompletionChunk) -> ModelChunk:
+    # Reading the attributes directly instead of chunk.dict() to avoid serializing every chunk.
+    usage = _get_field(chunk, "usage")
+    statistics = _get_field(chunk, "statistics")
+    content: str | None = None
+    tool_calls: list[dict[str, Any]] | None = None
+    finish_reason: str | None = None
+    if chunk.choices:
+        choice = chunk.choices[0]
+        content = choice.delta.content
+        if choice.delta.tool_calls:
+            tool_calls = [
+                _tool_call_delta_to_dict(tool_call)
+                for tool_call in choice.delta.tool_calls
+            ]
+        finish_reason = choice.finish_reason
+
+    return ModelChunk(
+        content=content,
+        tool_calls=tool_calls,
+        finish_reason=finish_reason,
+        usage=None
+        if not usage
+        else Usage(
+            prompt_tokens=_get_field(usage, "prompt_tokens"),
+            completion_tokens=_get_field(usage, "completion_tokens"),
+        ),
+        discarded_messages=None
+        if not statistics
+        else statistics.get("discarded_messages"),
+    )
+
+
+def from_dict_chunk(chunk: dict[str, Any]) -> ModelChunk:
+    usage = chunk.get("usage")
+    statistics = chunk.get("statistics")
+    content: str | None = None
+    tool_calls: list[dict[str, Any]] | None = None
+    finish_reason: str | None = None
+    choices = chunk.get("choices")
+    if choices:
+        choice = choices[0]
+        delta = choice.get("delta") or {}
+        content = delta.get("content")
+        tool_calls = delta.get("tool_calls") or None
+        finish_reason = choice.get("finish_reason")
+
+    return ModelChunk(
+        content=content,
+        tool_calls=tool_calls,
+        finish_reason=finish_reason,
+        usage=None
+        if not usage
+        else Usage(
+            prompt_tokens=usage["prompt_tokens"],
+            completion_tokens=usage["completion_tokens"],
+        ),
+        discarded_messages=None
+        if not statistics
+        else statistics.get("discarded_messages"),
+    )
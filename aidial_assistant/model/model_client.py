@@ -1,3 +1,5 @@
+import asyncio
+import json
 from abc import ABC
 from itertools import islice
 from typing import Any, AsyncIterator, List
@@ -9,7 +11,17 @@ from openai.types.chat import (
     ChatCompletionMessageToolCallParam,
 )
 
-from aidial_assistant.utils.open_ai import Usage
+from aidial_assistant.model.completion_cache import CompletionCache, replay
+from aidial_assistant.model.model_chunk import ModelChunk, from_openai_chunk
+from aidial_assistant.model.rate_limiter import AdmissionController
+from aidial_assistant.model.sse_transport import SSETransport
+from aidial_assistant.model.token_count_cache import TokenCountCache
+from aidial_assistant.model.tokenizer import MessageTokenizer
+from aidial_assistant.model.truncation import get_discarded_messages
+from aidial_assistant.utils.deadline import remaining_time
+
+# A rough average for English text, used when no local tokenizer is configured.
+CHARS_PER_TOKEN = 4
 
 
 class ReasonLengthException(Exception):
@@ -37,6 +49,27 @@ async def _flush_stream(stream: AsyncIterator[str]):
         pass
 
 
+async def _limit_total_time(
+    chunks: AsyncIterator[ModelChunk], timeout: float
+) -> AsyncIterator[ModelChunk]:
+    """Fails once the timeout has passed since the stream started,
+    unlike the http client timeouts, which apply to every read separately."""
+    expires_at = asyncio.get_running_loop().time() + timeout
+    while True:
+        try:
+            # The scope doesn't span the yield, so only the reads of the stream are cancelled
+            async with asyncio.timeout_at(expires_at):
+                chunk = await anext(chunks)
+        except StopAsyncIteration:
+            return
+        except TimeoutError:
+            raise TimeoutError(
+                "The model didn't respond within the time limit of the request."
+            ) from None
+
+        yield chunk
+
+
 def _discarded_messages_count_to_indices(
     messages: list[ChatCompletionMessageParam], discarded_messages: int
 ) -> list[int]:
@@ -53,9 +86,23 @@ def _discarded_messages_count_to_indices(
 
 
 class ModelClient(ABC):
-    def __init__(self, client: AsyncOpenAI, model_args: dict[str, Any]):
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model_args: dict[str, Any],
+        tokenizer: MessageTokenizer | None = None,
+        token_count_cache: TokenCountCache | None = None,
+        transport: SSETransport | None = None,
+        admission_controller: AdmissionController | None = None,
+        completion_cache: CompletionCache | None = None,
+    ):
         self.client = client
         self.model_args = model_args
+        self.tokenizer = tokenizer
+        self.token_count_cache = token_count_cache
+        self.transport = transport
+        self.admission_controller = admission_controller
+        self.completion_cache = completion_cache
 
         self._total_prompt_tokens: int = 0
         self._total_completion_tokens: int = 0
@@ -66,29 +113,38 @@ class ModelClient(ABC):
         extra_results_callback: ExtraResultsCallback | None = None,
         **kwargs,
     ) -> AsyncIterator[str]:
-        model_result = await self.client.chat.completions.create(
-            **self.model_args,
-            extra_body=kwargs,
-            stream=True,
-            messages=messages,
+        cache_key = (
+            None
+            if self.completion_cache is None
+            else self.completion_cache.key(self.model_args, messages, kwargs)
         )
+        cached_chunk = (
+            None
+            if self.completion_cache is None or cache_key is None
+            else await self.completion_cache.get(cache_key)
+        )
+        if cached_chunk is not None:
+            chunks = replay(cached_chunk)
+        else:
+            chunks = self._stream_admitted_chunks(messages, kwargs)
+            if self.completion_cache is not None and cache_key is not None:
+                chunks = self.completion_cache.record(cache_key, chunks)
 
         finish_reason_length = False
         tool_calls_chunks: list[list[dict[str, Any]]] = []
-        async for chunk in model_result:
-            chunk_dict = chunk.dict()
-            usage: Usage | None = chunk_dict.get("usage")
+        async for chunk in chunks:
+            usage = chunk.usage
             if usage:
                 prompt_tokens = usage["prompt_tokens"]
-                self._total_prompt_tokens += prompt_tokens
-                self._total_completion_tokens += usage["completion_tokens"]
+                # Replayed completions are not charged by the model
+                if cached_chunk is None:
+                    self._total_prompt_tokens += prompt_tokens
+                    self._total_completion_tokens += usage["completion_tokens"]
                 if extra_results_callback:
                     extra_results_callback.on_prompt_tokens(prompt_tokens)
 
             if extra_results_callback:
-                discarded_messages: int | list[int] | None = chunk_dict.get(
-                    "statistics", {}
-                ).get("discarded_messages")
+                discarded_messages = chunk.discarded_messages
                 if discarded_messages is not None:
                     extra_results_callback.on_discarded_messages(
                         _discarded_messages_count_to_indices(
@@ -98,20 +154,13 @@ class ModelClient(ABC):
                         else discarded_messages
                     )
 
-            choice = chunk.choices[0]
-            delta = choice.delta
-            if delta.content:
-                yield delta.content
+            if chunk.content:
+                yield chunk.content
 
-            if delta.tool_calls:
-                tool_calls_chunks.append(
-                    [
-                        tool_call_chunk.dict()
-                        for tool_call_chunk in delta.tool_calls
-                    ]
-                )
+            if chunk.tool_calls:
+                tool_calls_chunks.append(chunk.tool_calls)
 
-            if choice.finish_reason == "length":
+            if chunk.finish_reason == "length":
                 finish_reason_length = True
 
         if finish_reason_length:
@@ -124,9 +173,123 @@ class ModelClient(ABC):
             ]
             extra_results_callback.on_tool_calls(tool_calls)
 
+    def _stream_admitted_chunks(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        extra_body: dict[str, Any],
+    ) -> AsyncIterator[ModelChunk]:
+        if self.admission_controller is None:
+            return self._stream_chunks(messages, extra_body)
+
+        return self.admission_controller.stream(
+            lambda: self._stream_chunks(messages, extra_body),
+            self._estimate_request_tokens(messages, extra_body),
+        )
+
+    def _stream_chunks(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        extra_body: dict[str, Any],
+    ) -> AsyncIterator[ModelChunk]:
+        # The model may not take longer than the time left for the request
+        timeout = remaining_time()
+        chunks = (
+            self._stream_openai_chunks(messages, extra_body, timeout)
+            if self.transport is None
+            else self.transport.stream(
+                self.model_args, messages, extra_body, timeout
+            )
+        )
+        if timeout is None:
+            return chunks
+
+        return _limit_total_time(chunks, timeout)
+
+    def _estimate_request_tokens(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        extra_body: dict[str, Any],
+    ) -> int:
+        """Estimates the tokens the request is charged for by the rate limits of the model."""
+        prompt_tokens = (
+            self.tokenizer.count_tokens(messages)
+            if self.tokenizer is not None
+            else len(json.dumps(messages)) // CHARS_PER_TOKEN
+        )
+        max_tokens = (
+            extra_body.get("max_tokens")
+            or self.model_args.get("max_tokens")
+            or 0
+        )
+        return prompt_tokens + max_tokens
+
+    async def _stream_openai_chunks(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        extra_body: dict[str, Any],
+        timeout: float | None = None,
+    ) -> AsyncIterator[ModelChunk]:
+        model_result = await self.client.chat.completions.create(
+            **self.model_args,
+            extra_body=extra_body,
+            stream=True,
+            messages=messages,
+            **({} if timeout is None else {"timeout": timeout}),
+        )
+        async for chunk in model_result:
+            yield from_openai_chunk(chunk)
+
+    async def count_tokens(
+        self, messages: list[ChatCompletionMessageParam]
+    ) -> int:
+        if self.tokenizer is not None:
+            return self.tokenizer.chat_format.reply_priming + sum(
+                [
+                    await self.count_message_tokens(message)
+                    for message in messages
+                ]
+            )
+
+        deployment = self.model_args.get("model")
+        if self.token_count_cache is None or deployment is None:
+            return await self._count_tokens_remotely(messages)
+
+        tokens = self.token_count_cache.get_request(deployment, messages)
+        if tokens is None:
+            tokens = await self._count_tokens_remotely(messages)
+            self.token_count_cache.put_request(deployment, messages, tokens)
+
+        return tokens
+
+    @property
+    def counts_tokens_locally(self) -> bool:
+        return self.tokenizer is not None
+
+    async def count_message_tokens(
+        self, message: ChatCompletionMessageParam
+    ) -> int:
+        """Returns the number of tokens the message adds to a request.
+        Requires a local tokenizer: the model endpoint counts whole requests only.
+        """
+        if self.tokenizer is None:
+            raise ValueError(
+                "Messages can be counted one by one with a local tokenizer only."
+            )
+
+        deployment = self.model_args.get("model")
+        if self.token_count_cache is None or deployment is None:
+            return self.tokenizer.count_message_tokens(message)
+
+        tokens = self.token_count_cache.get(deployment, message)
+        if tokens is None:
+            tokens = self.tokenizer.count_message_tokens(message)
+            self.token_count_cache.put(deployment, message, tokens)
+
+        return tokens
+
     # TODO: Use a dedicated endpoint for counting tokens.
     #  This request may throw an error if the number of tokens is too large.
-    async def count_tokens(
+    async def _count_tokens_remotely(
         self, messages: list[ChatCompletionMessageParam]
     ) -> int:
         class PromptTokensCallback(ExtraResultsCallback):
@@ -147,9 +310,27 @@ class ModelClient(ABC):
 
         return callback.token_count
 
+    async def get_discarded_messages(
+        self, messages: list[ChatCompletionMessageParam], max_prompt_tokens: int
+    ) -> list[int]:
+        if self.tokenizer is not None:
+            return get_discarded_messages(
+                messages,
+                [
+                    await self.count_message_tokens(message)
+                    for message in messages
+                ],
+                self.tokenizer.chat_format.reply_priming,
+                max_prompt_tokens,
+            )
+
+        return await self._get_discarded_messages_remotely(
+            messages, max_prompt_tokens
+        )
+
     # TODO: Use a dedicated endpoint for discarded_messages.
     # https://github.com/epam/ai-dial-assistant/issues/39
-    async def get_discarded_messages(
+    async def _get_discarded_messages_remotely(
         self, messages: list[ChatCompletionMessageParam], max_prompt_tokens: int
     ) -> list[int]:
         class DiscardedMessagesCallback(ExtraResultsCallback):
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable
+
+from openai import RateLimitError
+from opentelemetry import metrics
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat, PositiveInt
+
+from aidial_assistant.model.model_chunk import ModelChunk
+from aidial_assistant.utils.exceptions import RateLimitExceededError
+
+logger = logging.getLogger(__name__)
+
+_meter = metrics.get_meter(__name__)
+_queue_depth = _meter.create_up_down_counter(
+    "model.admission.queue_depth",
+    description="Model requests waiting for admission",
+)
+_wait_time = _meter.create_histogram(
+    "model.admission.wait_time",
+    unit="s",
+    description="Time model requests spent waiting for admission",
+)
+_rejections = _meter.create_counter(
+    "model.admission.rejections",
+    description="Model requests rejected by the admission controller",
+)
+_rate_limited = _meter.create_counter(
+    "model.admission.rate_limited",
+    description="Model responses with the 429 status code",
+)
+
+
+class RateLimitConf(BaseModel):
+    requests_per_minute: PositiveInt | None = None
+    tokens_per_minute: PositiveInt | None = None
+    max_queue_size: PositiveInt = 100
+    """Requests waiting for admission beyond this number are rejected."""
+    max_wait: PositiveFloat = 60
+    """Requests that can't be admitted within this number of seconds are rejected."""
+    max_retries: NonNegativeInt = 3
+    initial_backoff: PositiveFloat = 1
+    """Backoff before the first retry if the model didn't specify retry-after. Doubles on every retry."""
+    max_backoff: PositiveFloat = 30
+
+
+def get_retry_after(error: RateLimitError) -> float | None:
+    """Returns the delay requested by the model in seconds, if any."""
+    headers = error.response.headers
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+
+    try:
+        return parsedate_to_datetime(retry_after).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        capacity: float,
+        rate: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = capacity
+        self.rate = rate
+        self.clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+
+    def time_until(self, amount: float) -> float:
+        """Returns the number of seconds until the amount is available."""
+        self._refill()
+        return max(0.0, (min(amount, self.capacity) - self._tokens) / self.rate)
+
+    def consume(self, amount: float):
+        """Takes the amount from the bucket. A negative amount returns tokens.
+        The bucket may go into debt, which delays the following requests."""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+
+class AdmissionController:
+    """Admits requests to a deployment within its request and token rates.
+    Requests wait in a bounded FIFO queue. A 429 response pauses all requests
+    to the deployment for the time the model asked for, after which the request is retried.
+    """
+
+    def __init__(
+        self,
+        deployment: str,
+        conf: RateLimitConf,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.deployment = deployment
+        self.conf = conf
+        self.clock = clock
+        self.request_bucket = (
+            None
+            if conf.requests_per_minute is None
+            else TokenBucket(
+                conf.requests_per_minute, conf.requests_per_minute / 60, clock
+            )
+        )
+        self.token_bucket = (
+            None
+            if conf.tokens_per_minute is None
+            else TokenBucket(
+                conf.tokens_per_minute, conf.tokens_per_minute / 60, clock
+            )
+        )
+        self._paused_until = 0.0
+        self._queue_depth = 0
+        self._lock = asyncio.Lock()
+        self._attributes = {"deployment": deployment}
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue_depth
+
+    def pause(self, delay: float):
+        self._paused_until = max(self._paused_until, self.clock() + delay)
+
+    async def acquire(self, tokens: int):
+        if self._queue_depth >= self.conf.max_queue_size:
+            self._reject("Too many requests are waiting for the model.")
+
+        started_at = self.clock()
+        self._queue_depth += 1
+        _queue_depth.add(1, self._attributes)
+        try:
+            # The lock is fair, so the requests are admitted in the order they arrived.
+            async with self._lock:
+                while (delay := self._get_delay(tokens)) > 0:
+                    if self.clock() + delay - started_at > self.conf.max_wait:
+                        self._reject(
+                            f"The model can't accept the request within {self.conf.max_wait} seconds."
+                        )
+
+                    await asyncio.sleep(delay)
+
+                if self.request_bucket is not None:
+                    self.request_bucket.consume(1)
+                if self.token_bucket is not None:
+                    self.token_bucket.consume(tokens)
+        finally:
+            self._queue_depth -= 1
+            _queue_depth.add(-1, self._attributes)
+            _wait_time.record(self.clock() - started_at, self._attributes)
+
+    def adjust_tokens(self, estimated_tokens: int, actual_tokens: int):
+        """Charges the difference between the actual and the estimated request size."""
+        if self.token_bucket is not None:
+            self.token_bucket.consume(actual_tokens - estimated_tokens)
+
+    async def stream(
+        self,
+        create_stream: Callable[[], AsyncIterator[ModelChunk]],
+        tokens: int,
+    ) -> AsyncIterator[ModelChunk]:
+        attempt = 0
+        while True:
+            await self.acquire(tokens)
+            streamed = False
+            try:
+                async for chunk in create_stream():
+                    usage = chunk.usage
+                    if usage:
+                        self.adjust_tokens(
+                            tokens,
+                            usage["prompt_tokens"] + usage["completion_tokens"],
+                        )
+                    streamed = True
+                    yield chunk
+
+                return
+            except RateLimitError as e:
+                _rate_limited.add(1, self._attributes)
+                # A retry would repeat the chunks already streamed to the user
+                if streamed or attempt >= self.conf.max_retries:
+                    raise
+
+                delay = get_retry_after(e)
+                if delay is None:
+                    delay = min(
+                        self.conf.initial_backoff * 2**attempt,
+                        self.conf.max_backoff,
+                    )
+
+                logger.warning(
+                    f"Model {self.deployment} is rate limited, retrying in {delay} seconds."
+                )
+                self.pause(delay)
+                attempt += 1
+
+    def _get_delay(self, tokens: int) -> float:
+        delays = [self._paused_until - self.clock()]
+        if self.request_bucket is not None:
+            delays.append(self.request_bucket.time_until(1))
+        if self.token_bucket is not None:
+            delays.append(self.token_bucket.time_until(tokens))
+
+        return max(delays)
+
+    def _reject(self, message: str):
+        _rejections.add(1, self._attributes)
+        raise RateLimitExceededError(message)
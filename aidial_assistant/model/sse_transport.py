@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator
+
+import httpx
+from openai import (
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_TIMEOUT,
+    APIError,
+    APIStatusError,
+    AuthenticationError,
+    BadRequestError,
+    ConflictError,
+    InternalServerError,
+    NotFoundError,
+    PermissionDeniedError,
+    RateLimitError,
+    UnprocessableEntityError,
+)
+from openai.types.chat import ChatCompletionMessageParam
+
+from aidial_assistant.model.model_chunk import ModelChunk, from_dict_chunk
+
+logger = logging.getLogger(__name__)
+
+# Same backoff as the openai client, without the jitter
+INITIAL_RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 8.0
+
+_STATUS_ERRORS: dict[int, type[APIStatusError]] = {
+    400: BadRequestError,
+    401: AuthenticationError,
+    403: PermissionDeniedError,
+    404: NotFoundError,
+    409: ConflictError,
+    422: UnprocessableEntityError,
+    429: RateLimitError,
+}
+
+
+def _make_status_error(response: httpx.Response) -> APIStatusError:
+    """Builds the same exception the openai client raises for an error response."""
+    error_text = response.text.strip()
+    body: Any = error_text
+    try:
+        body = json.loads(error_text)
+        message = f"Error code: {response.status_code} - {body}"
+    except ValueError:
+        message = error_text or f"Error code: {response.status_code}"
+
+    data = body.get("error", body) if isinstance(body, dict) else body
+    error_type = _STATUS_ERRORS.get(response.status_code) or (
+        InternalServerError if response.status_code >= 500 else APIStatusError
+    )
+    return error_type(message, response=response, body=data)
+
+
+def _should_retry(response: httpx.Response, retry_rate_limited: bool) -> bool:
+    """Mirrors the retry policy of the openai client."""
+    should_retry_header = response.headers.get("x-should-retry")
+    if should_retry_header in ("true", "false"):
+        return should_retry_header == "true"
+
+    if response.status_code == 429:
+        return retry_rate_limited
+
+    return response.status_code in (408, 409) or response.status_code >= 500
+
+
+async def _iter_sse_data(response: httpx.Response) -> AsyncIterator[str]:
+    """Yields the data of the server-sent events. Other event fields are not used by the protocol."""
+    data_lines: list[str] = []
+    async for line in response.aiter_lines():
+        if not line:
+            if data_lines:
+                yield "\n".join(data_lines)
+                data_lines = []
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].lstrip(" "))
+
+    if data_lines:
+        yield "\n".join(data_lines)
+
+
+class SSETransport:
+    """Streams chat completions by parsing the server-sent events directly.
+    The openai SDK objects aren't constructed, which saves CPU on every chunk.
+    Failed requests are retried as the openai client does, until the first chunk is streamed.
+    """
+
+    def __init__(
+        self,
+        http_client: httpx.AsyncClient,
+        endpoint: str,
+        api_version: str,
+        api_key: str,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        admitted: bool = False,
+    ):
+        """Admitted transports leave the rate limited requests to the admission controller."""
+        self.http_client = http_client
+        self.endpoint = endpoint.rstrip("/")
+        self.api_version = api_version
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.admitted = admitted
+
+    async def stream(
+        self,
+        model_args: dict[str, Any],
+        messages: list[ChatCompletionMessageParam],
+        extra_body: dict[str, Any],
+        timeout: float | None = None,
+    ) -> AsyncIterator[ModelChunk]:
+        attempt = 0
+        while True:
+            streamed = False
+            try:
+                async for chunk in self._stream(
+                    model_args, messages, extra_body, timeout
+                ):
+                    streamed = True
+                    yield chunk
+
+                return
+            except (httpx.TransportError, APIStatusError) as e:
+                # A retry would repeat the chunks already streamed to the user
+                if (
+                    streamed
+                    or attempt >= self.max_retries
+                    or isinstance(e, APIStatusError)
+                    and not _should_retry(e.response, not self.admitted)
+                ):
+                    raise
+
+                delay = min(INITIAL_RETRY_DELAY * 2**attempt, MAX_RETRY_DELAY)
+                logger.warning(
+                    f"Model request failed: {e!r}, retrying in {delay} seconds."
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _stream(
+        self,
+        model_args: dict[str, Any],
+        messages: list[ChatCompletionMessageParam],
+        extra_body: dict[str, Any],
+        timeout: float | None,
+    ) -> AsyncIterator[ModelChunk]:
+        deployment = model_args["model"]
+        async with self.http_client.stream(
+            "POST",
+            f"{self.endpoint}/openai/deployments/{deployment}/chat/completions",
+            params={"api-version": self.api_version},
+            headers={"api-key": self.api_key},
+            json=model_args
+            | {"messages": messages, "stream": True}
+            | extra_body,
+            timeout=DEFAULT_TIMEOUT if timeout is None else timeout,
+        ) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                raise _make_status_error(response)
+
+            async for data in _iter_sse_data(response):
+                if data.startswith("[DONE]"):
+                    break
+
+                chunk = json.loads(data)
+                error = chunk.get("error")
+                if error:
+                    message = (
+                        error.get("message")
+                        if isinstance(error, dict)
+                        else None
+                    )
+                    raise APIError(
+                        message=message
+                        if isinstance(message, str) and message
+                        else "An error occurred during streaming",
+                        request=response.request,
+                        body=error,
+                    )
+
+                yield from_dict_chunk(chunk)
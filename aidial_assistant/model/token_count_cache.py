@@ -0,0 +1,75 @@
+import hashlib
+import json
+import sys
+from typing import Any
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from aidial_assistant.utils.cache import LRUCache
+
+TokenCountKey = tuple[str, str, str]
+
+# Rough size of a cached count besides the key strings: the tuple and the int.
+_ENTRY_OVERHEAD = sys.getsizeof((None, None, None)) + sys.getsizeof(0)
+
+
+def _sizeof(key: TokenCountKey, _: int) -> int:
+    return _ENTRY_OVERHEAD + sum(len(part) for part in key)
+
+
+# Role of the entries counting whole requests
+_REQUEST = ""
+
+
+def _hash(value: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True).encode()
+    ).hexdigest()
+
+
+class TokenCountCache:
+    """Process-wide cache of token counts keyed by (deployment, role, content hash).
+    Messages are cached one by one when counted with a local tokenizer,
+    and whole requests when counted by the model endpoint."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self._cache: LRUCache[TokenCountKey, int] = LRUCache(
+            max_entries, max_bytes, _sizeof
+        )
+
+    def get(
+        self, deployment: str, message: ChatCompletionMessageParam
+    ) -> int | None:
+        return self._cache.get(TokenCountCache._key(deployment, message))
+
+    def put(
+        self, deployment: str, message: ChatCompletionMessageParam, tokens: int
+    ):
+        self._cache.put(TokenCountCache._key(deployment, message), tokens)
+
+    def get_request(
+        self, deployment: str, messages: list[ChatCompletionMessageParam]
+    ) -> int | None:
+        return self._cache.get((deployment, _REQUEST, _hash(messages)))
+
+    def put_request(
+        self,
+        deployment: str,
+        messages: list[ChatCompletionMessageParam],
+        tokens: int,
+    ):
+        self._cache.put((deployment, _REQUEST, _hash(messages)), tokens)
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+    @staticmethod
+    def _key(
+        deployment: str, message: ChatCompletionMessageParam
+    ) -> TokenCountKey:
+        return deployment, message["role"], _hash(message)
@@ -0,0 +1,174 @@
+import base64
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+from openai.types.chat import ChatCompletionMessageParam
+from pydantic import BaseModel
+
+
+class TokenizerConf(BaseModel):
+    vocab_path: Path
+    """BPE ranks file in the tiktoken format."""
+    chat_format: str = "gpt"
+    deployments: list[str]
+
+
+# An approximation of the cl100k_base pre-tokenization pattern using the stdlib regex syntax:
+# \p{L} is replaced with [^\W\d_] and \p{N} with \d.
+CL100K_PATTERN = (
+    r"'(?i:[sdmt]|ll|ve|re)"
+    r"|(?:[^\r\n\w]|_)?+[^\W\d_]+"
+    r"|\d{1,3}"
+    r"| ?(?:[^\s\w]|_)++[\r\n]*"
+    r"|\s*[\r\n]"
+    r"|\s+(?!\S)"
+    r"|\s+"
+)
+
+PIECE_CACHE_SIZE = 65536
+
+
+def _byte_pair_merge(piece: bytes, ranks: dict[bytes, int]) -> int:
+    """Returns the number of tokens the piece is split into by the BPE merges."""
+    boundaries = list(range(len(piece) + 1))
+    while len(boundaries) > 2:
+        min_rank: int | None = None
+        min_index = 0
+        for i in range(len(boundaries) - 2):
+            rank = ranks.get(piece[boundaries[i] : boundaries[i + 2]])
+            if rank is not None and (min_rank is None or rank < min_rank):
+                min_rank = rank
+                min_index = i
+
+        if min_rank is None:
+            break
+
+        del boundaries[min_index + 1]
+
+    return len(boundaries) - 1
+
+
+class BPETokenizer:
+    """Byte-level BPE tokenizer counting tokens in-process."""
+
+    def __init__(self, ranks: dict[bytes, int], pattern: str = CL100K_PATTERN):
+        self.ranks = ranks
+        self.pattern = re.compile(pattern)
+        self._count_piece = lru_cache(maxsize=PIECE_CACHE_SIZE)(
+            self._count_piece_uncached
+        )
+
+    @classmethod
+    def from_file(cls, path: Path) -> "BPETokenizer":
+        """Loads ranks in the tiktoken format: a base64-encoded token and its rank per line."""
+        ranks: dict[bytes, int] = {}
+        with path.open("rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+
+        return cls(ranks)
+
+    def count_tokens(self, text: str) -> int:
+        return sum(
+            self._count_piece(piece) for piece in self.pattern.findall(text)
+        )
+
+    def _count_piece_uncached(self, piece: str) -> int:
+        encoded = piece.encode("utf-8")
+        if encoded in self.ranks:
+            return 1
+
+        return _byte_pair_merge(encoded, self.ranks)
+
+
+class ChatFormat(NamedTuple):
+    """Tokens the chat markup adds on top of the message contents."""
+
+    tokens_per_message: int
+    tokens_per_name: int
+    reply_priming: int
+
+
+# See https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
+CHAT_FORMATS: dict[str, ChatFormat] = {
+    "gpt-3.5-turbo-0301": ChatFormat(
+        tokens_per_message=4, tokens_per_name=-1, reply_priming=3
+    ),
+    "gpt": ChatFormat(tokens_per_message=3, tokens_per_name=1, reply_priming=3),
+}
+
+
+class MessageTokenizer:
+    def __init__(self, tokenizer: BPETokenizer, chat_format: ChatFormat):
+        self.tokenizer = tokenizer
+        self.chat_format = chat_format
+
+    def count_message_tokens(self, message: ChatCompletionMessageParam) -> int:
+        tokens = self.chat_format.tokens_per_message
+        for key, value in message.items():
+            if isinstance(value, str):
+                tokens += self.tokenizer.count_tokens(value)
+                if key == "name":
+                    tokens += self.chat_format.tokens_per_name
+            elif key == "content" and isinstance(value, list):
+                for part in value:  # type: ignore
+                    if part.get("type") != "text":
+                        raise ValueError(
+                            f"Content parts of type '{part.get('type')}' cannot be counted locally."
+                        )
+                    tokens += self.tokenizer.count_tokens(part["text"])
+            elif key == "tool_calls":
+                for tool_call in value:  # type: ignore
+                    function = tool_call["function"]
+                    tokens += self.tokenizer.count_tokens(function["name"])
+                    tokens += self.tokenizer.count_tokens(function["arguments"])
+
+        return tokens
+
+    def count_tokens(self, messages: list[ChatCompletionMessageParam]) -> int:
+        return self.chat_format.reply_priming + sum(
+            self.count_message_tokens(message) for message in messages
+        )
+
+
+class TokenizerRegistry:
+    """Local tokenizers keyed by deployment name."""
+
+    def __init__(self, tokenizers: dict[str, MessageTokenizer]):
+        self.tokenizers = tokenizers
+
+    def get(self, deployment: str | None) -> MessageTokenizer | None:
+        if deployment is None:
+            return None
+
+        return self.tokenizers.get(deployment)
+
+    @staticmethod
+    def from_conf(confs: Iterable[TokenizerConf]) -> "TokenizerRegistry":
+        vocabs: dict[Path, BPETokenizer] = {}
+        tokenizers: dict[str, MessageTokenizer] = {}
+        for conf in confs:
+            if conf.chat_format not in CHAT_FORMATS:
+                raise ValueError(
+                    f"Unknown chat format '{conf.chat_format}'. "
+                    f"Expected one of {list(CHAT_FORMATS.keys())}."
+                )
+
+            if conf.vocab_path not in vocabs:
+                vocabs[conf.vocab_path] = BPETokenizer.from_file(
+                    conf.vocab_path
+                )
+
+            tokenizer = MessageTokenizer(
+                vocabs[conf.vocab_path], CHAT_FORMATS[conf.chat_format]
+            )
+            for deployment in conf.deployments:
+                tokenizers[deployment] = tokenizer
+
+        return TokenizerRegistry(tokenizers)
@@ -0,0 +1,41 @@
+from bisect import bisect_left
+from itertools import accumulate
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from aidial_assistant.utils.exceptions import RequestParameterValidationError
+
+
+def get_discarded_messages(
+    messages: list[ChatCompletionMessageParam],
+    message_tokens: list[int],
+    overhead_tokens: int,
+    max_prompt_tokens: int,
+) -> list[int]:
+    """Mimics the DIAL truncation: the oldest non-system messages are discarded until the prompt fits.
+    System messages and the last message are always kept."""
+    candidates = [
+        index
+        for index, message in enumerate(messages[:-1])
+        if message["role"] != "system"
+    ]
+    total_tokens = overhead_tokens + sum(message_tokens)
+    excess_tokens = total_tokens - max_prompt_tokens
+    if excess_tokens <= 0:
+        return []
+
+    # prefix_tokens[n] is the number of tokens freed by discarding the first n candidates
+    prefix_tokens = list(
+        accumulate((message_tokens[index] for index in candidates), initial=0)
+    )
+    discarded_count = bisect_left(prefix_tokens, excess_tokens)
+    if discarded_count == len(prefix_tokens):
+        raise RequestParameterValidationError(
+            f"The requested maximum prompt tokens is {max_prompt_tokens}. "
+            f"However, the system messages and the last user message resulted in "
+            f"{total_tokens - prefix_tokens[-1]} tokens. "
+            "Please reduce the length of the messages or increase the maximum prompt tokens.",
+            param="max_prompt_tokens",
+        )
+
+    return candidates[:discarded_count]
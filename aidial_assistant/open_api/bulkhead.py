@@ -0,0 +1,98 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from urllib.parse import urlparse
+
+from opentelemetry import metrics
+from pydantic import BaseModel, NonNegativeInt, PositiveInt
+
+_meter = metrics.get_meter(__name__)
+_in_flight = _meter.create_up_down_counter(
+    "addon.bulkhead.in_flight",
+    description="Requests to the addon host being executed",
+)
+_queue_depth = _meter.create_up_down_counter(
+    "addon.bulkhead.queue_depth",
+    description="Requests waiting for the addon host",
+)
+_rejections = _meter.create_counter(
+    "addon.bulkhead.rejections",
+    description="Requests rejected because the addon host is saturated",
+)
+
+
+class BulkheadConf(BaseModel):
+    max_in_flight: PositiveInt = 20
+    """Maximum number of concurrent requests to an addon host."""
+    max_queue: NonNegativeInt = 100
+    """Maximum number of requests waiting for an addon host. Further requests fail immediately."""
+
+
+class BulkheadsConf(BulkheadConf):
+    hosts: dict[str, BulkheadConf] = {}
+    """Per-addon limits keyed by the host the addon API is served from."""
+
+
+class BulkheadFullError(Exception):
+    pass
+
+
+class Bulkhead:
+    """Limits the concurrent requests to an addon host. Requests beyond max_in_flight wait in a queue;
+    once the queue is full as well, requests fail immediately instead of piling up.
+    """
+
+    def __init__(self, host: str, conf: BulkheadConf):
+        self.host = host
+        self.conf = conf
+        self._semaphore = asyncio.Semaphore(conf.max_in_flight)
+        self._queued = 0
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        attributes = {"host": self.host}
+        if self._semaphore.locked():
+            if self._queued >= self.conf.max_queue:
+                _rejections.add(1, attributes)
+                raise BulkheadFullError(
+                    f"The addon {self.host} is overloaded: {self.conf.max_in_flight} requests"
+                    f" are in flight and {self._queued} are queued. Try again later."
+                )
+
+            self._queued += 1
+            _queue_depth.add(1, attributes)
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self._queued -= 1
+                _queue_depth.add(-1, attributes)
+        else:
+            await self._semaphore.acquire()
+
+        _in_flight.add(1, attributes)
+        try:
+            yield
+        finally:
+            _in_flight.add(-1, attributes)
+            self._semaphore.release()
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+
+class Bulkheads:
+    """Bulkheads of the addon hosts, shared by all requests."""
+
+    def __init__(self, conf: BulkheadsConf):
+        self.conf = conf
+        self._bulkheads: dict[str, Bulkhead] = {}
+
+    def get(self, url: str) -> Bulkhead:
+        host = urlparse(url).hostname or ""
+        bulkhead = self._bulkheads.get(host)
+        if bulkhead is None:
+            bulkhead = Bulkhead(host, self.conf.hosts.get(host, self.conf))
+            self._bulkheads[host] = bulkhead
+
+        return bulkhead
@@ -1,5 +1,8 @@
+import asyncio
 import json
 import logging
+import re
+from contextlib import nullcontext
 from typing import Dict, List, NamedTuple, Optional
 
 import aiohttp.client_exceptions
@@ -7,30 +10,60 @@ from aiohttp import hdrs
 from langchain.tools.openapi.utils.api_models import APIOperation
 
 from aidial_assistant.commands.base import JsonResult, ResultObject, TextResult
-from aidial_assistant.utils.requests import arequest
+from aidial_assistant.open_api.bulkhead import Bulkheads
+from aidial_assistant.open_api.response_cache import ResponseCache
+from aidial_assistant.utils.deadline import remaining_time
+from aidial_assistant.utils.requests import arequest, read_limited
+from aidial_assistant.utils.text import TRUNCATION_MARKER
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_RESPONSE_BYTES = 512 * 1024
 
-class _ParamMapping(NamedTuple):
+# Same content types as accepted by ClientResponse.json()
+_JSON_CONTENT_TYPE = re.compile(r"^application/(?:[\w.+-]+?\+)?json")
+
+
+def _is_json(content_type: str) -> bool:
+    return _JSON_CONTENT_TYPE.match(content_type) is not None
+
+
+class ParamMapping(NamedTuple):
     """Mapping from parameter name to parameter value."""
 
     query_params: List[str]
     body_params: List[str]
     path_params: List[str]
 
+    @staticmethod
+    def from_operation(operation: APIOperation) -> "ParamMapping":
+        return ParamMapping(
+            query_params=operation.query_params,  # type: ignore
+            body_params=operation.body_params,  # type: ignore
+            path_params=operation.path_params,  # type: ignore
+        )
+
 
 class OpenAPIEndpointRequester:
     """Chain interacts with an OpenAPI endpoint using natural language.
     Based on OpenAPIEndpointChain from LangChain.
     """
 
-    def __init__(self, operation: APIOperation, plugin_auth: str | None):
+    def __init__(
+        self,
+        operation: APIOperation,
+        plugin_auth: str | None,
+        param_mapping: ParamMapping | None = None,
+        max_response_bytes: int = DEFAULT_MAX_RESPONSE_BYTES,
+        response_cache: ResponseCache | None = None,
+        bulkheads: Bulkheads | None = None,
+    ):
         self.operation = operation
-        self.param_mapping = _ParamMapping(
-            query_params=operation.query_params,  # type: ignore
-            body_params=operation.body_params,  # type: ignore
-            path_params=operation.path_params,  # type: ignore
+        self.max_response_bytes = max_response_bytes
+        self.response_cache = response_cache
+        self.bulkheads = bulkheads
+        self.param_mapping = param_mapping or ParamMapping.from_operation(
+            operation
         )
         self.plugin_auth = plugin_auth
 
@@ -86,24 +119,75 @@ class OpenAPIEndpointRequester:
             else {hdrs.AUTHORIZATION: self.plugin_auth}
         )
         logger.debug(f"Request args: {request_args}")
-        async with arequest(
-            self.operation.method.value, headers=headers, **request_args  # type: ignore
-        ) as response:
-            if response.status != 200:
-                try:
-                    return JsonResult(json.dumps(await response.json()))
-                except aiohttp.ContentTypeError:
-                    method_str = str(self.operation.method.value)  # type: ignore
-                    error_object = {
-                        "reason": response.reason,
-                        "status_code": response.status,
-                        "method:": method_str.upper(),
-                        "url": request_args["url"],
-                        "params": request_args["params"],
-                    }
-                    return JsonResult(json.dumps(error_object))
-
-            if "text" in response.headers[hdrs.CONTENT_TYPE]:
-                return TextResult(await response.text())
-
-            return JsonResult(json.dumps(await response.json()))
+        method = str(self.operation.method.value)  # type: ignore
+        cache = self.response_cache
+        cache_key = cache and cache.key(
+            self.operation.operation_id, method, request_args, self.plugin_auth
+        )
+        if cache and cache_key:
+            cached_result = cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
+
+        bulkhead = (
+            nullcontext()
+            if self.bulkheads is None
+            else self.bulkheads.get(request_args["url"]).acquire()
+        )
+        # The wait for the bulkhead counts towards the time left for the request
+        deadline = asyncio.timeout(remaining_time())
+        try:
+            async with deadline, bulkhead, arequest(
+                method, headers=headers, **request_args
+            ) as response:
+                result = await self._read_result(response, request_args)
+                if cache and cache_key and response.status == 200:
+                    cache.put(cache_key, response.headers, result)
+
+                return result
+        except TimeoutError as e:
+            if deadline.expired():
+                raise TimeoutError(
+                    "The addon didn't respond within the time limit of the request."
+                ) from e
+            raise
+
+    async def _read_result(
+        self, response: aiohttp.ClientResponse, request_args: dict
+    ) -> ResultObject:
+        is_json = _is_json(response.content_type)
+        if response.status != 200 and not is_json:
+            method_str = str(self.operation.method.value)  # type: ignore
+            error_object = {
+                "reason": response.reason,
+                "status_code": response.status,
+                "method:": method_str.upper(),
+                "url": request_args["url"],
+                "params": request_args["params"],
+            }
+            return JsonResult(json.dumps(error_object))
+
+        is_text = (
+            response.status == 200
+            and "text" in response.headers[hdrs.CONTENT_TYPE]
+        )
+        if not is_text and not is_json:
+            raise aiohttp.ContentTypeError(
+                response.request_info,
+                response.history,
+                status=response.status,
+                message=f"Attempt to decode JSON with unexpected mimetype: {response.content_type}",
+                headers=response.headers,
+            )
+
+        body, truncated = await read_limited(response, self.max_response_bytes)
+        encoding = response.charset or "utf-8"
+        if truncated:
+            # The cut off JSON is no longer valid, so it is returned as text
+            return TextResult(
+                body.decode(encoding, errors="ignore") + TRUNCATION_MARKER
+            )
+
+        # JSON is passed through as is instead of being parsed and serialized again
+        text = body.decode(encoding)
+        return TextResult(text) if is_text else JsonResult(text)
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Mapping, NamedTuple
+from urllib.parse import urlparse
+
+from aiohttp import hdrs
+from opentelemetry import metrics
+from pydantic import BaseModel, NonNegativeFloat
+
+from aidial_assistant.commands.base import ResultObject
+from aidial_assistant.utils.cache import CacheConf, LRUCache
+
+_meter = metrics.get_meter(__name__)
+_lookups = _meter.create_counter(
+    "addon.response_cache.lookups",
+    description="Addon response cache lookups by result: hit or miss",
+)
+
+
+class ResponseCachePolicyConf(BaseModel):
+    ttl: NonNegativeFloat | None = None
+    """Overrides the freshness lifetime from Cache-Control and Expires. Responses marked no-store, no-cache, private or max-age=0 are never cached."""
+    cacheable_operations: list[str] = []
+    """Ids of the operations other than GET and HEAD that may be cached, e.g. searches sent as POST."""
+
+
+class ResponseCacheConf(CacheConf):
+    enabled: bool = False
+    hosts: dict[str, ResponseCachePolicyConf] = {}
+    """Per-addon policies keyed by the host the addon API is served from."""
+
+
+_IDEMPOTENT_METHODS = {"get", "head"}
+# Responses with these directives must not be reused by a shared cache
+_UNCACHEABLE_DIRECTIVES = {"no-store", "no-cache", "private"}
+_DEFAULT_POLICY = ResponseCachePolicyConf()
+
+
+class ResponseCacheKey(NamedTuple):
+    method: str
+    url: str
+    params: str
+    body: str
+    auth_hash: str
+
+
+class _Entry(NamedTuple):
+    result: ResultObject
+    expires_at: float
+
+
+def _parse_cache_control(value: str) -> dict[str, str | None]:
+    directives: dict[str, str | None] = {}
+    for directive in value.split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def _parse_seconds(value: str | None) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _parse_date(value: str | None) -> float | None:
+    if value is None:
+        return None
+
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def get_freshness_lifetime(headers: Mapping[str, str]) -> float | None:
+    """Returns for how many seconds the response stays fresh according to
+    Cache-Control and Expires, or None if the headers don't say."""
+    directives = _parse_cache_control(headers.get(hdrs.CACHE_CONTROL, ""))
+    if "no-store" in directives or "no-cache" in directives:
+        return 0
+
+    # The cache is shared between users, so s-maxage takes precedence
+    for name in ["s-maxage", "max-age"]:
+        if name in directives:
+            max_age = _parse_seconds(directives[name])
+            if max_age is None:
+                return 0
+            return max_age - (_parse_seconds(headers.get(hdrs.AGE)) or 0)
+
+    if hdrs.EXPIRES in headers:
+        expires = _parse_date(headers[hdrs.EXPIRES])
+        if expires is None:
+            # Invalid dates, such as "0", mean "already expired"
+            return 0
+        date = _parse_date(headers.get(hdrs.DATE)) or time.time()
+        return expires - date
+
+    return None
+
+
+def is_cacheable(headers: Mapping[str, str]) -> bool:
+    """Returns whether Cache-Control allows a shared cache to store the response at all.
+    Unlike the freshness lifetime, it isn't overridden by the ttl of the host policy.
+    """
+    directives = _parse_cache_control(headers.get(hdrs.CACHE_CONTROL, ""))
+    if not _UNCACHEABLE_DIRECTIVES.isdisjoint(directives):
+        return False
+
+    for name in ["s-maxage", "max-age"]:
+        if name in directives:
+            max_age = _parse_seconds(directives[name])
+            return max_age is not None and max_age > 0
+
+    return True
+
+
+class ResponseCache:
+    """Cache of the successful addon responses.
+    GET and HEAD responses are cached for as long as Cache-Control or Expires allow
+    (or the ttl of the host policy says); other methods only if the operation is allow-listed.
+    Entries are keyed by the auth header hash, so users with different credentials never share them.
+    """
+
+    def __init__(
+        self,
+        conf: ResponseCacheConf,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.conf = conf
+        self.clock = clock
+        self._entries: LRUCache[ResponseCacheKey, _Entry] = LRUCache(
+            conf.max_entries,
+            conf.max_bytes,
+            lambda key, entry: len(entry.result.text) + sum(map(len, key)),
+        )
+        self._hits = 0
+        self._misses = 0
+
+    def key(
+        self,
+        operation_id: str,
+        method: str,
+        request_args: dict[str, Any],
+        auth: str | None,
+    ) -> ResponseCacheKey | None:
+        """Returns the cache key of the request, or None if the request must not be cached."""
+        method = method.lower()
+        policy = self._policy(request_args["url"])
+        if (
+            method not in _IDEMPOTENT_METHODS
+            and operation_id not in policy.cacheable_operations
+        ):
+            return None
+
+        return ResponseCacheKey(
+            method=method,
+            url=request_args["url"],
+            params=json.dumps(request_args["params"], sort_keys=True),
+            body=json.dumps(request_args["json"], sort_keys=True),
+            auth_hash=hashlib.sha256((auth or "").encode()).hexdigest(),
+        )
+
+    def get(self, key: ResponseCacheKey) -> ResultObject | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < self.clock():
+            self._entries.pop(key)
+            entry = None
+
+        if entry is None:
+            self._misses += 1
+            _lookups.add(1, {"result": "miss"})
+            return None
+
+        self._hits += 1
+        _lookups.add(1, {"result": "hit"})
+        return entry.result
+
+    def put(
+        self,
+        key: ResponseCacheKey,
+        headers: Mapping[str, str],
+        result: ResultObject,
+    ):
+        if not is_cacheable(headers):
+            return
+
+        ttl = self._policy(key.url).ttl
+        if ttl is None:
+            ttl = get_freshness_lifetime(headers)
+
+        if ttl is not None and ttl > 0:
+            self._entries.put(key, _Entry(result, self.clock() + ttl))
+
+    def _policy(self, url: str) -> ResponseCachePolicyConf:
+        return self.conf.hosts.get(
+            urlparse(url).hostname or "", _DEFAULT_POLICY
+        )
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
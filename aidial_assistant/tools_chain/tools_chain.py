@@ -1,3 +1,4 @@
+import asyncio
 import json
 from typing import Any, Tuple, cast
 
@@ -12,9 +13,12 @@ from openai.types.chat.chat_completion_message_tool_call_param import Function
 from aidial_assistant.chain.callbacks.chain_callback import ChainCallback
 from aidial_assistant.chain.callbacks.command_callback import CommandCallback
 from aidial_assistant.chain.command_chain import (
+    DEFAULT_MAX_CONCURRENT_COMMANDS,
     CommandConstructor,
+    DeadlineExceededException,
     LimitExceededException,
     ModelRequestLimiter,
+    verify_deadline,
 )
 from aidial_assistant.chain.command_result import (
     CommandInvocation,
@@ -29,11 +33,13 @@ from aidial_assistant.chain.history import MessageScope, ScopedMessage
 from aidial_assistant.chain.model_response_reader import (
     AssistantProtocolException,
 )
+from aidial_assistant.chain.result_shaper import shape_responses
 from aidial_assistant.commands.base import Command
 from aidial_assistant.model.model_client import (
     ExtraResultsCallback,
     ModelClient,
 )
+from aidial_assistant.utils.deadline import final_answer_scope
 from aidial_assistant.utils.exceptions import RequestParameterValidationError
 from aidial_assistant.utils.open_ai import tool_calls_message, tool_message
 
@@ -113,9 +119,16 @@ CommandToolDict = dict[str, CommandTool]
 
 
 class ToolCallsCallback(ExtraResultsCallback):
-    def __init__(self):
+    def __init__(
+        self, model_request_limiter: ModelRequestLimiter | None = None
+    ):
+        self.model_request_limiter = model_request_limiter
         self.tool_calls: list[ChatCompletionMessageToolCallParam] = []
 
+    def on_prompt_tokens(self, prompt_tokens: int):
+        if self.model_request_limiter:
+            self.model_request_limiter.on_prompt_tokens(prompt_tokens)
+
     def on_tool_calls(
         self, tool_calls: list[ChatCompletionMessageToolCallParam]
     ):
@@ -128,9 +141,11 @@ class ToolsChain:
         model: ModelClient,
         commands: CommandToolDict,
         max_completion_tokens: int | None = None,
+        max_concurrent_commands: int = DEFAULT_MAX_CONCURRENT_COMMANDS,
     ):
         self.model = model
         self.commands = commands
+        self.max_concurrent_commands = max_concurrent_commands
         self.model_extra_args = (
             {}
             if max_completion_tokens is None
@@ -148,8 +163,11 @@ class ToolsChain:
         tools = [tool for _, tool in self.commands.values()]
         all_messages = messages.copy()
         while True:
-            tool_calls_callback = ToolCallsCallback()
+            tool_calls_callback = ToolCallsCallback(model_request_limiter)
             try:
+                if last_message_block_length > 0:
+                    verify_deadline()
+
                 if model_request_limiter:
                     await model_request_limiter.verify_limit(all_messages)
 
@@ -169,12 +187,15 @@ class ToolsChain:
                     raise
 
                 # If the dialog size exceeds model context size then remove last message block
-                # and try again without tools.
-                all_messages = all_messages[:-last_message_block_length]
-                async for chunk in self.model.agenerate(
-                    all_messages, tool_calls_callback
-                ):
-                    result_callback.on_result(chunk)
+                # and try again without tools. Out of time, the last tool results are kept.
+                if not isinstance(e, DeadlineExceededException):
+                    all_messages = all_messages[:-last_message_block_length]
+                # The best effort answer is given even if the time is up
+                with final_answer_scope():
+                    async for chunk in self.model.agenerate(
+                        all_messages, tool_calls_callback
+                    ):
+                        result_callback.on_result(chunk)
                 break
 
             if not tool_calls_callback.tool_calls:
@@ -187,7 +208,9 @@ class ToolsChain:
                 )
             )
             all_messages += await self._run_tools(
-                tool_calls_callback.tool_calls, callback
+                tool_calls_callback.tool_calls,
+                callback,
+                model_request_limiter,
             )
 
             last_message_block_length = (
@@ -208,34 +231,59 @@ class ToolsChain:
         self,
         tool_calls: list[ChatCompletionMessageToolCallParam],
         callback: ChainCallback,
+        model_request_limiter: ModelRequestLimiter | None = None,
     ):
         commands: list[CommandInvocation] = []
-        command_results: list[CommandResult] = []
-        result_messages: list[ChatCompletionMessageParam] = []
         for tool_call in tool_calls:
             function = tool_call["function"]
-            name = function["name"]
-            arguments: dict[str, Any] = json.loads(function["arguments"])
-            with callback.command_callback() as command_callback:
-                _publish_command(command_callback, name, json.dumps(arguments))
-                command = self._create_command(name)
-                result = await self._execute_command(
-                    command,
-                    arguments,
-                    command_callback,
+            commands.append(
+                CommandInvocation(
+                    command=function["name"],
+                    arguments=json.loads(function["arguments"]),
                 )
-                result_messages.append(
-                    tool_message(
-                        content=result["response"],
-                        tool_call_id=tool_call["id"],
+            )
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_commands)
+
+        async def run_tool(invocation: CommandInvocation) -> CommandResult:
+            # The stage is opened once the tool is allowed to run
+            async with semaphore:
+                name = invocation["command"]
+                arguments = invocation["arguments"]
+                with callback.command_callback() as command_callback:
+                    _publish_command(
+                        command_callback, name, json.dumps(arguments)
+                    )
+                    command = self._create_command(name)
+                    return await self._execute_command(
+                        command,
+                        arguments,
+                        command_callback,
                     )
-                )
-                command_results.append(result)
 
-            commands.append(
-                CommandInvocation(command=name, arguments=arguments)
-            )
+        executions = [
+            asyncio.create_task(run_tool(invocation)) for invocation in commands
+        ]
+        try:
+            # The results are in the order of the tool calls regardless of their completion order
+            command_results = list(await asyncio.gather(*executions))
+        finally:
+            for execution in executions:
+                execution.cancel()
+            await asyncio.gather(*executions, return_exceptions=True)
 
+        command_results = shape_responses(
+            command_results,
+            model_request_limiter and model_request_limiter.remaining_tokens(),
+            json.dumps(tool_calls),
+        )
+        result_messages: list[ChatCompletionMessageParam] = [
+            tool_message(
+                content=result["response"],
+                tool_call_id=tool_call["id"],
+            )
+            for tool_call, result in zip(tool_calls, command_results)
+        ]
         callback.on_state(
             commands_to_text(commands), responses_to_text(command_results)
         )
@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, TypeVar
+
+from pydantic import BaseModel, PositiveInt
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class CacheConf(BaseModel):
+    max_entries: PositiveInt = 10000
+    max_bytes: PositiveInt = 16 * 1024 * 1024
+
+
+class LRUCache(Generic[K, V]):
+    """Least recently used cache bounded by the number of entries and their total size.
+    Entries older than the ttl, if any, are treated as missing."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        sizeof: Callable[[K, V], int],
+        ttl: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.clock = clock
+
+        self._entries: OrderedDict[K, V] = OrderedDict()
+        self._sizes: dict[K, int] = {}
+        self._created_at: dict[K, float] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: K) -> V | None:
+        value = self._entries.get(key)
+        if value is not None and self._is_expired(key):
+            self.pop(key)
+            value = None
+
+        if value is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V):
+        size = self.sizeof(key, value)
+        if size > self.max_bytes:
+            return
+
+        self.pop(key)
+        self._entries[key] = value
+        self._sizes[key] = size
+        self._created_at[key] = self.clock()
+        self._bytes += size
+
+        while (
+            len(self._entries) > self.max_entries
+            or self._bytes > self.max_bytes
+        ):
+            self.pop(next(iter(self._entries)))
+
+    def pop(self, key: K) -> V | None:
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self._bytes -= self._sizes.pop(key)
+            del self._created_at[key]
+
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self._created_at.clear()
+        self._bytes = 0
+
+    def _is_expired(self, key: K) -> bool:
+        return (
+            self.ttl is not None
+            and self.clock() - self._created_at[key] > self.ttl
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
@@ -0,0 +1,82 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, NamedTuple
+
+
+class Deadline(NamedTuple):
+    expires_at: float
+    reserve: float
+    """Seconds kept for the final answer once the rest of the budget is spent."""
+    final_answer_expires_at: float
+    """The final answers may not run past the original deadline plus one reserve."""
+
+
+_deadline: ContextVar[Deadline | None] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(timeout: float, reserve: float) -> Iterator[None]:
+    """Sets the time budget of the code in the scope, including the tasks it starts.
+    A nested scope cannot extend the budget of the outer one."""
+    expires_at = time.monotonic() + timeout
+    final_answer_expires_at = expires_at + reserve
+    outer = _deadline.get()
+    if outer is not None:
+        expires_at = min(expires_at, outer.expires_at)
+        final_answer_expires_at = min(
+            final_answer_expires_at, outer.final_answer_expires_at
+        )
+
+    token = _deadline.set(
+        Deadline(expires_at, reserve, final_answer_expires_at)
+    )
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> float | None:
+    """Returns the seconds left until the deadline, or None if there is no deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+
+    return max(deadline.expires_at - time.monotonic(), 0)
+
+
+def is_nearly_exhausted() -> bool:
+    """Returns whether only the reserve of the budget is left."""
+    deadline = _deadline.get()
+    return (
+        deadline is not None
+        and deadline.expires_at - time.monotonic() <= deadline.reserve
+    )
+
+
+@contextmanager
+def final_answer_scope() -> Iterator[None]:
+    """Gives the final answer at least the reserve of the budget, even if the rest of it is already spent.
+    The reserve is given once per request: the nested final answers, e.g. of the addons, share it.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        yield
+        return
+
+    token = _deadline.set(
+        deadline._replace(
+            expires_at=max(
+                deadline.expires_at,
+                min(
+                    time.monotonic() + deadline.reserve,
+                    deadline.final_answer_expires_at,
+                ),
+            )
+        )
+    )
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
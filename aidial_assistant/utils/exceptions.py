@@ -17,6 +17,10 @@ class RequestParameterValidationError(Exception):
         return self._param
 
 
+class RateLimitExceededError(Exception):
+    pass
+
+
 def _to_http_exception(e: Exception) -> HTTPException:
     if isinstance(e, RequestParameterValidationError):
         return HTTPException(
@@ -26,6 +30,11 @@ def _to_http_exception(e: Exception) -> HTTPException:
             param=e.param,
         )
 
+    if isinstance(e, RateLimitExceededError):
+        return HTTPException(
+            message=str(e), status_code=429, type="rate_limit_exceeded"
+        )
+
     if isinstance(e, APIError):
         raise HTTPException(
             message=e.message,
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, NamedTuple, TypeVar
+
+from aiohttp import hdrs
+from opentelemetry import metrics
+from pydantic import NonNegativeFloat, PositiveFloat
+
+from aidial_assistant.utils.cache import CacheConf, LRUCache
+from aidial_assistant.utils.requests import aget
+from aidial_assistant.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_meter = metrics.get_meter(__name__)
+_lookups = _meter.create_counter(
+    "addon.metadata_cache.lookups",
+    description="Addon metadata cache lookups by result: hit, stale or miss",
+)
+_refreshes = _meter.create_counter(
+    "addon.metadata_cache.refreshes",
+    description="Addon metadata revalidations by result: not_modified, modified or failed",
+)
+
+T = TypeVar("T")
+
+
+class MetadataCacheConf(CacheConf):
+    ttl: PositiveFloat = 300
+    """Entries older than this number of seconds are revalidated."""
+    stale_while_revalidate: NonNegativeFloat = 3600
+    """Stale entries are served for this number of seconds while being revalidated in the background."""
+
+
+class _Entry(NamedTuple):
+    value: Any
+    size: int
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+
+class MetadataCache:
+    """Cache of the parsed addon metadata (manifests and OpenAPI specs) keyed by url.
+    Entries older than the ttl are revalidated with ETag/If-Modified-Since.
+    Within the stale-while-revalidate window, the stale value is returned
+    and the entry is revalidated in the background.
+    """
+
+    def __init__(
+        self,
+        conf: MetadataCacheConf,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.conf = conf
+        self.clock = clock
+        self._entries: LRUCache[str, _Entry] = LRUCache(
+            conf.max_entries, conf.max_bytes, lambda key, entry: entry.size
+        )
+        self._refresh_tasks: dict[str, asyncio.Task] = {}
+        self._in_flight: SingleFlight[str, _Entry] = SingleFlight()
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+
+    async def get(
+        self, url: str, parse: Callable[[str], T], revalidate: bool = False
+    ) -> T:
+        """With revalidate, the entry is revalidated even if it's fresh."""
+        entry = self._entries.get(url)
+        if revalidate:
+            return (await self._fetch(url, parse, entry)).value
+
+        if entry is not None:
+            age = self.clock() - entry.fetched_at
+            if age <= self.conf.ttl:
+                self._record_lookup("hit")
+                return entry.value
+
+            if age <= self.conf.ttl + self.conf.stale_while_revalidate:
+                self._record_lookup("stale")
+                self._schedule_refresh(url, parse)
+                return entry.value
+
+        self._record_lookup("miss")
+        return (await self._fetch(url, parse, entry)).value
+
+    async def aclose(self):
+        tasks = list(self._refresh_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def refreshes(self) -> int:
+        return self._refreshes
+
+    async def _fetch(
+        self, url: str, parse: Callable[[str], Any], entry: _Entry | None
+    ) -> _Entry:
+        """Concurrent fetches of the same url share a single download and parsing."""
+        return await self._in_flight.run(
+            url, lambda: self._download(url, parse, entry)
+        )
+
+    async def _download(
+        self, url: str, parse: Callable[[str], Any], entry: _Entry | None
+    ) -> _Entry:
+        headers = {}
+        if entry is not None:
+            if entry.etag is not None:
+                headers[hdrs.IF_NONE_MATCH] = entry.etag
+            if entry.last_modified is not None:
+                headers[hdrs.IF_MODIFIED_SINCE] = entry.last_modified
+
+        async with aget(url, headers) as response:
+            if response.status == 304 and entry is not None:
+                new_entry = entry._replace(fetched_at=self.clock())
+            else:
+                text = await response.text()
+                new_entry = _Entry(
+                    value=parse(text),
+                    size=len(text),
+                    etag=response.headers.get(hdrs.ETAG),
+                    last_modified=response.headers.get(hdrs.LAST_MODIFIED),
+                    fetched_at=self.clock(),
+                )
+
+        self._entries.put(url, new_entry)
+        return new_entry
+
+    def _schedule_refresh(self, url: str, parse: Callable[[str], Any]):
+        if url not in self._refresh_tasks:
+            task = asyncio.create_task(self._refresh(url, parse))
+            self._refresh_tasks[url] = task
+            task.add_done_callback(lambda _: self._refresh_tasks.pop(url))
+
+    async def _refresh(self, url: str, parse: Callable[[str], Any]):
+        self._refreshes += 1
+        entry = self._entries.get(url)
+        try:
+            new_entry = await self._fetch(url, parse, entry)
+            not_modified = entry is not None and new_entry.value is entry.value
+            _refreshes.add(
+                1, {"result": "not_modified" if not_modified else "modified"}
+            )
+        except Exception:
+            logger.warning(f"Failed to revalidate {url}", exc_info=True)
+            _refreshes.add(1, {"result": "failed"})
+
+    def _record_lookup(self, result: str):
+        if result == "miss":
+            self._misses += 1
+        else:
+            self._hits += 1
+        _lookups.add(1, {"result": result})
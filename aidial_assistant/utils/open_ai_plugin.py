@@ -1,15 +1,18 @@
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Iterable, Mapping
+from typing import Callable, Iterable, Mapping, NamedTuple
 from urllib.parse import urljoin
 
-from aiocache import cached
 from aiohttp import hdrs
 from fastapi import HTTPException
 from langchain.tools import OpenAPISpec
 from pydantic import BaseModel, parse_obj_as
-from starlette.status import HTTP_401_UNAUTHORIZED
+from starlette.status import HTTP_401_UNAUTHORIZED, HTTP_504_GATEWAY_TIMEOUT
 
-from aidial_assistant.utils.requests import aget
+from aidial_assistant.utils.metadata_cache import MetadataCache
+from aidial_assistant.utils.spec_cache import SpecCache
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +45,13 @@ class AIPluginConf(BaseModel):
 class OpenAIPluginInfo(BaseModel):
     ai_plugin: AIPluginConf
     open_api: OpenAPISpec
+    open_api_hash: str
+    """Hash of the spec document, identifies the spec version."""
+
+
+class _ParsedSpec(NamedTuple):
+    spec: OpenAPISpec
+    content_hash: str
 
 
 class AddonTokenSource:
@@ -85,28 +95,91 @@ def get_plugin_auth(
     )
 
 
-async def get_open_ai_plugin_info(addon_url: str) -> OpenAIPluginInfo:
+async def get_open_ai_plugin_info(
+    addon_url: str,
+    cache: MetadataCache,
+    revalidate: bool = False,
+    spec_cache: SpecCache | None = None,
+) -> OpenAIPluginInfo:
     """Takes url pointing to .well-known/ai-plugin.json file"""
     logger.info(f"Fetching plugin info from {addon_url}")
-    ai_plugin = await _parse_ai_plugin_conf(addon_url)
+    ai_plugin = await cache.get(addon_url, _parse_ai_plugin_conf, revalidate)
     # Resolve relative url
     ai_plugin.api.url = urljoin(addon_url, ai_plugin.api.url)
     logger.info(f"Fetching plugin spec from {ai_plugin.api.url}")
-    open_api = await _parse_openapi_spec(ai_plugin.api.url)
+    open_api = await cache.get(
+        ai_plugin.api.url,
+        _openapi_spec_parser(ai_plugin.api.url, spec_cache),
+        revalidate,
+    )
+
+    return OpenAIPluginInfo(
+        ai_plugin=ai_plugin,
+        open_api=open_api.spec,
+        open_api_hash=open_api.content_hash,
+    )
 
-    return OpenAIPluginInfo(ai_plugin=ai_plugin, open_api=open_api)
 
+async def get_open_ai_plugin_infos(
+    addon_urls: list[str],
+    timeout: float,
+    cache: MetadataCache,
+    spec_cache: SpecCache | None = None,
+) -> list[OpenAIPluginInfo]:
+    """Loads the addons concurrently. The results are in the order of the urls.
+    If several addons fail, the error of the first one in this order is raised.
+    """
+    results = await asyncio.gather(
+        *(
+            _get_open_ai_plugin_info(url, timeout, cache, spec_cache)
+            for url in addon_urls
+        ),
+        return_exceptions=True,
+    )
 
-@cached()
-async def _parse_ai_plugin_conf(url: str) -> AIPluginConf:
-    async with aget(url) as response:
-        # content_type=None to disable validation, sometimes response comes as text/json
-        return parse_obj_as(
-            AIPluginConf, await response.json(content_type=None)
+    infos: list[OpenAIPluginInfo] = []
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+        infos.append(result)
+
+    return infos
+
+
+async def _get_open_ai_plugin_info(
+    addon_url: str,
+    timeout: float,
+    cache: MetadataCache,
+    spec_cache: SpecCache | None,
+) -> OpenAIPluginInfo:
+    try:
+        return await asyncio.wait_for(
+            get_open_ai_plugin_info(addon_url, cache, spec_cache=spec_cache),
+            timeout,
         )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Timed out loading addon {addon_url}",
+        )
+
+
+def _parse_ai_plugin_conf(text: str) -> AIPluginConf:
+    # The content type isn't validated, sometimes response comes as text/json
+    return parse_obj_as(AIPluginConf, json.loads(text))
+
+
+def _openapi_spec_parser(
+    url: str, spec_cache: SpecCache | None
+) -> Callable[[str], _ParsedSpec]:
+    def parse(text: str) -> _ParsedSpec:
+        content_hash = hashlib.sha256(text.encode()).hexdigest()
+        spec = spec_cache and spec_cache.get(url, content_hash)
+        if spec is None:
+            spec = OpenAPISpec.from_text(text)  # type: ignore
+            if spec_cache is not None:
+                spec_cache.put(url, content_hash, spec)
 
+        return _ParsedSpec(spec=spec, content_hash=content_hash)
 
-@cached()
-async def _parse_openapi_spec(url: str) -> OpenAPISpec:
-    async with aget(url) as response:
-        return OpenAPISpec.from_text(await response.text())  # type: ignore
+    return parse
@@ -1,13 +1,58 @@
 from contextlib import asynccontextmanager
 from typing import AsyncIterator
 
-from aiohttp import ClientResponse, ClientSession
+from aiohttp import ClientResponse, ClientSession, DummyCookieJar, TCPConnector
+from pydantic import BaseModel, PositiveFloat, PositiveInt
+
+READ_CHUNK_SIZE = 64 * 1024
+
+_session: ClientSession | None = None
+
+
+class HTTPClientConf(BaseModel):
+    limit: PositiveInt = 100
+    """Maximum number of connections to all addons."""
+    limit_per_host: PositiveInt = 20
+    ttl_dns_cache: PositiveInt = 300
+    keepalive_timeout: PositiveFloat = 30
+
+
+async def open_session(conf: HTTPClientConf):
+    """Opens the session shared by all requests to the addons. Must be called from the event loop.
+    The session doesn't keep cookies: they would be sent on behalf of other users.
+    """
+    global _session
+    await close_session()
+    _session = ClientSession(
+        connector=TCPConnector(
+            limit=conf.limit,
+            limit_per_host=conf.limit_per_host,
+            ttl_dns_cache=conf.ttl_dns_cache,
+            keepalive_timeout=conf.keepalive_timeout,
+        ),
+        cookie_jar=DummyCookieJar(),
+    )
+
+
+async def close_session():
+    global _session
+    if _session is not None:
+        session, _session = _session, None
+        await session.close()
 
 
 @asynccontextmanager
 async def arequest(
     method: str, url: str, headers, **kwargs
 ) -> AsyncIterator[ClientResponse]:
+    if _session is not None:
+        async with _session.request(
+            method, url, headers=headers, **kwargs
+        ) as response:
+            yield response
+        return
+
+    # A session per request if the shared one isn't opened, e.g. in scripts
     async with ClientSession(headers=headers) as session:
         async with session.request(method, url, **kwargs) as response:
             yield response
@@ -18,3 +63,21 @@ async def arequest(
 async def aget(url: str, headers=None) -> AsyncIterator[ClientResponse]:
     async with arequest("GET", url, headers) as response:
         yield response
+
+
+async def read_limited(
+    response: ClientResponse, max_bytes: int
+) -> tuple[bytes, bool]:
+    """Reads at most max_bytes of the body. Returns the bytes read and whether the body was cut off."""
+    chunks: list[bytes] = []
+    size = 0
+    async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+        remaining = max_bytes - size
+        if len(chunk) > remaining:
+            chunks.append(chunk[:remaining])
+            return b"".join(chunks), True
+
+        chunks.append(chunk)
+        size += len(chunk)
+
+    return b"".join(chunks), False
@@ -0,0 +1,52 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _Call(Generic[V]):
+    def __init__(self, task: asyncio.Task[V]):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[K, V]):
+    """Coalesces concurrent calls with the same key into a single execution.
+    All callers get the same result or exception. A caller being cancelled
+    doesn't affect the others; the execution is cancelled once no callers are left.
+    """
+
+    def __init__(self):
+        self._calls: dict[K, _Call[V]] = {}
+
+    async def run(self, key: K, func: Callable[[], Awaitable[V]]) -> V:
+        call = self._calls.get(key)
+        if call is None:
+            call = self._start(key, func)
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Later callers start over instead of joining the cancelled execution
+                self._remove(key, call)
+                call.task.cancel()
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._calls
+
+    def _start(self, key: K, func: Callable[[], Awaitable[V]]) -> _Call[V]:
+        async def execute() -> V:
+            return await func()
+
+        call = _Call(asyncio.create_task(execute()))
+        self._calls[key] = call
+        call.task.add_done_callback(lambda _: self._remove(key, call))
+        return call
+
+    def _remove(self, key: K, call: _Call[V]):
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,84 @@
+import hashlib
+import importlib.metadata
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from langchain.tools import OpenAPISpec
+
+logger = logging.getLogger(__name__)
+
+# The serialized form follows the spec models, so a dependency upgrade starts a new cache
+_FORMAT = hashlib.sha256(
+    " ".join(
+        [
+            importlib.metadata.version("langchain-community"),
+            importlib.metadata.version("pydantic"),
+        ]
+    ).encode()
+).hexdigest()[:16]
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class SpecCache:
+    """On-disk cache of the parsed OpenAPI specs shared by the workers of the node.
+    Each spec url has a directory with a JSON file per spec version, named by the content hash.
+    Files are replaced atomically, so readers see either a complete file or none,
+    and the previous versions are removed once a new one is written.
+    Entries are validated when loaded. Still, the directory should be writable by the service only:
+    the specs define where the addon requests are sent.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory / _FORMAT
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, url: str, content_hash: str) -> OpenAPISpec | None:
+        path = self._path(url, content_hash)
+        try:
+            spec = OpenAPISpec.parse_raw(path.read_text())
+        except FileNotFoundError:
+            self._misses += 1
+            return None
+        except Exception:
+            logger.warning(f"Removing corrupted spec cache entry {path}")
+            path.unlink(missing_ok=True)
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        return spec
+
+    def put(self, url: str, content_hash: str, spec: OpenAPISpec):
+        url_directory = self.directory / _hash(url)
+        url_directory.mkdir(exist_ok=True)
+        path = self._path(url, content_hash)
+        fd, temp_path = tempfile.mkstemp(dir=url_directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(spec.json(by_alias=True, exclude_unset=True))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        for other_path in url_directory.glob("*.json"):
+            if other_path != path:
+                other_path.unlink(missing_ok=True)
+
+    def _path(self, url: str, content_hash: str) -> Path:
+        return self.directory / _hash(url) / f"{content_hash}.json"
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
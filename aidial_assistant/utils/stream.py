@@ -1,4 +1,10 @@
-from typing import AsyncIterator
+import asyncio
+import time
+from typing import AsyncIterator, Callable, TypeVar
+
+T = TypeVar("T")
+
+_END = object()
 
 
 class CumulativeStream(AsyncIterator[str]):
@@ -13,3 +19,51 @@ class CumulativeStream(AsyncIterator[str]):
         chunk = await anext(self.stream)
         self.buffer += chunk
         return chunk
+
+
+class PrefetchStream(AsyncIterator[T]):
+    """Reads the source in a background task, so the source doesn't wait while the consumer is busy.
+    Errors of the source are raised to the consumer once the items before them are consumed.
+    The stream must be closed to stop reading the source early.
+    """
+
+    def __init__(
+        self,
+        stream: AsyncIterator[T],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.clock = clock
+        self.finished_at: float | None = None
+        """The time the source was read to the end or failed."""
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._error: Exception | None = None
+        self._task = asyncio.create_task(self._drain(stream))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> T:
+        item = await self._queue.get()
+        if item is _END:
+            # Subsequent calls end as well
+            self._queue.put_nowait(_END)
+            if self._error is not None:
+                raise self._error
+            raise StopAsyncIteration
+
+        return item
+
+    async def aclose(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _drain(self, stream: AsyncIterator[T]):
+        try:
+            async for item in stream:
+                self._queue.put_nowait(item)
+        except Exception as e:
+            self._error = e
+        finally:
+            self.finished_at = self.clock()
+            self._queue.put_nowait(_END)
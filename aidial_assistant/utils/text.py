@@ -1,5 +1,7 @@
 from collections.abc import AsyncIterator
 
+TRUNCATION_MARKER = "\n[The response is truncated]"
+
 
 def decapitalize(s: str) -> str:
     if not s:
@@ -0,0 +1,108 @@
+"""Compares CPU time per streamed chunk of ModelClient.agenerate with the former chunk.dict() processing.
+
+Run with `python -m tests.benchmarks.model_client_benchmark [chunk count]`.
+"""
+
+import asyncio
+import sys
+import time
+from typing import Any, AsyncIterator
+from unittest.mock import Mock
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletionChunk
+
+from aidial_assistant.model.model_client import (
+    ExtraResultsCallback,
+    ModelClient,
+)
+from tests.utils.async_helper import to_async_iterator, to_awaitable_iterator
+
+DEFAULT_CHUNK_COUNT = 50000
+
+
+def _create_chunks(count: int) -> list[ChatCompletionChunk]:
+    def chunk(delta: dict[str, Any], **extra) -> ChatCompletionChunk:
+        return ChatCompletionChunk.parse_obj(
+            {
+                "id": "chatcmpl-1",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "gpt-4",
+                "choices": [{"index": 0, "delta": delta}],
+                **extra,
+            }
+        )
+
+    return [chunk({"content": f"token{i} "}) for i in range(count)] + [
+        chunk(
+            {},
+            usage={
+                "prompt_tokens": 1,
+                "completion_tokens": count,
+                "total_tokens": count + 1,
+            },
+            statistics={"discarded_messages": []},
+        )
+    ]
+
+
+async def _legacy_process(
+    chunks: AsyncIterator[ChatCompletionChunk],
+    callback: ExtraResultsCallback,
+) -> AsyncIterator[str]:
+    """The per-chunk work of agenerate before the fast path."""
+    async for chunk in chunks:
+        chunk_dict = chunk.dict()
+        usage = chunk_dict.get("usage")
+        if usage:
+            callback.on_prompt_tokens(usage["prompt_tokens"])
+
+        discarded_messages = (chunk_dict.get("statistics") or {}).get(
+            "discarded_messages"
+        )
+        if discarded_messages is not None:
+            callback.on_discarded_messages(discarded_messages)
+
+        delta = chunk.choices[0].delta
+        if delta.content:
+            yield delta.content
+
+
+async def _consume(stream: AsyncIterator[str]):
+    async for _ in stream:
+        pass
+
+
+def _measure(name: str, count: int, stream: AsyncIterator[str]):
+    start = time.process_time()
+    asyncio.run(_consume(stream))
+    elapsed = time.process_time() - start
+    print(f"{name}: {elapsed * 1e6 / count:.2f} us of CPU per chunk")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CHUNK_COUNT
+    chunks = _create_chunks(count)
+    callback = ExtraResultsCallback()
+
+    _measure(
+        "chunk.dict()",
+        count,
+        _legacy_process(to_async_iterator(chunks), callback),
+    )
+
+    openai_client = Mock(spec=AsyncOpenAI)
+    openai_client.chat = Mock()
+    openai_client.chat.completions.create.return_value = to_awaitable_iterator(
+        chunks
+    )
+    _measure(
+        "agenerate",
+        count,
+        ModelClient(openai_client, {}).agenerate([], callback),
+    )
+
+
+if __name__ == "__main__":
+    main()
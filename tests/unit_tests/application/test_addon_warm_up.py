@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aidial_assistant.application.addon_warm_up import AddonWarmUp
+from aidial_assistant.application.project_conf import AddonWarmUpConf
+from aidial_assistant.utils.metadata_cache import (
+    MetadataCache,
+    MetadataCacheConf,
+)
+
+SPEC = """openapi: 3.0.1
+info:
+  title: Test
+  version: v1
+paths: {}
+"""
+AI_PLUGIN = {
+    "schema_version": "v1",
+    "name_for_model": "test",
+    "name_for_human": "test",
+    "description_for_model": "test",
+    "description_for_human": "test",
+    "auth": {"type": "none"},
+    "api": {"type": "openapi", "url": "/openapi.yaml"},
+    "logo_url": "",
+    "contact_email": "",
+    "legal_info_url": "",
+}
+REQUESTS = web.AppKey("requests", list[str])
+
+
+def _addon_app() -> web.Application:
+    async def ai_plugin(request: web.Request) -> web.Response:
+        request.app[REQUESTS].append(request.path)
+        return web.json_response(AI_PLUGIN)
+
+    async def openapi(request: web.Request) -> web.Response:
+        request.app[REQUESTS].append(request.path)
+        return web.Response(text=SPEC)
+
+    app = web.Application()
+    app[REQUESTS] = []
+    app.router.add_get("/.well-known/ai-plugin.json", ai_plugin)
+    app.router.add_get("/openapi.yaml", openapi)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_addons_are_loaded_on_start():
+    app = _addon_app()
+    async with TestServer(app) as server:
+        url = str(server.make_url("/.well-known/ai-plugin.json"))
+        cache = MetadataCache(MetadataCacheConf())
+        warm_up = AddonWarmUp(
+            AddonWarmUpConf(urls=[url], refresh_interval=None), 10, cache
+        )
+
+        await warm_up.astart()
+
+        assert app[REQUESTS] == ["/.well-known/ai-plugin.json", "/openapi.yaml"]
+        assert cache.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_addons_are_skipped():
+    app = _addon_app()
+    async with TestServer(app) as server:
+        urls = [
+            str(server.make_url("/missing/.well-known/ai-plugin.json")),
+            str(server.make_url("/.well-known/ai-plugin.json")),
+        ]
+        warm_up = AddonWarmUp(
+            AddonWarmUpConf(urls=urls), 10, MetadataCache(MetadataCacheConf())
+        )
+
+        assert await warm_up.load() == 1
+
+
+@pytest.mark.asyncio
+async def test_addons_are_revalidated_periodically():
+    app = _addon_app()
+    async with TestServer(app) as server:
+        url = str(server.make_url("/.well-known/ai-plugin.json"))
+        warm_up = AddonWarmUp(
+            AddonWarmUpConf(urls=[url], refresh_interval=0.05),
+            10,
+            MetadataCache(MetadataCacheConf()),
+        )
+
+        await warm_up.astart()
+        await asyncio.sleep(0.2)
+        await warm_up.aclose()
+
+        assert len(app[REQUESTS]) >= 4
+        requests = len(app[REQUESTS])
+        await asyncio.sleep(0.1)
+        assert len(app[REQUESTS]) == requests
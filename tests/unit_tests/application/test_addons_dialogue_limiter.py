@@ -1,3 +1,4 @@
+from typing import AsyncIterator
 from unittest.mock import Mock, call
 
 import pytest
@@ -6,41 +7,80 @@ from aidial_assistant.application.addons_dialogue_limiter import (
     AddonsDialogueLimiter,
 )
 from aidial_assistant.chain.command_chain import LimitExceededException
-from aidial_assistant.model.model_client import ModelClient
+from aidial_assistant.model.model_client import (
+    ChatCompletionMessageParam,
+    ExtraResultsCallback,
+    ModelClient,
+)
+from aidial_assistant.tools_chain.tools_chain import ToolsChain
 from aidial_assistant.utils.open_ai import (
     assistant_message,
+    construct_tool,
     system_message,
     user_message,
 )
+from tests.utils.mocks import TestChainCallback, TestCommand
 
 MAX_TOKENS = 1
+REMINDER = "<reminder>"
+TOOL_NAME = "test"
+BEST_EFFORT_RESPONSE = "<best effort response>"
+
+
+def _count_message_tokens(message: ChatCompletionMessageParam) -> int:
+    return len(message["content"])  # type: ignore
+
+
+def _count_tokens(messages: list[ChatCompletionMessageParam]) -> int:
+    # Request overhead to make sure it doesn't affect the dialogue size
+    return 3 + sum(_count_message_tokens(message) for message in messages)
+
+
+def _model_client() -> Mock:
+    model = Mock(spec=ModelClient)
+    model.counts_tokens_locally = True
+    model.count_message_tokens.side_effect = _count_message_tokens
+    return model
+
+
+def _remote_model_client() -> Mock:
+    model = Mock(spec=ModelClient)
+    model.counts_tokens_locally = False
+    model.count_tokens.side_effect = _count_tokens
+    return model
+
+
+def _reinforce(
+    messages: list[ChatCompletionMessageParam],
+) -> list[ChatCompletionMessageParam]:
+    return messages[:-1] + [user_message(messages[-1]["content"] + REMINDER)]  # type: ignore
 
 
 @pytest.mark.asyncio
 async def test_dialogue_size_is_ok():
-    model = Mock(spec=ModelClient)
-    model.count_tokens.side_effect = [1, 2]
+    model = _model_client()
 
     limiter = AddonsDialogueLimiter(MAX_TOKENS, model)
     initial_messages = [system_message("a"), user_message("b")]
     dialogue_messages = [
         assistant_message("c"),
-        user_message("d"),
+        user_message(""),
     ]
 
     await limiter.verify_limit(initial_messages)
     await limiter.verify_limit(initial_messages + dialogue_messages)
 
-    assert model.count_tokens.call_args_list == [
-        call(initial_messages),
-        call(initial_messages + dialogue_messages),
+    assert model.count_message_tokens.call_args_list == [
+        call(system_message("a")),
+        call(user_message("b")),
+        call(assistant_message("c")),
+        call(user_message("")),
     ]
 
 
 @pytest.mark.asyncio
 async def test_dialogue_overflow():
-    model = Mock(spec=ModelClient)
-    model.count_tokens.side_effect = [1, 3]
+    model = _model_client()
 
     limiter = AddonsDialogueLimiter(MAX_TOKENS, model)
     initial_messages = [system_message("a"), user_message("b")]
@@ -57,3 +97,277 @@ async def test_dialogue_overflow():
         str(exc_info.value)
         == f"Addons dialogue limit exceeded. Max tokens: {MAX_TOKENS}, actual tokens: 2."
     )
+
+
+@pytest.mark.asyncio
+async def test_multi_turn_dialogue_matches_full_count():
+    max_tokens = 100
+    model = _model_client()
+    limiter = AddonsDialogueLimiter(max_tokens, model)
+    messages = [system_message("system"), user_message("query")]
+    turns = [
+        ('{"commands": [...]}', '{"responses": [...]}'),
+        ('{"commands": [..., ...]}', '{"responses": [..., ...]}'),
+        ("x" * 20, "y" * 30),
+    ]
+    initial_tokens = _count_tokens(_reinforce(messages))
+
+    await limiter.verify_limit(_reinforce(messages))
+    for index, (request, response) in enumerate(turns):
+        messages += [assistant_message(request), user_message(response)]
+        expected_tokens = _count_tokens(_reinforce(messages)) - initial_tokens
+
+        if expected_tokens > max_tokens:
+            assert index == len(turns) - 1
+            with pytest.raises(LimitExceededException) as exc_info:
+                await limiter.verify_limit(_reinforce(messages))
+            assert str(exc_info.value).endswith(
+                f"actual tokens: {expected_tokens}."
+            )
+        else:
+            await limiter.verify_limit(_reinforce(messages))
+
+    # Every message is counted once, besides the reinforced ones
+    assert model.count_message_tokens.call_count == 2 + len(turns) * 3
+
+
+@pytest.mark.asyncio
+async def test_repeated_messages_are_counted_once():
+    model = _model_client()
+    limiter = AddonsDialogueLimiter(MAX_TOKENS, model)
+    messages = [system_message("a"), user_message("b")]
+
+    await limiter.verify_limit(messages)
+    await limiter.verify_limit(messages)
+    await limiter.verify_limit(messages + [assistant_message("")])
+    await limiter.verify_limit(messages)
+
+    assert model.count_message_tokens.call_args_list == [
+        call(system_message("a")),
+        call(user_message("b")),
+        call(assistant_message("")),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_reported_prompt_tokens_skip_counting():
+    model = _remote_model_client()
+    limiter = AddonsDialogueLimiter(1000, model)
+    messages = [system_message("system"), user_message("query")]
+
+    await limiter.verify_limit(_reinforce(messages))
+    limiter.on_prompt_tokens(100)
+    for request, response in [("a", "b"), ("c", "d")]:
+        messages = messages + [
+            assistant_message(request),
+            user_message(response),
+        ]
+        await limiter.verify_limit(_reinforce(messages))
+        limiter.on_prompt_tokens(110)
+
+    assert model.count_tokens.call_args_list == []
+
+
+@pytest.mark.asyncio
+async def test_local_tokenizer_bounds_the_added_messages():
+    max_tokens = 39
+    model = _model_client()
+    limiter = AddonsDialogueLimiter(max_tokens, model)
+    messages = [system_message("system"), user_message("query")]
+
+    await limiter.verify_limit(_reinforce(messages))
+    limiter.on_prompt_tokens(100)
+    # The serialized messages are longer than the limit, but their local count is below it
+    messages = messages + [assistant_message("a" * 10), user_message("b" * 10)]
+    await limiter.verify_limit(_reinforce(messages))
+
+    # Only the messages changed since the last step are counted
+    assert model.count_message_tokens.call_args_list == [
+        call(user_message("query")),
+        call(assistant_message("a" * 10)),
+        call(user_message("b" * 10 + REMINDER)),
+    ]
+
+    limiter.on_prompt_tokens(125)
+    messages = messages + [assistant_message("c" * 10), user_message("d" * 10)]
+    with pytest.raises(LimitExceededException) as exc_info:
+        await limiter.verify_limit(_reinforce(messages))
+
+    assert str(exc_info.value).endswith("actual tokens: 40.")
+
+
+@pytest.mark.asyncio
+async def test_counting_when_limit_may_be_exceeded():
+    max_tokens = 30
+    model = _remote_model_client()
+    limiter = AddonsDialogueLimiter(max_tokens, model)
+    messages = [system_message("system"), user_message("query")]
+    initial_messages = _reinforce(messages)
+
+    await limiter.verify_limit(initial_messages)
+    limiter.on_prompt_tokens(100)
+    # The serialized messages are longer than the limit, but the actual count is below it
+    messages = messages + [assistant_message("a" * 10), user_message("b" * 10)]
+    await limiter.verify_limit(_reinforce(messages))
+
+    assert model.count_tokens.call_args_list == [
+        call(initial_messages),
+        call(_reinforce(messages)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_counting_without_reported_prompt_tokens():
+    model = _remote_model_client()
+    limiter = AddonsDialogueLimiter(1000, model)
+    messages = [system_message("a"), user_message("b")]
+
+    await limiter.verify_limit(messages)
+    limiter.on_prompt_tokens(100)
+    await limiter.verify_limit(messages + [assistant_message("c")])
+    # No prompt tokens reported for the previous step
+    await limiter.verify_limit(
+        messages + [assistant_message("c"), user_message("d")]
+    )
+
+    assert model.count_tokens.call_args_list == [
+        call(messages),
+        call(messages + [assistant_message("c"), user_message("d")]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_baseline_is_reported_for_initial_messages_only():
+    model = _remote_model_client()
+    limiter = AddonsDialogueLimiter(1000, model)
+    messages = [system_message("a"), user_message("b")]
+    first_step = messages + [assistant_message("c"), user_message("d")]
+    second_step = first_step + [assistant_message("e"), user_message("f")]
+
+    # The initial request reports no usage, so there is no baseline
+    await limiter.verify_limit(messages)
+    await limiter.verify_limit(first_step)
+    limiter.on_prompt_tokens(500)
+    await limiter.verify_limit(second_step)
+
+    assert model.count_tokens.call_args_list == [
+        call(messages),
+        call(first_step),
+        call(second_step),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_remaining_tokens():
+    limiter = AddonsDialogueLimiter(100, _model_client())
+    messages = [system_message("system"), user_message("query")]
+
+    await limiter.verify_limit(messages)
+    assert limiter.remaining_tokens() == 100
+
+    limiter.on_prompt_tokens(50)
+    messages = messages + [assistant_message("a"), user_message("b")]
+    await limiter.verify_limit(messages)
+    limiter.on_prompt_tokens(80)
+
+    assert limiter.remaining_tokens() == 70
+
+
+@pytest.mark.asyncio
+async def test_remote_counting_uses_one_request_per_step():
+    max_tokens = 100
+    model = _remote_model_client()
+    limiter = AddonsDialogueLimiter(max_tokens, model)
+    messages = [system_message("system"), user_message("query")]
+    initial_messages = _reinforce(messages)
+
+    await limiter.verify_limit(initial_messages)
+    turns = [("x" * 20, "y" * 30), ("z" * 20, "w" * 30)]
+    for request, response in turns:
+        messages += [assistant_message(request), user_message(response)]
+        await limiter.verify_limit(_reinforce(messages))
+
+    # The initial messages and every step are counted in a single request each
+    assert model.count_tokens.call_args_list == [
+        call(initial_messages),
+        call(_reinforce(messages[:4])),
+        call(_reinforce(messages)),
+    ]
+    assert model.count_message_tokens.call_args_list == []
+
+
+class ToolCallingModelClient(ModelClient):
+    """Calls the tool until told to stop, reporting the prompt size as the length of the contents."""
+
+    def __init__(self, max_tool_requests: int):
+        super().__init__(Mock(), {})
+        self.max_tool_requests = max_tool_requests
+        self.tool_requests = 0
+
+    @property
+    def counts_tokens_locally(self) -> bool:
+        return True
+
+    async def count_message_tokens(
+        self, message: ChatCompletionMessageParam
+    ) -> int:
+        return len(message.get("content") or "")  # type: ignore
+
+    async def agenerate(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        extra_results_callback: ExtraResultsCallback | None = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        if (
+            "tools" not in kwargs
+            or self.tool_requests >= self.max_tool_requests
+        ):
+            yield BEST_EFFORT_RESPONSE
+            return
+
+        self.tool_requests += 1
+        assert extra_results_callback is not None
+        extra_results_callback.on_prompt_tokens(
+            sum(
+                [
+                    await self.count_message_tokens(message)
+                    for message in messages
+                ]
+            )
+        )
+        extra_results_callback.on_tool_calls(
+            [
+                {
+                    "id": str(self.tool_requests),
+                    "type": "function",
+                    "function": {"name": TOOL_NAME, "arguments": "{}"},
+                }
+            ]
+        )
+
+
+@pytest.mark.asyncio
+async def test_tools_chain_dialogue_overflow():
+    model = ToolCallingModelClient(max_tool_requests=5)
+    command = TestCommand({TestCommand.execute_key({}): "x" * 5000})
+    chain = ToolsChain(
+        model,
+        {
+            TOOL_NAME: (
+                lambda: command,
+                construct_tool(TOOL_NAME, "", {}, []),
+            )
+        },
+    )
+    callback = TestChainCallback()
+
+    # The chain extends the same list of messages on every step
+    await chain.run_chat(
+        [user_message("query")],
+        callback,
+        AddonsDialogueLimiter(1000, model),
+    )
+
+    assert model.tool_requests == 1
+    assert callback.mock_result_callback.result == BEST_EFFORT_RESPONSE
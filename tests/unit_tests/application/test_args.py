@@ -0,0 +1,28 @@
+import shutil
+import sys
+from pathlib import Path
+
+from aidial_assistant.application.args import parse_args
+from aidial_assistant.application.project_conf import AddonsConf
+
+CONFIG_DIR = Path(__file__).parents[3] / "aidial_assistant" / "configs"
+
+
+def test_addons_conf_defaults_without_file(tmp_path, monkeypatch):
+    for name in ["chat.yaml", "open_ai.yaml"]:
+        shutil.copy(CONFIG_DIR / name, tmp_path / name)
+    monkeypatch.setattr(sys, "argv", ["app"])
+    monkeypatch.setenv("OPENAI_API_BASE", "http://localhost")
+
+    args = parse_args(tmp_path)
+
+    assert args.addons_conf == AddonsConf()
+
+
+def test_addons_conf_is_read_from_file(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["app"])
+    monkeypatch.setenv("OPENAI_API_BASE", "http://localhost")
+
+    args = parse_args(CONFIG_DIR)
+
+    assert args.addons_conf.metadata_cache.max_entries == 1000
@@ -1,5 +1,5 @@
 import json
-from unittest.mock import MagicMock, Mock, call
+from unittest.mock import ANY, MagicMock, Mock, call
 
 import httpx
 import pytest
@@ -15,7 +15,9 @@ from aidial_assistant.chain.command_chain import (
 )
 from aidial_assistant.chain.history import History, ScopedMessage
 from aidial_assistant.commands.base import Command, TextResult
+from aidial_assistant.commands.reply import Reply
 from aidial_assistant.model.model_client import ModelClient
+from aidial_assistant.utils.deadline import deadline_scope
 from aidial_assistant.utils.open_ai import (
     assistant_message,
     system_message,
@@ -30,6 +32,7 @@ BEST_EFFORT_ANSWER = "<best effort answer>"
 NO_TOKENS_ERROR = "No tokens left"
 FAILED_PROTOCOL_ERROR = "The next constructed API request is incorrect."
 LIMIT_EXCEEDED_ERROR = "<limit exceeded error>"
+DEADLINE_EXCEEDED_ERROR = "The time limit of the request is nearly reached."
 TEST_COMMAND_NAME = "<test command>"
 TEST_COMMAND_OUTPUT = "<test command result>"
 TEST_COMMAND_REQUEST = json.dumps(
@@ -239,6 +242,7 @@ async def test_model_request_limit_exceeded():
     result_callback = Mock(spec=ResultCallback)
     chain_callback.result_callback.return_value = result_callback
     model_request_limiter = Mock(spec=ModelRequestLimiter)
+    model_request_limiter.remaining_tokens.return_value = None
     model_request_limiter.verify_limit.side_effect = [
         None,
         LimitExceededException(LIMIT_EXCEEDED_ERROR),
@@ -258,7 +262,8 @@ async def test_model_request_limit_exceeded():
             [
                 system_message(f"system_prefix={SYSTEM_MESSAGE}"),
                 user_message(f"{USER_MESSAGE}{ENFORCE_JSON_FORMAT}"),
-            ]
+            ],
+            ANY,
         ),
         call(
             [
@@ -285,3 +290,81 @@ async def test_model_request_limit_exceeded():
             ]
         ),
     ]
+
+
+@pytest.mark.asyncio
+async def test_deadline_nearly_reached():
+    model_client = Mock(spec=ModelClient)
+    model_client.agenerate.side_effect = to_async_strings(
+        [TEST_COMMAND_REQUEST, BEST_EFFORT_ANSWER]
+    )
+    test_command = Mock(spec=Command)
+    test_command.execute.return_value = TextResult(TEST_COMMAND_OUTPUT)
+    command_chain = CommandChain(
+        name="TEST",
+        model_client=model_client,
+        command_dict={TEST_COMMAND_NAME: lambda *_: test_command},
+        max_retry_count=0,
+    )
+    chain_callback = MagicMock(spec=ChainCallback)
+    result_callback = Mock(spec=ResultCallback)
+    chain_callback.result_callback.return_value = result_callback
+    succeeded_dialogue = [
+        assistant_message(TEST_COMMAND_REQUEST),
+        user_message(TEST_COMMAND_RESPONSE),
+    ]
+
+    # Only the reserve is left from the start, but the first step is still made
+    with deadline_scope(timeout=60, reserve=60):
+        await command_chain.run_chat(
+            history=TEST_HISTORY, callback=chain_callback
+        )
+
+    assert result_callback.on_result.call_args_list == [
+        call(BEST_EFFORT_ANSWER)
+    ]
+    assert model_client.agenerate.call_args_list == [
+        call(
+            [
+                system_message(f"system_prefix={SYSTEM_MESSAGE}"),
+                user_message(f"{USER_MESSAGE}{ENFORCE_JSON_FORMAT}"),
+            ]
+        ),
+        call(
+            [
+                system_message(SYSTEM_MESSAGE),
+                user_message(
+                    f"user_message={USER_MESSAGE}, error={DEADLINE_EXCEEDED_ERROR}, dialogue={succeeded_dialogue}"
+                ),
+            ]
+        ),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_prompt_tokens_are_reported_to_limiter():
+    def agenerate(messages, extra_results_callback, **kwargs):
+        extra_results_callback.on_prompt_tokens(42)
+        return to_async_string(
+            '{"commands": [{"command": "reply", "arguments": {"message": "a"}}]}'
+        )
+
+    model_client = Mock(spec=ModelClient)
+    model_client.agenerate.side_effect = agenerate
+    command_chain = CommandChain(
+        name="TEST",
+        model_client=model_client,
+        command_dict={Reply.token(): Reply},
+        max_retry_count=0,
+    )
+    chain_callback = MagicMock(spec=ChainCallback)
+    model_request_limiter = Mock(spec=ModelRequestLimiter)
+    model_request_limiter.remaining_tokens.return_value = None
+
+    await command_chain.run_chat(
+        history=TEST_HISTORY,
+        callback=chain_callback,
+        model_request_limiter=model_request_limiter,
+    )
+
+    assert model_request_limiter.on_prompt_tokens.call_args_list == [call(42)]
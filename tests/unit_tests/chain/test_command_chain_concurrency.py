@@ -0,0 +1,198 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator
+from unittest.mock import MagicMock, Mock
+
+import pytest
+from jinja2 import Template
+
+from aidial_assistant.chain.callbacks.chain_callback import ChainCallback
+from aidial_assistant.chain.callbacks.command_callback import CommandCallback
+from aidial_assistant.chain.command_chain import CommandChain, _overlap
+from aidial_assistant.chain.history import History, ScopedMessage
+from aidial_assistant.commands.base import (
+    Command,
+    ExecutionCallback,
+    ResultObject,
+    TextResult,
+)
+from aidial_assistant.commands.reply import Reply
+from aidial_assistant.model.model_client import ModelClient
+from aidial_assistant.utils.open_ai import user_message
+from tests.utils.async_helper import to_async_string, to_async_strings
+
+COMMAND_NAME = "test"
+COMMAND_COUNT = 4
+HISTORY = History(
+    assistant_system_message_template=Template(""),
+    best_effort_template=Template(""),
+    scoped_messages=[ScopedMessage(message=user_message(""), user_index=0)],
+)
+REQUEST = json.dumps(
+    {
+        "commands": [
+            {"command": COMMAND_NAME, "arguments": {"index": index}}
+            for index in range(COMMAND_COUNT)
+        ]
+    }
+)
+REPLY = json.dumps(
+    {"commands": [{"command": Reply.token(), "arguments": {"message": ""}}]}
+)
+
+
+class Execution:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    async def run(self, index: int) -> str:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            # Later commands complete earlier
+            await asyncio.sleep(0.01 * (COMMAND_COUNT - index))
+        finally:
+            self.running -= 1
+
+        if index == 1:
+            raise ValueError("failed")
+
+        return f"result {index}"
+
+
+class SleepingCommand(Command):
+    def __init__(self, execution: Execution):
+        self.execution = execution
+
+    @staticmethod
+    def token() -> str:
+        return COMMAND_NAME
+
+    async def execute(
+        self, args: dict[str, Any], execution_callback: ExecutionCallback
+    ) -> ResultObject:
+        return TextResult(await self.execution.run(args["index"]))
+
+
+async def _run_chat(
+    max_concurrent_commands: int,
+    request: str = REQUEST,
+) -> tuple[Execution, MagicMock, list[MagicMock]]:
+    model_client = Mock(spec=ModelClient)
+    model_client.agenerate.side_effect = to_async_strings([request, REPLY])
+    execution = Execution()
+    chain = CommandChain(
+        name="TEST",
+        model_client=model_client,
+        command_dict={
+            COMMAND_NAME: lambda: SleepingCommand(execution),
+            Reply.token(): Reply,
+        },
+        max_concurrent_commands=max_concurrent_commands,
+    )
+    chain_callback = MagicMock(spec=ChainCallback)
+    command_callbacks: list[MagicMock] = []
+
+    def command_callback() -> MagicMock:
+        command_callbacks.append(MagicMock(spec=CommandCallback))
+        return command_callbacks[-1]
+
+    chain_callback.command_callback.side_effect = command_callback
+
+    await chain.run_chat(HISTORY, chain_callback)
+
+    return execution, chain_callback, command_callbacks
+
+
+@pytest.mark.parametrize("max_concurrent_commands", [1, 2, COMMAND_COUNT])
+@pytest.mark.asyncio
+async def test_responses_are_in_command_order(max_concurrent_commands: int):
+    execution, chain_callback, command_callbacks = await _run_chat(
+        max_concurrent_commands
+    )
+
+    assert execution.max_running == max_concurrent_commands
+    [(request, response), _] = chain_callback.on_state.call_args
+    assert json.loads(request) == json.loads(REQUEST)
+    assert json.loads(response) == {
+        "responses": [
+            {"status": "SUCCESS", "response": "result 0"},
+            {"status": "ERROR", "response": "failed"},
+            {"status": "SUCCESS", "response": "result 2"},
+            {"status": "SUCCESS", "response": "result 3"},
+        ]
+    }
+
+    # Every stage is opened and closed once, the failed one with the error
+    assert len(command_callbacks) == COMMAND_COUNT
+    for index, callback in enumerate(command_callbacks):
+        callback.__enter__.assert_called_once()
+        callback.__exit__.assert_called_once()
+        [exc_type, *_] = callback.__exit__.call_args.args
+        assert exc_type == (ValueError if index == 1 else None)
+
+
+@pytest.mark.asyncio
+async def test_stage_is_closed_if_later_command_is_malformed():
+    malformed_request = json.dumps(
+        {
+            "commands": [
+                {"command": COMMAND_NAME, "arguments": {"index": 0}},
+                {"command": "unknown", "arguments": {}},
+            ]
+        }
+    )
+
+    _, _, command_callbacks = await _run_chat(2, malformed_request)
+
+    [callback] = command_callbacks
+    callback.__enter__.assert_called_once()
+    callback.__exit__.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_model_streams_while_command_executes():
+    delay = 0.1
+
+    async def slow_stream() -> AsyncIterator[str]:
+        commands = json.loads(REQUEST)["commands"][:2]
+        yield '{"commands": [' + json.dumps(commands[0]) + ","
+        # Generating the rest of the reply takes as long as executing the first command
+        await asyncio.sleep(delay)
+        yield json.dumps(commands[1]) + "]}"
+
+    class SlowCommand(Command):
+        @staticmethod
+        def token() -> str:
+            return COMMAND_NAME
+
+        async def execute(
+            self, args: dict[str, Any], execution_callback: ExecutionCallback
+        ) -> ResultObject:
+            if args["index"] == 0:
+                await asyncio.sleep(delay)
+            return TextResult("")
+
+    model_client = Mock(spec=ModelClient)
+    model_client.agenerate.side_effect = [slow_stream(), to_async_string(REPLY)]
+    chain = CommandChain(
+        name="TEST",
+        model_client=model_client,
+        command_dict={COMMAND_NAME: SlowCommand, Reply.token(): Reply},
+    )
+
+    started_at = time.monotonic()
+    await chain.run_chat(HISTORY, MagicMock(spec=ChainCallback))
+    elapsed = time.monotonic() - started_at
+
+    # Sequential commands, but the reply is streamed while the first one executes
+    assert elapsed < delay * 1.8
+
+
+def test_overlap():
+    intervals = [(0.0, 2.0), (1.0, 3.0), (5.0, 6.0), (9.0, 12.0)]
+
+    assert _overlap(intervals, 10.0) == 3.0 + 1.0 + 1.0
+    assert _overlap([], 10.0) == 0.0
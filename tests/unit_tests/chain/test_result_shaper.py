@@ -0,0 +1,84 @@
+import json
+
+from aidial_assistant.chain.command_result import CommandResult, Status
+from aidial_assistant.chain.result_shaper import (
+    MIN_RESULT_CHARS,
+    shape_responses,
+    shape_result,
+)
+from aidial_assistant.utils.text import TRUNCATION_MARKER
+
+
+def test_small_result_is_untouched():
+    text = '{"a":  [1, 2, 3]}'
+
+    assert shape_result(text, len(text)) == text
+
+
+def test_long_array_is_trimmed():
+    text = json.dumps({"items": list(range(1000))})
+
+    shaped = json.loads(shape_result(text, 300))
+
+    items = shaped["items"]
+    assert items[:-1] == list(range(len(items) - 1))
+    assert items[-1] == f"... {1000 - len(items) + 1} more items"
+
+
+def test_deep_nesting_is_elided():
+    value: dict = {"leaf": "x" * 100}
+    for _ in range(20):
+        value = {"nested": value}
+    text = json.dumps(value)
+
+    shaped = shape_result(text, 100)
+
+    assert len(shaped) <= 100
+    assert "{...}" in shaped
+    json.loads(shaped)
+
+
+def test_long_string_is_clipped():
+    text = json.dumps({"description": "x" * 10000, "id": 1})
+
+    shaped = json.loads(shape_result(text, 600))
+
+    assert shaped["id"] == 1
+    assert shaped["description"].endswith("...")
+    assert len(shaped["description"]) < 600
+
+
+def test_text_is_cut_off():
+    shaped = shape_result("x" * 1000, 100)
+
+    assert shaped == "x" * (100 - len(TRUNCATION_MARKER)) + TRUNCATION_MARKER
+
+
+def test_budget_is_shared_between_responses():
+    responses = [
+        CommandResult(status=Status.SUCCESS, response="a" * 1000),
+        CommandResult(status=Status.ERROR, response="b" * 1000),
+    ]
+
+    shaped = shape_responses(responses, 300, "r" * 200)
+
+    # (300 tokens * 4 chars - 200 request chars) / 2 responses
+    assert [len(response["response"]) for response in shaped] == [500, 500]
+    assert [response["status"] for response in shaped] == [
+        Status.SUCCESS,
+        Status.ERROR,
+    ]
+
+
+def test_exhausted_budget_keeps_minimal_result():
+    responses = [CommandResult(status=Status.SUCCESS, response="a" * 1000)]
+
+    [shaped] = shape_responses(responses, 0)
+
+    assert len(shaped["response"]) == MIN_RESULT_CHARS
+
+
+def test_unknown_budget():
+    responses = [CommandResult(status=Status.SUCCESS, response="a" * 1000)]
+
+    assert shape_responses(responses, None) == responses
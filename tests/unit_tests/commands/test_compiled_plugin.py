@@ -0,0 +1,96 @@
+from langchain.tools import OpenAPISpec
+
+from aidial_assistant.commands.compiled_plugin import (
+    CompiledPluginCache,
+    compile_plugin,
+)
+from aidial_assistant.open_api.requester import ParamMapping
+from aidial_assistant.utils.open_ai_plugin import (
+    AIPluginConf,
+    ApiConf,
+    AuthConf,
+    OpenAIPluginInfo,
+)
+
+SPEC = """
+openapi: 3.0.1
+info:
+  title: Weather
+  version: v1
+servers:
+  - url: /api
+paths:
+  /forecast/{city}:
+    get:
+      operationId: getForecast
+      description: Returns the forecast
+      parameters:
+        - name: city
+          in: path
+          required: true
+          schema:
+            type: string
+        - name: days
+          in: query
+          schema:
+            type: integer
+"""
+
+
+def _plugin_info(content_hash: str) -> OpenAIPluginInfo:
+    return OpenAIPluginInfo(
+        ai_plugin=AIPluginConf(
+            schema_version="v1",
+            name_for_model="weather",
+            name_for_human="Weather",
+            description_for_model="Weather forecasts",
+            description_for_human="Weather forecasts",
+            auth=AuthConf(type="none"),
+            api=ApiConf(type="openapi", url="https://weather.com/openapi.yaml"),
+            logo_url="",
+            contact_email="",
+            legal_info_url="",
+        ),
+        open_api=OpenAPISpec.from_text(SPEC),
+        open_api_hash=content_hash,
+    )
+
+
+def test_compile_plugin():
+    compiled_plugin = compile_plugin(_plugin_info("hash"))
+
+    operation = compiled_plugin.operations["getForecast"]
+    assert operation.base_url == "https://weather.com/api"
+    assert compiled_plugin.param_mappings == {
+        "getForecast": ParamMapping(
+            query_params=["days"], body_params=[], path_params=["city"]
+        )
+    }
+    assert compiled_plugin.tools["getForecast"]["function"]["parameters"] == {
+        "type": "object",
+        "properties": {
+            "city": {"type": "string"},
+            "days": {"type": "integer"},
+        },
+        "required": ["city"],
+    }
+    assert compiled_plugin.api_schema == operation.to_typescript()
+    system_message = compiled_plugin.system_message_template.render()
+    assert "Weather forecasts" in system_message
+    assert compiled_plugin.api_schema in system_message
+
+
+def test_plugin_is_compiled_once_per_spec_version():
+    cache = CompiledPluginCache(max_entries=10, max_bytes=1024 * 1024)
+    first = cache.get(_plugin_info("first"))
+
+    assert cache.get(_plugin_info("first")) is first
+    assert cache.get(_plugin_info("second")) is not first
+
+
+def test_compiled_plugins_are_evicted():
+    cache = CompiledPluginCache(max_entries=1, max_bytes=1024 * 1024)
+    first = cache.get(_plugin_info("first"))
+    cache.get(_plugin_info("second"))
+
+    assert cache.get(_plugin_info("first")) is not first
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator
+from unittest.mock import Mock
+
+import pytest
+from jinja2 import Template
+from langchain.tools import OpenAPISpec
+from openai.types.chat import ChatCompletionMessageParam
+from typing_extensions import override
+
+from aidial_assistant.chain.command_chain import CommandChain
+from aidial_assistant.chain.history import History, ScopedMessage
+from aidial_assistant.commands.reply import Reply
+from aidial_assistant.commands.run_plugin import PluginInfo, RunPlugin
+from aidial_assistant.model.model_client import (
+    ExtraResultsCallback,
+    ModelClient,
+)
+from aidial_assistant.utils.deadline import deadline_scope, remaining_time
+from aidial_assistant.utils.open_ai import user_message
+from aidial_assistant.utils.open_ai_plugin import (
+    AIPluginConf,
+    ApiConf,
+    AuthConf,
+    OpenAIPluginInfo,
+)
+from tests.utils.mocks import TestChainCallback
+
+SPEC = """
+openapi: 3.0.1
+info:
+  title: Weather
+  version: v1
+servers:
+  - url: https://weather.com/api
+paths:
+  /forecast:
+    get:
+      operationId: getForecast
+      description: Returns the forecast
+"""
+ADDON_NAME = "weather"
+TIMEOUT = 0.1
+RESERVE = 0.3
+
+
+class SlowModelClient(ModelClient):
+    """Takes all the time it is given. Asks for the addon once, then replies with plain text."""
+
+    def __init__(self):
+        super().__init__(Mock(), {})
+        self.remaining_times: list[float] = []
+
+    @override
+    async def agenerate(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        extra_results_callback: ExtraResultsCallback | None = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        remaining = remaining_time()
+        assert remaining is not None
+        self.remaining_times.append(remaining)
+        await asyncio.sleep(remaining)
+
+        if len(self.remaining_times) == 1:
+            yield json.dumps(
+                {
+                    "commands": [
+                        {
+                            "command": ADDON_NAME,
+                            "arguments": {"query": "Forecast"},
+                        }
+                    ]
+                }
+            )
+        else:
+            yield "Sunny"
+
+
+def _plugin_info() -> PluginInfo:
+    return PluginInfo(
+        info=OpenAIPluginInfo(
+            ai_plugin=AIPluginConf(
+                schema_version="v1",
+                name_for_model=ADDON_NAME,
+                name_for_human="Weather",
+                description_for_model="Weather forecasts",
+                description_for_human="Weather forecasts",
+                auth=AuthConf(type="none"),
+                api=ApiConf(
+                    type="openapi", url="https://weather.com/openapi.yaml"
+                ),
+                logo_url="",
+                contact_email="",
+                legal_info_url="",
+            ),
+            open_api=OpenAPISpec.from_text(SPEC),
+            open_api_hash="hash",
+        ),
+        auth=None,
+    )
+
+
+@pytest.mark.asyncio
+async def test_final_answers_share_reserve():
+    model = SlowModelClient()
+    chain = CommandChain(
+        name="TEST",
+        model_client=model,
+        command_dict={
+            ADDON_NAME: lambda: RunPlugin(model, _plugin_info(), 100),
+            Reply.token(): Reply,
+        },
+    )
+    history = History(
+        assistant_system_message_template=Template(""),
+        best_effort_template=Template(""),
+        scoped_messages=[
+            ScopedMessage(message=user_message("query"), user_index=0)
+        ],
+    )
+
+    started_at = time.monotonic()
+    with deadline_scope(TIMEOUT, RESERVE):
+        await chain.run_chat(history, TestChainCallback())
+    elapsed = time.monotonic() - started_at
+
+    # The addon spends the reserve on its best effort answer, so none is left for the outer one
+    assert model.remaining_times[-2] > RESERVE / 2
+    assert model.remaining_times[-1] < RESERVE / 2
+    assert elapsed < TIMEOUT + RESERVE * 1.5
@@ -0,0 +1,123 @@
+from typing import AsyncIterator
+from unittest.mock import Mock
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from langchain.tools import OpenAPISpec
+from openai.types.chat import ChatCompletionMessageParam
+from typing_extensions import override
+
+from aidial_assistant.commands.addon_context import AddonContext
+from aidial_assistant.commands.run_plugin import PluginInfo
+from aidial_assistant.commands.run_tool import RunTool
+from aidial_assistant.model.model_client import (
+    ExtraResultsCallback,
+    ModelClient,
+)
+from aidial_assistant.utils.open_ai_plugin import (
+    AIPluginConf,
+    ApiConf,
+    AuthConf,
+    OpenAIPluginInfo,
+)
+from aidial_assistant.utils.text import TRUNCATION_MARKER
+
+SPEC = """
+openapi: 3.0.1
+info:
+  title: Weather
+  version: v1
+servers:
+  - url: /api
+paths:
+  /forecast:
+    get:
+      operationId: getForecast
+      description: Returns the forecast
+"""
+MAX_RESPONSE_BYTES = 100
+
+
+class ToolCallingModelClient(ModelClient):
+    """Calls the forecast tool once and records the messages of the second request."""
+
+    def __init__(self):
+        super().__init__(Mock(), {})
+        self.requests: list[list[ChatCompletionMessageParam]] = []
+
+    @override
+    async def agenerate(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        extra_results_callback: ExtraResultsCallback | None = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        self.requests.append(messages)
+        if len(self.requests) == 1:
+            assert extra_results_callback is not None
+            extra_results_callback.on_tool_calls(
+                [
+                    {
+                        "id": "1",
+                        "type": "function",
+                        "function": {
+                            "name": "getForecast",
+                            "arguments": "{}",
+                        },
+                    }
+                ]
+            )
+            return
+
+        yield "Sunny"
+
+
+def _plugin_info(server: TestServer) -> PluginInfo:
+    return PluginInfo(
+        info=OpenAIPluginInfo(
+            ai_plugin=AIPluginConf(
+                schema_version="v1",
+                name_for_model="weather",
+                name_for_human="Weather",
+                description_for_model="Weather forecasts",
+                description_for_human="Weather forecasts",
+                auth=AuthConf(type="none"),
+                api=ApiConf(
+                    type="openapi", url=str(server.make_url("/openapi.yaml"))
+                ),
+                logo_url="",
+                contact_email="",
+                legal_info_url="",
+            ),
+            open_api=OpenAPISpec.from_text(SPEC),
+            open_api_hash="hash",
+        ),
+        auth=None,
+    )
+
+
+@pytest.mark.asyncio
+async def test_tool_responses_are_capped():
+    async def forecast(_: web.Request) -> web.Response:
+        return web.Response(text="x" * 10 * MAX_RESPONSE_BYTES)
+
+    app = web.Application()
+    app.router.add_get("/api/forecast", forecast)
+    model = ToolCallingModelClient()
+    async with TestServer(app) as server:
+        run_tool = RunTool(
+            model,
+            _plugin_info(server),
+            100,
+            AddonContext(max_response_bytes=MAX_RESPONSE_BYTES),
+        )
+
+        result = await run_tool.execute({"query": "Forecast"}, Mock())
+
+    assert result.text == "Sunny"
+    tool_message = model.requests[1][-1]
+    assert tool_message["role"] == "tool"
+    assert (
+        tool_message["content"] == "x" * MAX_RESPONSE_BYTES + TRUNCATION_MARKER
+    )
@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+import pytest
+
+from aidial_assistant.model.client_pool import (
+    ConnectionPoolConf,
+    OpenAIClientPool,
+)
+
+ENDPOINT = "http://localhost:5001"
+API_VERSION = "2023-12-01-preview"
+IDLE_TIMEOUT = 60
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_is_shared():
+    pool = OpenAIClientPool(ConnectionPoolConf())
+
+    first = await pool.get_client(ENDPOINT, API_VERSION, "key1")
+    second = await pool.get_client(ENDPOINT, API_VERSION, "key2")
+    other = await pool.get_client(ENDPOINT, "2024-02-01", "key1")
+
+    assert first.api_key == "key1"
+    assert second.api_key == "key2"
+    assert first._client is second._client
+    assert first._client is not other._client
+
+    await pool.aclose()
+
+    assert first._client.is_closed
+    assert other._client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_idle_pool_is_evicted():
+    pool = OpenAIClientPool(ConnectionPoolConf(idle_timeout=IDLE_TIMEOUT))
+
+    with patch("aidial_assistant.model.client_pool.time") as time_mock:
+        time_mock.monotonic.return_value = 0
+        idle = await pool.get_http_client(ENDPOINT, "2024-02-01")
+        used = await pool.get_http_client(ENDPOINT, API_VERSION)
+
+        time_mock.monotonic.return_value = IDLE_TIMEOUT
+        assert await pool.get_http_client(ENDPOINT, API_VERSION) is used
+
+        time_mock.monotonic.return_value = IDLE_TIMEOUT + 1
+        assert await pool.get_http_client(ENDPOINT, API_VERSION) is used
+
+    assert idle.is_closed
+    assert not used.is_closed
+
+    await pool.aclose()
@@ -0,0 +1,191 @@
+import os
+import time
+from pathlib import Path
+from unittest.mock import Mock, call
+
+import pytest
+from openai import AsyncOpenAI
+
+from aidial_assistant.model.completion_cache import (
+    CompletionCache,
+    DiskCompletionCacheBackend,
+    MemoryCompletionCacheBackend,
+    merge_model_chunks,
+)
+from aidial_assistant.model.model_chunk import ModelChunk
+from aidial_assistant.model.model_client import (
+    ExtraResultsCallback,
+    ModelClient,
+)
+from aidial_assistant.model.sse_transport import SSETransport
+from aidial_assistant.utils.open_ai import Usage, user_message
+from aidial_assistant.utils.text import join_string
+from tests.utils.async_helper import to_async_iterator
+
+MODEL_ARGS = {"model": "gpt-4", "temperature": 0}
+USAGE = Usage(prompt_tokens=10, completion_tokens=3)
+CHUNKS = [
+    ModelChunk("one, ", None, None, None, None),
+    ModelChunk(
+        None,
+        [
+            {
+                "index": 0,
+                "id": "call_1",
+                "type": "function",
+                "function": {"name": "tool", "arguments": '{"a"'},
+            }
+        ],
+        None,
+        None,
+        None,
+    ),
+    ModelChunk(
+        "two",
+        [{"index": 0, "function": {"arguments": ": 1}"}}],
+        None,
+        None,
+        None,
+    ),
+    ModelChunk(None, None, "tool_calls", USAGE, [0]),
+]
+
+
+def _model_client(cache: CompletionCache, model_args=None) -> ModelClient:
+    transport = Mock(spec=SSETransport)
+    transport.stream.side_effect = lambda *args: to_async_iterator(CHUNKS)
+    return ModelClient(
+        Mock(spec=AsyncOpenAI),
+        model_args or MODEL_ARGS,
+        transport=transport,
+        completion_cache=cache,
+    )
+
+
+def _memory_cache() -> CompletionCache:
+    return CompletionCache(
+        MemoryCompletionCacheBackend(max_entries=10, max_bytes=10000, ttl=60)
+    )
+
+
+async def _generate(model_client: ModelClient):
+    callback = Mock(spec=ExtraResultsCallback)
+    content = await join_string(
+        model_client.agenerate([user_message("query")], callback, max_tokens=5)
+    )
+    return content, callback.mock_calls
+
+
+def test_merge_model_chunks():
+    assert merge_model_chunks(CHUNKS) == ModelChunk(
+        "one, two",
+        [
+            {
+                "index": 0,
+                "id": "call_1",
+                "type": "function",
+                "function": {"name": "tool", "arguments": '{"a": 1}'},
+            }
+        ],
+        "tool_calls",
+        USAGE,
+        [0],
+    )
+    # The streamed chunks are left intact
+    assert CHUNKS[1].tool_calls[0]["function"]["arguments"] == '{"a"'  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_replays_completion():
+    cache = _memory_cache()
+    model_client = _model_client(cache)
+
+    expected = await _generate(model_client)
+    actual = await _generate(model_client)
+
+    assert actual == expected
+    assert expected[0] == "one, two"
+    assert call.on_prompt_tokens(10) in expected[1]
+    assert model_client.transport.stream.call_count == 1  # type: ignore
+    assert cache.hits == 1
+    assert cache.misses == 1
+    # Only the completion received from the model is counted
+    assert model_client.total_prompt_tokens == 10
+    assert model_client.total_completion_tokens == 3
+
+
+@pytest.mark.asyncio
+async def test_different_args_are_not_replayed():
+    cache = _memory_cache()
+    model_client = _model_client(cache)
+
+    await _generate(model_client)
+    await join_string(model_client.agenerate([user_message("query")]))
+
+    assert model_client.transport.stream.call_count == 2  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_non_zero_temperature_is_not_cached():
+    cache = _memory_cache()
+    model_client = _model_client(cache, {"model": "gpt-4", "temperature": 1})
+
+    await _generate(model_client)
+    await _generate(model_client)
+
+    assert model_client.transport.stream.call_count == 2  # type: ignore
+    assert cache.misses == 0
+
+
+@pytest.mark.asyncio
+async def test_disk_backend(tmp_path: Path):
+    backend = DiskCompletionCacheBackend(
+        tmp_path, max_entries=2, max_bytes=10000, ttl=60
+    )
+    chunk = merge_model_chunks(CHUNKS)
+
+    now = time.time()
+    for age, key in [(20, "a"), (10, "b"), (0, "c")]:
+        await backend.put(key, chunk)
+        os.utime(tmp_path / f"{key}.json", (now - age, now - age))
+
+    assert await backend.get("a") is None
+    assert await backend.get("b") == chunk
+    assert await backend.get("c") == chunk
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "b.json",
+        "c.json",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_disk_backend_ttl(tmp_path: Path):
+    backend = DiskCompletionCacheBackend(
+        tmp_path, max_entries=10, max_bytes=10000, ttl=60
+    )
+    await backend.put("a", merge_model_chunks(CHUNKS))
+    os.utime(tmp_path / "a.json", (0, 0))
+
+    assert await backend.get("a") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_disk_backend_evicts_by_write_count(tmp_path: Path):
+    backend = DiskCompletionCacheBackend(
+        tmp_path, max_entries=50, max_bytes=10**6, ttl=60
+    )
+    chunk = merge_model_chunks(CHUNKS)
+
+    now = time.time()
+    for index in range(backend.eviction_interval - 1):
+        await backend.put(str(index), chunk)
+        os.utime(tmp_path / f"{index}.json", (0, 0))
+
+    # The expired entries are kept until the eviction is due
+    assert len(list(tmp_path.iterdir())) == backend.eviction_interval - 1
+
+    await backend.put("last", chunk)
+    os.utime(tmp_path / "last.json", (now, now))
+
+    assert [path.name for path in tmp_path.iterdir()] == ["last.json"]
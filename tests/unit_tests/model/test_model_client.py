@@ -1,9 +1,13 @@
-from typing import Any
-from unittest.mock import Mock, call
+import asyncio
+from typing import Any, AsyncIterator
+from unittest.mock import ANY, Mock, call
 
 import pytest
 from openai import AsyncOpenAI
-from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCall
+from openai.types.chat.chat_completion_chunk import (
+    ChoiceDeltaToolCall,
+    ChoiceDeltaToolCallFunction,
+)
 from pydantic import BaseModel
 
 from aidial_assistant.model.model_client import (
@@ -11,6 +15,9 @@ from aidial_assistant.model.model_client import (
     ModelClient,
     ReasonLengthException,
 )
+from aidial_assistant.model.token_count_cache import TokenCountCache
+from aidial_assistant.model.tokenizer import CHAT_FORMATS, MessageTokenizer
+from aidial_assistant.utils.deadline import deadline_scope
 from aidial_assistant.utils.open_ai import (
     Usage,
     assistant_message,
@@ -133,3 +140,223 @@ async def test_api_args():
             extra_body={"extra": "args"},
         )
     ]
+
+
+@pytest.mark.asyncio
+async def test_timeout_is_capped_by_deadline():
+    openai_client = Mock(spec=AsyncOpenAI)
+    openai_client.chat = Mock()
+    openai_client.chat.completions.create.return_value = to_awaitable_iterator(
+        []
+    )
+    model_client = ModelClient(openai_client, MODEL_ARGS)
+
+    with deadline_scope(timeout=60, reserve=10):
+        await join_string(model_client.agenerate([user_message("a")]))
+
+    assert openai_client.chat.completions.create.call_args_list == [
+        call(
+            messages=[{"role": "user", "content": "a"}],
+            **MODEL_ARGS,
+            stream=True,
+            extra_body={},
+            timeout=ANY,
+        )
+    ]
+    timeout = openai_client.chat.completions.create.call_args.kwargs["timeout"]
+    assert 0 < timeout <= 60
+
+
+@pytest.mark.asyncio
+async def test_stream_is_limited_by_deadline_in_total():
+    async def slow_stream() -> AsyncIterator[Chunk]:
+        # Every read is quick, but the whole stream exceeds the deadline
+        for _ in range(10):
+            await asyncio.sleep(0.05)
+            yield Chunk(choices=[Choice(delta=Delta(content="chunk"))])
+
+    openai_client = Mock(spec=AsyncOpenAI)
+    openai_client.chat = Mock()
+    openai_client.chat.completions.create.return_value = asyncio.sleep(
+        0, slow_stream()
+    )
+    model_client = ModelClient(openai_client, MODEL_ARGS)
+    chunks = []
+
+    with deadline_scope(timeout=0.2, reserve=0):
+        with pytest.raises(TimeoutError):
+            async for chunk in model_client.agenerate([user_message("a")]):
+                chunks.append(chunk)
+
+    assert 0 < len(chunks) < 10
+
+
+@pytest.mark.asyncio
+async def test_count_tokens_with_local_tokenizer():
+    openai_client = Mock(spec=AsyncOpenAI)
+    openai_client.chat = Mock()
+    tokenizer = Mock(spec=MessageTokenizer)
+    tokenizer.chat_format = CHAT_FORMATS["gpt"]
+    tokenizer.count_message_tokens.return_value = 5
+    model_client = ModelClient(openai_client, MODEL_ARGS, tokenizer)
+    messages = [system_message("a"), user_message("b")]
+
+    assert await model_client.count_tokens(messages) == 3 + 5 + 5
+    assert tokenizer.count_message_tokens.call_args_list == [
+        call(system_message("a")),
+        call(user_message("b")),
+    ]
+    assert openai_client.chat.completions.create.call_args_list == []
+
+
+@pytest.mark.asyncio
+async def test_count_tokens_with_cache():
+    tokenizer = Mock(spec=MessageTokenizer)
+    tokenizer.chat_format = CHAT_FORMATS["gpt"]
+    tokenizer.count_message_tokens.return_value = 5
+    cache = TokenCountCache(max_entries=10, max_bytes=10000)
+    messages = [system_message("a"), user_message("b")]
+
+    for _ in range(2):
+        model_client = ModelClient(Mock(), MODEL_ARGS, tokenizer, cache)
+        assert await model_client.count_tokens(messages) == 3 + 5 + 5
+
+    assert tokenizer.count_message_tokens.call_count == 2
+    assert cache.misses == 2
+    assert cache.hits == 2
+
+
+@pytest.mark.asyncio
+async def test_count_tokens_remotely():
+    openai_client = Mock(spec=AsyncOpenAI)
+    openai_client.chat = Mock()
+    openai_client.chat.completions.create.return_value = to_awaitable_iterator(
+        [
+            Chunk(
+                choices=[Choice(delta=Delta(content=""))],
+                statistics={},
+                usage=Usage(prompt_tokens=42, completion_tokens=1),
+            )
+        ]
+    )
+    model_client = ModelClient(openai_client, MODEL_ARGS)
+
+    assert await model_client.count_tokens([user_message("a")]) == 42
+
+
+@pytest.mark.asyncio
+async def test_count_tokens_remotely_with_cache():
+    openai_client = Mock(spec=AsyncOpenAI)
+    openai_client.chat = Mock()
+    openai_client.chat.completions.create.return_value = to_awaitable_iterator(
+        [
+            Chunk(
+                choices=[Choice(delta=Delta(content=""))],
+                statistics={},
+                usage=Usage(prompt_tokens=42, completion_tokens=1),
+            )
+        ]
+    )
+    cache = TokenCountCache(max_entries=10, max_bytes=10000)
+    model_client = ModelClient(openai_client, MODEL_ARGS, None, cache)
+
+    for _ in range(2):
+        assert await model_client.count_tokens([user_message("a")]) == 42
+
+    assert openai_client.chat.completions.create.call_count == 1
+    assert cache.misses == 1
+    assert cache.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_count_message_tokens_requires_local_tokenizer():
+    openai_client = Mock(spec=AsyncOpenAI)
+    openai_client.chat = Mock()
+    model_client = ModelClient(openai_client, MODEL_ARGS)
+
+    assert not model_client.counts_tokens_locally
+    with pytest.raises(ValueError):
+        await model_client.count_message_tokens(user_message("a"))
+    assert openai_client.chat.completions.create.call_args_list == []
+
+
+@pytest.mark.asyncio
+async def test_discarded_messages_with_local_tokenizer():
+    openai_client = Mock(spec=AsyncOpenAI)
+    openai_client.chat = Mock()
+    tokenizer = Mock(spec=MessageTokenizer)
+    tokenizer.chat_format = CHAT_FORMATS["gpt"]
+    tokenizer.count_message_tokens.return_value = 5
+    model_client = ModelClient(openai_client, MODEL_ARGS, tokenizer)
+    messages = [
+        system_message("a"),
+        user_message("b"),
+        assistant_message("c"),
+        user_message("d"),
+    ]
+
+    assert await model_client.get_discarded_messages(messages, 3 + 5 * 3) == [1]
+    assert openai_client.chat.completions.create.call_args_list == []
+
+
+@pytest.mark.asyncio
+async def test_tool_calls():
+    openai_client = Mock(spec=AsyncOpenAI)
+    openai_client.chat = Mock()
+    openai_client.chat.completions.create.return_value = to_awaitable_iterator(
+        [
+            Chunk(
+                choices=[
+                    Choice(
+                        delta=Delta(
+                            content="",
+                            tool_calls=[
+                                ChoiceDeltaToolCall(
+                                    index=0,
+                                    id="call_1",
+                                    type="function",
+                                    function=ChoiceDeltaToolCallFunction(
+                                        name="tool", arguments='{"a"'
+                                    ),
+                                )
+                            ],
+                        )
+                    )
+                ]
+            ),
+            Chunk(
+                choices=[
+                    Choice(
+                        delta=Delta(
+                            content="",
+                            tool_calls=[
+                                ChoiceDeltaToolCall(
+                                    index=0,
+                                    function=ChoiceDeltaToolCallFunction(
+                                        arguments=": 1}"
+                                    ),
+                                )
+                            ],
+                        )
+                    )
+                ]
+            ),
+        ]
+    )
+    model_client = ModelClient(openai_client, MODEL_ARGS)
+    extra_results_callback = Mock(spec=ExtraResultsCallback)
+
+    await join_string(model_client.agenerate([], extra_results_callback))
+
+    assert extra_results_callback.on_tool_calls.call_args_list == [
+        call(
+            [
+                {
+                    "index": 0,
+                    "id": "call_1",
+                    "type": "function",
+                    "function": {"name": "tool", "arguments": '{"a": 1}'},
+                }
+            ]
+        )
+    ]
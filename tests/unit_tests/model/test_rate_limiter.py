@@ -0,0 +1,262 @@
+import asyncio
+import json
+import time
+from typing import Callable
+
+import httpx
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from openai import RateLimitError
+
+from aidial_assistant.model.client_pool import AdmittedAzureOpenAI
+from aidial_assistant.model.model_chunk import ModelChunk
+from aidial_assistant.model.model_client import ModelClient
+from aidial_assistant.model.rate_limiter import (
+    AdmissionController,
+    RateLimitConf,
+    TokenBucket,
+)
+from aidial_assistant.utils.exceptions import RateLimitExceededError
+from aidial_assistant.utils.open_ai import user_message
+
+API_VERSION = "2023-12-01-preview"
+API_KEY = "<api key>"
+MODEL_ARGS = {"model": "gpt-4"}
+CHUNKS = [
+    {
+        "id": "chatcmpl-1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4",
+        "choices": [
+            {
+                "index": 0,
+                "delta": {"role": "assistant", "content": "result"},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": 10,
+            "completion_tokens": 1,
+            "total_tokens": 11,
+        },
+    }
+]
+
+
+REQUESTS = web.AppKey("requests", list[web.Request])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _fake_model_app(
+    rate_limited_responses: int, headers: dict[str, str], status: int = 429
+) -> web.Application:
+    """A model endpoint responding with 429 (or the given status) to the given number of the first requests."""
+    requests = []
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        requests.append(request)
+        if len(requests) <= rate_limited_responses:
+            return web.json_response(
+                {"error": {"message": "Error", "code": str(status)}},
+                status=status,
+                headers=headers,
+            )
+
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream"}
+        )
+        await response.prepare(request)
+        for chunk in CHUNKS:
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app[REQUESTS] = requests
+    app.router.add_post(
+        "/openai/deployments/{deployment}/chat/completions", chat_completions
+    )
+    return app
+
+
+async def _generate(
+    app: web.Application,
+    conf: RateLimitConf,
+    clock: Callable[[], float] = time.monotonic,
+    client_max_retries: int = 0,
+) -> tuple[str, AdmissionController]:
+    controller = AdmissionController("gpt-4", conf, clock)
+    async with TestServer(app) as server:
+        async with httpx.AsyncClient() as http_client:
+            model_client = ModelClient(
+                AdmittedAzureOpenAI(
+                    azure_endpoint=str(server.make_url("")),
+                    api_key=API_KEY,
+                    api_version=API_VERSION,
+                    http_client=http_client,
+                    max_retries=client_max_retries,
+                ),
+                MODEL_ARGS,
+                admission_controller=controller,
+            )
+            result = ""
+            async for chunk in model_client.agenerate([user_message("query")]):
+                result += chunk
+
+    return result, controller
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(capacity=10, rate=2, clock=clock)
+
+    bucket.consume(10)
+    assert bucket.time_until(4) == 2
+
+    clock.now = 1
+    assert bucket.time_until(4) == 1
+
+    bucket.consume(-100)
+    assert bucket.time_until(10) == 0
+    # Requests larger than the capacity wait for the full bucket only
+    assert bucket.time_until(100) == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_after_rate_limit():
+    app = _fake_model_app(2, {"retry-after-ms": "10"})
+
+    result, controller = await _generate(app, RateLimitConf(max_retries=2))
+
+    assert result == "result"
+    assert len(app[REQUESTS]) == 3
+    assert controller.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_error_when_retries_are_exhausted():
+    app = _fake_model_app(2, {"retry-after": "0"})
+
+    with pytest.raises(RateLimitError):
+        await _generate(app, RateLimitConf(max_retries=1))
+
+    assert len(app[REQUESTS]) == 2
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_are_not_retried_by_admitted_client():
+    app = _fake_model_app(1, {"retry-after-ms": "10"})
+
+    with pytest.raises(RateLimitError):
+        await _generate(app, RateLimitConf(max_retries=0), client_max_retries=2)
+
+    assert len(app[REQUESTS]) == 1
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried_by_admitted_client():
+    app = _fake_model_app(1, {"retry-after-ms": "10"}, status=500)
+
+    result, _ = await _generate(
+        app, RateLimitConf(max_retries=0), client_max_retries=2
+    )
+
+    assert result == "result"
+    assert len(app[REQUESTS]) == 2
+
+
+@pytest.mark.asyncio
+async def test_no_retry_after_chunks_are_streamed():
+    controller = AdmissionController("gpt-4", RateLimitConf(max_retries=2))
+    attempts = []
+
+    async def create_stream():
+        attempts.append(1)
+        yield ModelChunk("partial", None, None, None, None)
+        raise RateLimitError(
+            "Rate limit",
+            response=httpx.Response(
+                429, request=httpx.Request("POST", "http://localhost")
+            ),
+            body=None,
+        )
+
+    chunks = []
+    with pytest.raises(RateLimitError):
+        async for chunk in controller.stream(create_stream, 10):
+            chunks.append(chunk.content)
+
+    assert chunks == ["partial"]
+    assert len(attempts) == 1
+
+
+@pytest.mark.asyncio
+async def test_backoff_without_retry_after():
+    app = _fake_model_app(1, {})
+
+    result, _ = await _generate(app, RateLimitConf(initial_backoff=0.01))
+
+    assert result == "result"
+    assert len(app[REQUESTS]) == 2
+
+
+@pytest.mark.asyncio
+async def test_token_rate_is_adjusted_to_usage():
+    app = _fake_model_app(0, {})
+
+    _, controller = await _generate(
+        app, RateLimitConf(tokens_per_minute=1000), FakeClock()
+    )
+
+    assert controller.token_bucket is not None
+    # 11 tokens are used according to the model
+    assert controller.token_bucket.time_until(1000) == pytest.approx(
+        11 * 60 / 1000
+    )
+
+
+@pytest.mark.asyncio
+async def test_requests_are_queued():
+    controller = AdmissionController(
+        "gpt-4", RateLimitConf(requests_per_minute=600, max_queue_size=2)
+    )
+    # Exhaust the bucket
+    for _ in range(600):
+        await controller.acquire(0)
+
+    first = asyncio.create_task(controller.acquire(0))
+    second = asyncio.create_task(controller.acquire(0))
+    await asyncio.sleep(0)
+    assert controller.queue_depth == 2
+
+    with pytest.raises(RateLimitExceededError):
+        await controller.acquire(0)
+
+    await asyncio.gather(first, second)
+    assert controller.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_request_is_rejected_if_wait_is_too_long():
+    controller = AdmissionController(
+        "gpt-4", RateLimitConf(max_wait=1, max_queue_size=1)
+    )
+    controller.pause(10)
+
+    with pytest.raises(RateLimitExceededError) as exc_info:
+        await controller.acquire(0)
+
+    assert (
+        str(exc_info.value)
+        == "The model can't accept the request within 1.0 seconds."
+    )
+    assert controller.queue_depth == 0
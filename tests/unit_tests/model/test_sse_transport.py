@@ -0,0 +1,294 @@
+import json
+from typing import Any
+
+import httpx
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from openai import BadRequestError, InternalServerError, RateLimitError
+from openai.lib.azure import AsyncAzureOpenAI
+
+from aidial_assistant.model import sse_transport
+from aidial_assistant.model.model_chunk import ModelChunk
+from aidial_assistant.model.model_client import (
+    ExtraResultsCallback,
+    ModelClient,
+    ReasonLengthException,
+)
+from aidial_assistant.model.sse_transport import SSETransport
+from aidial_assistant.utils.open_ai import user_message
+
+API_VERSION = "2023-12-01-preview"
+API_KEY = "<api key>"
+MODEL_ARGS = {"model": "gpt-4", "temperature": 0}
+
+
+def _chunk(
+    delta: dict[str, Any], finish_reason: str | None = None, **extra
+) -> dict[str, Any]:
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4",
+        "choices": [
+            {"index": 0, "delta": delta, "finish_reason": finish_reason}
+        ],
+        **extra,
+    }
+
+
+USAGE = {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13}
+CONTENT_CHUNKS = [
+    _chunk({"role": "assistant", "content": "one, "}),
+    _chunk({"content": "two, "}),
+    _chunk({"content": "three"}),
+    _chunk(
+        {},
+        finish_reason="stop",
+        usage=USAGE,
+        statistics={"discarded_messages": 1},
+    ),
+]
+TOOL_CALLS_CHUNKS = [
+    _chunk(
+        {
+            "role": "assistant",
+            "tool_calls": [
+                {
+                    "index": 0,
+                    "id": "call_1",
+                    "type": "function",
+                    "function": {"name": "tool", "arguments": '{"a"'},
+                }
+            ],
+        }
+    ),
+    _chunk({"tool_calls": [{"index": 0, "function": {"arguments": ": 1}"}}]}),
+    _chunk({}, finish_reason="tool_calls", usage=USAGE),
+]
+LENGTH_CHUNKS = [
+    _chunk({"content": "text"}),
+    _chunk({}, finish_reason="length", usage=USAGE),
+]
+
+
+class RecordingCallback(ExtraResultsCallback):
+    def __init__(self):
+        self.calls: list[tuple[str, Any]] = []
+
+    def on_discarded_messages(self, discarded_messages: list[int]):
+        self.calls.append(("discarded_messages", discarded_messages))
+
+    def on_prompt_tokens(self, prompt_tokens: int):
+        self.calls.append(("prompt_tokens", prompt_tokens))
+
+    def on_tool_calls(self, tool_calls):
+        self.calls.append(("tool_calls", tool_calls))
+
+
+def _stub_app(chunks: list[dict[str, Any]]) -> web.Application:
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        assert request.headers["api-key"] == API_KEY
+        assert request.query["api-version"] == API_VERSION
+        body = await request.json()
+        assert body["stream"] is True
+        if body["messages"][-1]["content"] == "bad request":
+            return web.json_response(
+                {"error": {"message": "Bad request", "code": "400"}},
+                status=400,
+            )
+
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream"}
+        )
+        await response.prepare(request)
+        for chunk in chunks:
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post(
+        "/openai/deployments/{deployment}/chat/completions", chat_completions
+    )
+    return app
+
+
+async def _generate(model_client: ModelClient, content: str):
+    callback = RecordingCallback()
+    result = ""
+    error: Exception | None = None
+    try:
+        async for chunk in model_client.agenerate(
+            [user_message(content)], callback, max_tokens=10
+        ):
+            result += chunk
+    except (ReasonLengthException, BadRequestError) as e:
+        error = e
+
+    return (
+        result,
+        callback.calls,
+        type(error),
+        str(error),
+        model_client.total_prompt_tokens,
+        model_client.total_completion_tokens,
+    )
+
+
+async def _generate_both_ways(chunks: list[dict[str, Any]], content: str):
+    async with TestServer(_stub_app(chunks)) as server:
+        endpoint = str(server.make_url(""))
+        async with httpx.AsyncClient() as http_client:
+            openai_client = AsyncAzureOpenAI(
+                azure_endpoint=endpoint,
+                api_key=API_KEY,
+                api_version=API_VERSION,
+                http_client=http_client,
+                max_retries=0,
+            )
+            expected = await _generate(
+                ModelClient(openai_client, MODEL_ARGS), content
+            )
+            actual = await _generate(
+                ModelClient(
+                    openai_client,
+                    MODEL_ARGS,
+                    transport=SSETransport(
+                        http_client, endpoint, API_VERSION, API_KEY
+                    ),
+                ),
+                content,
+            )
+
+    return expected, actual
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "chunks", [CONTENT_CHUNKS, TOOL_CALLS_CHUNKS, LENGTH_CHUNKS]
+)
+async def test_same_results_as_openai_client(chunks: list[dict[str, Any]]):
+    expected, actual = await _generate_both_ways(chunks, "query")
+
+    assert actual == expected
+
+
+@pytest.mark.asyncio
+async def test_same_error_as_openai_client():
+    expected, actual = await _generate_both_ways(CONTENT_CHUNKS, "bad request")
+
+    assert actual[2] is BadRequestError
+    assert actual == expected
+
+
+def _flaky_app(statuses: list[int], abort_after_first_chunk: bool = False):
+    """Responds with the given error statuses first, then streams the content chunks."""
+    requests: list[web.Request] = []
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        requests.append(request)
+        if len(requests) <= len(statuses):
+            return web.json_response(
+                {"error": {"message": "Failed"}},
+                status=statuses[len(requests) - 1],
+            )
+
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream"}
+        )
+        await response.prepare(request)
+        for chunk in CONTENT_CHUNKS:
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            if abort_after_first_chunk:
+                assert request.transport is not None
+                request.transport.close()
+                return response
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post(
+        "/openai/deployments/{deployment}/chat/completions", chat_completions
+    )
+    return app, requests
+
+
+async def _stream_chunks(app: web.Application, **kwargs) -> list[ModelChunk]:
+    async with TestServer(app) as server:
+        async with httpx.AsyncClient() as http_client:
+            transport = SSETransport(
+                http_client,
+                str(server.make_url("")),
+                API_VERSION,
+                API_KEY,
+                **kwargs,
+            )
+            return [
+                chunk
+                async for chunk in transport.stream(
+                    MODEL_ARGS, [user_message("query")], {}
+                )
+            ]
+
+
+@pytest.fixture
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(sse_transport, "INITIAL_RETRY_DELAY", 0)
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried(no_retry_delay):
+    app, requests = _flaky_app([500, 503])
+
+    chunks = await _stream_chunks(app)
+
+    assert len(requests) == 3
+    assert len(chunks) == len(CONTENT_CHUNKS)
+
+
+@pytest.mark.asyncio
+async def test_retries_are_limited(no_retry_delay):
+    app, requests = _flaky_app([500, 500])
+
+    with pytest.raises(InternalServerError):
+        await _stream_chunks(app, max_retries=1)
+
+    assert len(requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(no_retry_delay):
+    app, requests = _flaky_app([400])
+
+    with pytest.raises(BadRequestError):
+        await _stream_chunks(app)
+
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("admitted,expected_requests", [(False, 2), (True, 1)])
+async def test_admitted_transport_leaves_rate_limits(
+    no_retry_delay, admitted: bool, expected_requests: int
+):
+    app, requests = _flaky_app([429])
+
+    if admitted:
+        with pytest.raises(RateLimitError):
+            await _stream_chunks(app, admitted=admitted)
+    else:
+        await _stream_chunks(app, admitted=admitted)
+
+    assert len(requests) == expected_requests
+
+
+@pytest.mark.asyncio
+async def test_no_retry_after_streaming(no_retry_delay):
+    app, requests = _flaky_app([], abort_after_first_chunk=True)
+
+    with pytest.raises(httpx.TransportError):
+        await _stream_chunks(app)
+
+    assert len(requests) == 1
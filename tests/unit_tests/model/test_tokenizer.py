@@ -0,0 +1,111 @@
+import base64
+from pathlib import Path
+
+import pytest
+
+from aidial_assistant.model.tokenizer import (
+    CHAT_FORMATS,
+    BPETokenizer,
+    MessageTokenizer,
+    TokenizerConf,
+    TokenizerRegistry,
+)
+from aidial_assistant.utils.open_ai import system_message, user_message
+
+MERGES = [b"ab", b"abc", b" a", b" abc"]
+
+
+def _write_vocab(path: Path) -> Path:
+    tokens = [bytes([i]) for i in range(256)] + MERGES
+    path.write_text(
+        "\n".join(
+            f"{base64.b64encode(token).decode()} {rank}"
+            for rank, token in enumerate(tokens)
+        )
+    )
+    return path
+
+
+TOKENIZATION_TEST_DATA = [
+    ("", 0),
+    ("abc", 1),
+    ("abd", 2),
+    ("abc abc", 2),
+    ("cba", 3),
+    ("abc, 123", 6),
+]
+
+
+@pytest.mark.parametrize("text,expected", TOKENIZATION_TEST_DATA)
+def test_bpe_token_count(tmp_path: Path, text: str, expected: int):
+    tokenizer = BPETokenizer.from_file(_write_vocab(tmp_path / "vocab"))
+
+    assert tokenizer.count_tokens(text) == expected
+
+
+def test_chat_format_overheads(tmp_path: Path):
+    tokenizer = MessageTokenizer(
+        BPETokenizer.from_file(_write_vocab(tmp_path / "vocab")),
+        CHAT_FORMATS["gpt"],
+    )
+    messages = [system_message("abc"), user_message("abd")]
+
+    # role + content + 3 tokens per message
+    assert tokenizer.count_message_tokens(messages[0]) == 6 + 1 + 3
+    assert tokenizer.count_message_tokens(messages[1]) == 4 + 2 + 3
+    # 3 tokens of reply priming
+    assert tokenizer.count_tokens(messages) == 10 + 9 + 3
+
+
+def test_content_parts(tmp_path: Path):
+    tokenizer = MessageTokenizer(
+        BPETokenizer.from_file(_write_vocab(tmp_path / "vocab")),
+        CHAT_FORMATS["gpt"],
+    )
+    text_parts = {
+        "role": "user",
+        "content": [
+            {"type": "text", "text": "abc"},
+            {"type": "text", "text": "abd"},
+        ],
+    }
+    image_parts = {
+        "role": "user",
+        "content": [
+            {"type": "image_url", "image_url": {"url": "http://host/a.png"}}
+        ],
+    }
+
+    # role + text parts + 3 tokens per message
+    assert tokenizer.count_message_tokens(text_parts) == 4 + 1 + 2 + 3  # type: ignore
+    with pytest.raises(ValueError, match="image_url"):
+        tokenizer.count_message_tokens(image_parts)  # type: ignore
+
+
+def test_registry(tmp_path: Path):
+    registry = TokenizerRegistry.from_conf(
+        [
+            TokenizerConf(
+                vocab_path=_write_vocab(tmp_path / "vocab"),
+                deployments=["gpt-4", "gpt-35-turbo"],
+            )
+        ]
+    )
+
+    assert registry.get("gpt-4") is not None
+    assert registry.get("gpt-4") is registry.get("gpt-35-turbo")
+    assert registry.get("unknown") is None
+    assert registry.get(None) is None
+
+
+def test_registry_unknown_chat_format(tmp_path: Path):
+    with pytest.raises(ValueError):
+        TokenizerRegistry.from_conf(
+            [
+                TokenizerConf(
+                    vocab_path=_write_vocab(tmp_path / "vocab"),
+                    chat_format="unknown",
+                    deployments=["gpt-4"],
+                )
+            ]
+        )
@@ -0,0 +1,56 @@
+import pytest
+
+from aidial_assistant.model.truncation import get_discarded_messages
+from aidial_assistant.utils.exceptions import RequestParameterValidationError
+from aidial_assistant.utils.open_ai import (
+    assistant_message,
+    system_message,
+    user_message,
+)
+
+MESSAGES = [
+    system_message("a"),
+    user_message("b"),
+    system_message("c"),
+    assistant_message("d"),
+    user_message("e"),
+    assistant_message("f"),
+    user_message("g"),
+]
+MESSAGE_TOKENS = [10, 20, 10, 30, 40, 50, 60]
+OVERHEAD_TOKENS = 3
+TOTAL_TOKENS = OVERHEAD_TOKENS + sum(MESSAGE_TOKENS)
+
+TRUNCATION_TEST_DATA = [
+    (TOTAL_TOKENS + 1, []),
+    (TOTAL_TOKENS, []),
+    (TOTAL_TOKENS - 1, [1]),
+    (TOTAL_TOKENS - 20, [1]),
+    (TOTAL_TOKENS - 21, [1, 3]),
+    (TOTAL_TOKENS - 90, [1, 3, 4]),
+    (TOTAL_TOKENS - 91, [1, 3, 4, 5]),
+    (OVERHEAD_TOKENS + 10 + 10 + 60, [1, 3, 4, 5]),
+]
+
+
+@pytest.mark.parametrize("max_prompt_tokens,expected", TRUNCATION_TEST_DATA)
+def test_discarded_messages(max_prompt_tokens: int, expected: list[int]):
+    assert (
+        get_discarded_messages(
+            MESSAGES, MESSAGE_TOKENS, OVERHEAD_TOKENS, max_prompt_tokens
+        )
+        == expected
+    )
+
+
+def test_last_message_is_kept():
+    with pytest.raises(RequestParameterValidationError) as exc_info:
+        get_discarded_messages(
+            MESSAGES,
+            MESSAGE_TOKENS,
+            OVERHEAD_TOKENS,
+            OVERHEAD_TOKENS + 10 + 10 + 60 - 1,
+        )
+
+    assert exc_info.value.param == "max_prompt_tokens"
+    assert "resulted in 83 tokens" in str(exc_info.value)
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from aidial_assistant.open_api.bulkhead import (
+    Bulkhead,
+    BulkheadConf,
+    BulkheadFullError,
+    Bulkheads,
+    BulkheadsConf,
+)
+
+
+async def _hold(bulkhead: Bulkhead, started: list[int], release: asyncio.Event):
+    async with bulkhead.acquire():
+        started.append(1)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_max_in_flight_are_queued():
+    bulkhead = Bulkhead("host", BulkheadConf(max_in_flight=2, max_queue=5))
+    started: list[int] = []
+    release = asyncio.Event()
+
+    tasks = [
+        asyncio.create_task(_hold(bulkhead, started, release)) for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+
+    assert len(started) == 2
+    assert bulkhead.queued == 1
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert len(started) == 3
+    assert bulkhead.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_immediately():
+    bulkhead = Bulkhead("host", BulkheadConf(max_in_flight=1, max_queue=1))
+    started: list[int] = []
+    release = asyncio.Event()
+
+    tasks = [
+        asyncio.create_task(_hold(bulkhead, started, release)) for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+
+    with pytest.raises(BulkheadFullError, match="host is overloaded"):
+        async with bulkhead.acquire():
+            pass
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+    # Capacity is available again once the requests complete
+    async with bulkhead.acquire():
+        pass
+
+
+@pytest.mark.asyncio
+async def test_cancelled_queued_request_leaves_the_queue():
+    bulkhead = Bulkhead("host", BulkheadConf(max_in_flight=1, max_queue=1))
+    started: list[int] = []
+    release = asyncio.Event()
+
+    holder = asyncio.create_task(_hold(bulkhead, started, release))
+    waiter = asyncio.create_task(_hold(bulkhead, started, release))
+    await asyncio.sleep(0)
+    assert bulkhead.queued == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert bulkhead.queued == 0
+    release.set()
+    await holder
+    assert len(started) == 1
+
+
+def test_bulkheads_are_per_host_with_overrides():
+    bulkheads = Bulkheads(
+        BulkheadsConf(
+            max_in_flight=20,
+            max_queue=100,
+            hosts={"slow.example.com": BulkheadConf(max_in_flight=2)},
+        )
+    )
+
+    slow = bulkheads.get("https://slow.example.com/search?q=1")
+    other = bulkheads.get("https://api.example.com/search")
+
+    assert bulkheads.get("https://slow.example.com/items") is slow
+    assert slow.conf.max_in_flight == 2
+    assert other.conf.max_in_flight == 20
+    assert other is not slow
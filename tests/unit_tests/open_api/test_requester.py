@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from langchain.tools import APIOperation, OpenAPISpec
+
+from aidial_assistant.commands.base import JsonResult, TextResult
+from aidial_assistant.open_api.bulkhead import (
+    BulkheadFullError,
+    Bulkheads,
+    BulkheadsConf,
+)
+from aidial_assistant.open_api.requester import OpenAPIEndpointRequester
+from aidial_assistant.open_api.response_cache import (
+    ResponseCache,
+    ResponseCacheConf,
+)
+from aidial_assistant.utils.deadline import deadline_scope
+from aidial_assistant.utils.text import TRUNCATION_MARKER
+
+SPEC = {
+    "openapi": "3.0.0",
+    "info": {"title": "Test", "version": "1.0"},
+    "paths": {
+        "/{kind}": {
+            "get": {
+                "operationId": "get",
+                "parameters": [
+                    {
+                        "name": "kind",
+                        "in": "path",
+                        "required": True,
+                        "schema": {"type": "string"},
+                    }
+                ],
+                "responses": {},
+            }
+        }
+    },
+}
+
+BODY = '{"items": [1, 2, 3]}'
+REQUESTS = web.AppKey("requests", list[str])
+
+
+def _app() -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        kind = request.match_info["kind"]
+        request.app[REQUESTS].append(kind)
+        if kind == "json":
+            return web.Response(text=BODY, content_type="application/json")
+        if kind == "text":
+            return web.Response(text="plain text")
+        if kind == "cached":
+            return web.Response(
+                text=BODY,
+                content_type="application/json",
+                headers={"Cache-Control": "max-age=60"},
+            )
+        if kind == "slow":
+            await asyncio.sleep(10)
+        if kind == "json-error":
+            return web.Response(
+                status=400, text=BODY, content_type="application/json"
+            )
+        return web.Response(status=404, text="not found")
+
+    app = web.Application()
+    app[REQUESTS] = []
+    app.router.add_get("/{kind}", handle)
+    return app
+
+
+def _requester(
+    server: TestServer,
+    max_response_bytes: int = 1024,
+    response_cache: ResponseCache | None = None,
+    bulkheads: Bulkheads | None = None,
+) -> OpenAPIEndpointRequester:
+    spec = OpenAPISpec.from_spec_dict(SPEC)
+    operation = APIOperation.from_openapi_spec(spec, "/{kind}", "get")
+    operation.base_url = str(server.make_url(""))
+    return OpenAPIEndpointRequester(
+        operation,
+        None,
+        max_response_bytes=max_response_bytes,
+        response_cache=response_cache,
+        bulkheads=bulkheads,
+    )
+
+
+@pytest.mark.asyncio
+async def test_json_is_passed_through():
+    async with TestServer(_app()) as server:
+        result = await _requester(server).execute({"kind": "json"})
+
+    assert isinstance(result, JsonResult)
+    assert result.text == BODY
+
+
+@pytest.mark.asyncio
+async def test_text_response():
+    async with TestServer(_app()) as server:
+        result = await _requester(server).execute({"kind": "text"})
+
+    assert isinstance(result, TextResult)
+    assert result.text == "plain text"
+
+
+@pytest.mark.asyncio
+async def test_json_error_is_passed_through():
+    async with TestServer(_app()) as server:
+        result = await _requester(server).execute({"kind": "json-error"})
+
+    assert isinstance(result, JsonResult)
+    assert result.text == BODY
+
+
+@pytest.mark.asyncio
+async def test_non_json_error():
+    async with TestServer(_app()) as server:
+        result = await _requester(server).execute({"kind": "missing"})
+
+    assert isinstance(result, JsonResult)
+    error = json.loads(result.text)
+    assert error["status_code"] == 404
+    assert error["reason"] == "Not Found"
+
+
+@pytest.mark.asyncio
+async def test_response_is_truncated():
+    async with TestServer(_app()) as server:
+        result = await _requester(server, 10).execute({"kind": "json"})
+
+    assert isinstance(result, TextResult)
+    assert result.text == BODY[:10] + TRUNCATION_MARKER
+
+
+@pytest.mark.asyncio
+async def test_cached_response():
+    cache = ResponseCache(ResponseCacheConf(enabled=True))
+    app = _app()
+    async with TestServer(app) as server:
+        requester = _requester(server, response_cache=cache)
+        first = await requester.execute({"kind": "cached"})
+        second = await requester.execute({"kind": "cached"})
+        await requester.execute({"kind": "json"})
+        await requester.execute({"kind": "json"})
+
+    assert first.text == second.text == BODY
+    assert app[REQUESTS] == ["cached", "json", "json"]
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+@pytest.mark.asyncio
+async def test_saturated_host_is_not_requested():
+    bulkheads = Bulkheads(BulkheadsConf(max_in_flight=1, max_queue=0))
+    app = _app()
+    async with TestServer(app) as server:
+        requester = _requester(server, bulkheads=bulkheads)
+        bulkhead = bulkheads.get(str(server.make_url("")))
+        async with bulkhead.acquire():
+            with pytest.raises(BulkheadFullError):
+                await requester.execute({"kind": "json"})
+
+        result = await requester.execute({"kind": "json"})
+
+    assert result.text == BODY
+    assert app[REQUESTS] == ["json"]
+
+
+@pytest.mark.asyncio
+async def test_request_is_capped_by_deadline():
+    async with TestServer(_app()) as server:
+        with deadline_scope(timeout=0.1, reserve=0):
+            with pytest.raises(TimeoutError, match="time limit"):
+                await _requester(server).execute({"kind": "slow"})
@@ -0,0 +1,141 @@
+import pytest
+
+from aidial_assistant.commands.base import JsonResult
+from aidial_assistant.open_api.response_cache import (
+    ResponseCache,
+    ResponseCacheConf,
+    ResponseCachePolicyConf,
+    get_freshness_lifetime,
+    is_cacheable,
+)
+
+URL = "https://api.example.com/weather"
+RESULT = JsonResult('{"temperature": 20}')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _request_args(city: str = "Paris") -> dict:
+    return {"url": URL, "params": {"city": city}, "json": None}
+
+
+@pytest.mark.parametrize(
+    "headers,expected",
+    [
+        ({}, None),
+        ({"Cache-Control": "max-age=60"}, 60),
+        ({"Cache-Control": "public, max-age=60, s-maxage=30"}, 30),
+        ({"Cache-Control": "max-age=60", "Age": "20"}, 40),
+        ({"Cache-Control": "no-cache, max-age=60"}, 0),
+        ({"Cache-Control": "max-age=invalid"}, 0),
+        (
+            {
+                "Date": "Wed, 21 Oct 2015 07:28:00 GMT",
+                "Expires": "Wed, 21 Oct 2015 07:30:00 GMT",
+            },
+            120,
+        ),
+        ({"Expires": "0"}, 0),
+    ],
+)
+def test_freshness_lifetime(headers: dict, expected: float | None):
+    assert get_freshness_lifetime(headers) == expected
+
+
+@pytest.mark.parametrize(
+    "headers,expected",
+    [
+        ({}, True),
+        ({"Cache-Control": "public, max-age=60"}, True),
+        ({"Cache-Control": "no-store"}, False),
+        ({"Cache-Control": "no-cache"}, False),
+        ({"Cache-Control": "private, max-age=60"}, False),
+        ({"Cache-Control": "max-age=0"}, False),
+        ({"Cache-Control": "max-age=0, s-maxage=60"}, True),
+    ],
+)
+def test_is_cacheable(headers: dict, expected: bool):
+    assert is_cacheable(headers) == expected
+
+
+def test_response_is_cached_until_expired():
+    clock = FakeClock()
+    cache = ResponseCache(ResponseCacheConf(enabled=True), clock)
+    key = cache.key("get_weather", "get", _request_args(), None)
+    assert key is not None
+
+    cache.put(key, {"Cache-Control": "max-age=60"}, RESULT)
+    clock.now = 60
+    assert cache.get(key) is RESULT
+
+    clock.now = 61
+    assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_key_depends_on_params_and_auth():
+    cache = ResponseCache(ResponseCacheConf(enabled=True))
+
+    keys = {
+        cache.key("get_weather", "get", _request_args("Paris"), None),
+        cache.key("get_weather", "get", _request_args("Rome"), None),
+        cache.key("get_weather", "get", _request_args("Paris"), "user1"),
+        cache.key("get_weather", "get", _request_args("Paris"), "user2"),
+    }
+
+    assert len(keys) == 4
+
+
+def test_uncacheable_responses():
+    cache = ResponseCache(ResponseCacheConf(enabled=True))
+    key = cache.key("get_weather", "get", _request_args(), None)
+    assert key is not None
+
+    cache.put(key, {}, RESULT)
+    cache.put(key, {"Cache-Control": "no-store, max-age=60"}, RESULT)
+
+    assert cache.get(key) is None
+
+
+def test_post_requires_allow_listing():
+    cache = ResponseCache(
+        ResponseCacheConf(
+            enabled=True,
+            hosts={
+                "api.example.com": ResponseCachePolicyConf(
+                    cacheable_operations=["search"]
+                )
+            },
+        )
+    )
+
+    assert cache.key("create", "post", _request_args(), None) is None
+    assert cache.key("search", "post", _request_args(), None) is not None
+
+
+def test_ttl_override():
+    clock = FakeClock()
+    cache = ResponseCache(
+        ResponseCacheConf(
+            enabled=True,
+            hosts={"api.example.com": ResponseCachePolicyConf(ttl=300)},
+        ),
+        clock,
+    )
+    key = cache.key("get_weather", "get", _request_args(), None)
+    assert key is not None
+
+    cache.put(key, {"Cache-Control": "max-age=10"}, RESULT)
+    clock.now = 300
+
+    assert cache.get(key) is RESULT
+
+    for cache_control in ["no-store", "no-cache", "private", "max-age=0"]:
+        cache.put(key, {"Cache-Control": cache_control}, JsonResult("{}"))
+        assert cache.get(key) is RESULT
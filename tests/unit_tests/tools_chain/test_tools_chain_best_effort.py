@@ -8,6 +8,7 @@ from openai.types.chat import (
 from openai.types.chat.chat_completion_message_tool_call_param import Function
 
 from aidial_assistant.tools_chain.tools_chain import ToolsChain
+from aidial_assistant.utils.deadline import deadline_scope
 from aidial_assistant.utils.open_ai import (
     construct_tool,
     tool_calls_message,
@@ -66,3 +67,48 @@ async def test_model_request_limit_exceeded():
     await tools_chain.run_chat(messages, callback, model_request_limiter)
 
     assert callback.mock_result_callback.result == BEST_EFFORT_RESPONSE
+
+
+@pytest.mark.asyncio
+async def test_deadline_nearly_reached():
+    messages: list[ChatCompletionMessageParam] = [user_message("<query>")]
+    command_args = {"<test argument>": "<test value>"}
+    tool_calls = [
+        ChatCompletionMessageToolCallParam(
+            id=TOOL_ID,
+            function=Function(
+                name=TEST_COMMAND_NAME,
+                arguments=json.dumps(command_args),
+            ),
+            type="function",
+        )
+    ]
+    tool = construct_tool(TEST_COMMAND_NAME, "", {}, [])
+    messages_with_dialogue = messages + [
+        tool_calls_message(tool_calls=tool_calls),
+        tool_message(TOOL_RESPONSE, TOOL_ID),
+    ]
+    # The tool results are kept, but no more tools are offered
+    model = TestModelClient(
+        tool_calls={
+            TestModelClient.agenerate_key(messages, tools=[tool]): tool_calls
+        },
+        results={
+            TestModelClient.agenerate_key(
+                messages_with_dialogue
+            ): BEST_EFFORT_RESPONSE
+        },
+    )
+    callback = TestChainCallback()
+    command = TestCommand(
+        {TestCommand.execute_key(command_args): TOOL_RESPONSE}
+    )
+    tools_chain = ToolsChain(
+        model,
+        commands={TEST_COMMAND_NAME: (lambda: command, tool)},
+    )
+
+    with deadline_scope(timeout=60, reserve=60):
+        await tools_chain.run_chat(messages, callback)
+
+    assert callback.mock_result_callback.result == BEST_EFFORT_RESPONSE
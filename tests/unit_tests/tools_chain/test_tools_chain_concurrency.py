@@ -0,0 +1,114 @@
+import asyncio
+import json
+from typing import Any
+
+import pytest
+from openai.types.chat import (
+    ChatCompletionMessageParam,
+    ChatCompletionMessageToolCallParam,
+)
+from openai.types.chat.chat_completion_message_tool_call_param import Function
+from typing_extensions import override
+
+from aidial_assistant.commands.base import (
+    Command,
+    ExecutionCallback,
+    ResultObject,
+    TextResult,
+)
+from aidial_assistant.tools_chain.tools_chain import ToolsChain
+from aidial_assistant.utils.open_ai import (
+    construct_tool,
+    tool_calls_message,
+    tool_message,
+    user_message,
+)
+from tests.utils.mocks import TestChainCallback, TestModelClient
+
+TEST_COMMAND_NAME = "<test command>"
+TOOL_CALL_COUNT = 4
+FAILING_TOOL_CALL = 1
+RESPONSE = "<response>"
+
+
+class SleepingCommand(Command):
+    running = 0
+    max_running = 0
+
+    @staticmethod
+    def token() -> str:
+        return "sleeping-command"
+
+    @override
+    async def execute(
+        self, args: dict[str, Any], execution_callback: ExecutionCallback
+    ) -> ResultObject:
+        index = args["index"]
+        SleepingCommand.running += 1
+        SleepingCommand.max_running = max(
+            SleepingCommand.max_running, SleepingCommand.running
+        )
+        try:
+            # Later calls complete earlier
+            await asyncio.sleep(0.01 * (TOOL_CALL_COUNT - index))
+        finally:
+            SleepingCommand.running -= 1
+
+        if index == FAILING_TOOL_CALL:
+            raise ValueError(f"failed {index}")
+
+        return TextResult(f"result {index}")
+
+
+@pytest.mark.parametrize("max_concurrent_commands", [1, 2, TOOL_CALL_COUNT])
+@pytest.mark.asyncio
+async def test_tool_results_are_in_call_order(max_concurrent_commands: int):
+    SleepingCommand.max_running = 0
+    messages: list[ChatCompletionMessageParam] = [user_message("<query>")]
+    tool_calls = [
+        ChatCompletionMessageToolCallParam(
+            id=f"call_{index}",
+            function=Function(
+                name=TEST_COMMAND_NAME,
+                arguments=json.dumps({"index": index}),
+            ),
+            type="function",
+        )
+        for index in range(TOOL_CALL_COUNT)
+    ]
+    tool = construct_tool(TEST_COMMAND_NAME, "", {}, [])
+    messages_with_results = messages + [
+        tool_calls_message(tool_calls=tool_calls),
+        *[
+            tool_message(
+                (
+                    f"failed {index}"
+                    if index == FAILING_TOOL_CALL
+                    else f"result {index}"
+                ),
+                f"call_{index}",
+            )
+            for index in range(TOOL_CALL_COUNT)
+        ],
+    ]
+    model = TestModelClient(
+        tool_calls={
+            TestModelClient.agenerate_key(messages, tools=[tool]): tool_calls
+        },
+        results={
+            TestModelClient.agenerate_key(
+                messages_with_results, tools=[tool]
+            ): RESPONSE
+        },
+    )
+    callback = TestChainCallback()
+    tools_chain = ToolsChain(
+        model,
+        commands={TEST_COMMAND_NAME: (SleepingCommand, tool)},
+        max_concurrent_commands=max_concurrent_commands,
+    )
+
+    await tools_chain.run_chat(messages, callback)
+
+    assert callback.mock_result_callback.result == RESPONSE
+    assert SleepingCommand.max_running == max_concurrent_commands
@@ -0,0 +1,71 @@
+from aidial_assistant.utils.cache import LRUCache
+
+
+def _cache(max_entries: int, max_bytes: int) -> LRUCache[str, str]:
+    return LRUCache(max_entries, max_bytes, lambda key, value: len(value))
+
+
+def test_hits_and_misses():
+    cache = _cache(max_entries=2, max_bytes=100)
+
+    cache.put("a", "1")
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_entry_limit_evicts_least_recently_used():
+    cache = _cache(max_entries=2, max_bytes=100)
+
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+
+
+def test_byte_limit():
+    cache = _cache(max_entries=10, max_bytes=5)
+
+    cache.put("a", "123")
+    cache.put("b", "45")
+    assert cache.bytes == 5
+
+    cache.put("c", "6")
+    assert cache.get("a") is None
+    assert cache.bytes == 3
+
+    cache.put("d", "too large")
+    assert cache.get("d") is None
+    assert len(cache) == 2
+
+
+def test_replace_updates_size():
+    cache = _cache(max_entries=10, max_bytes=10)
+
+    cache.put("a", "123")
+    cache.put("a", "12345")
+
+    assert cache.get("a") == "12345"
+    assert cache.bytes == 5
+
+
+def test_expired_entries_are_missing():
+    now = 0.0
+    cache: LRUCache[str, str] = LRUCache(
+        10, 100, lambda key, value: len(value), ttl=10, clock=lambda: now
+    )
+
+    cache.put("a", "1")
+    now = 10
+    assert cache.get("a") == "1"
+
+    now = 11
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.misses == 1
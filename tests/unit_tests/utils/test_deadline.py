@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+
+from aidial_assistant.utils.deadline import (
+    deadline_scope,
+    final_answer_scope,
+    is_nearly_exhausted,
+    remaining_time,
+)
+
+
+def test_no_deadline():
+    assert remaining_time() is None
+    assert not is_nearly_exhausted()
+
+
+def test_deadline_scope():
+    with deadline_scope(timeout=60, reserve=10):
+        remaining = remaining_time()
+        assert remaining is not None and 59 < remaining <= 60
+        assert not is_nearly_exhausted()
+
+    assert remaining_time() is None
+
+
+def test_reserve_reached():
+    with deadline_scope(timeout=10, reserve=10):
+        assert is_nearly_exhausted()
+
+
+def test_nested_scope_cannot_extend_deadline():
+    with deadline_scope(timeout=10, reserve=1):
+        with deadline_scope(timeout=60, reserve=1):
+            remaining = remaining_time()
+            assert remaining is not None and remaining <= 10
+
+        with deadline_scope(timeout=5, reserve=1):
+            remaining = remaining_time()
+            assert remaining is not None and remaining <= 5
+
+
+def test_final_answer_scope_keeps_reserve():
+    with deadline_scope(timeout=0, reserve=10):
+        with final_answer_scope():
+            remaining = remaining_time()
+            assert remaining is not None and 9 < remaining <= 10
+
+        assert remaining_time() == 0
+
+    with deadline_scope(timeout=60, reserve=10):
+        with final_answer_scope():
+            remaining = remaining_time()
+            assert remaining is not None and 59 < remaining <= 60
+
+    with final_answer_scope():
+        assert remaining_time() is None
+
+
+def test_reserve_is_given_once():
+    with deadline_scope(timeout=0, reserve=10):
+        with final_answer_scope():
+            time.sleep(0.05)
+
+        with final_answer_scope():
+            remaining = remaining_time()
+            assert remaining is not None and remaining < 9.96
+
+
+@pytest.mark.asyncio
+async def test_deadline_is_propagated_to_tasks():
+    async def get_remaining_time() -> float | None:
+        return remaining_time()
+
+    with deadline_scope(timeout=60, reserve=10):
+        remaining = await asyncio.create_task(get_remaining_time())
+
+    assert remaining is not None and remaining <= 60
@@ -4,6 +4,7 @@ from aidial_sdk import HTTPException
 from openai import APIStatusError, OpenAIError
 
 from aidial_assistant.utils.exceptions import (
+    RateLimitExceededError,
     RequestParameterValidationError,
     unhandled_exception_handler,
 )
@@ -90,3 +91,19 @@ async def test_generic_exception():
         == f"HTTPException(message='{ERROR_MESSAGE}', status_code=500,"
         f" type='internal_server_error', param=None, code=None, display_message=None)"
     )
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_exceeded_error():
+    @unhandled_exception_handler
+    async def function():
+        raise RateLimitExceededError(ERROR_MESSAGE)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await function()
+
+    assert (
+        repr(exc_info.value)
+        == f"HTTPException(message='{ERROR_MESSAGE}', status_code=429,"
+        f" type='rate_limit_exceeded', param=None, code=None, display_message=None)"
+    )
@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aidial_assistant.utils.metadata_cache import (
+    MetadataCache,
+    MetadataCacheConf,
+)
+
+ETAG = '"v1"'
+REQUESTS = web.AppKey("requests", list[web.Request])
+VERSION = web.AppKey("version", list[str])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _metadata_app() -> web.Application:
+    async def metadata(request: web.Request) -> web.Response:
+        request.app[REQUESTS].append(request)
+        version = request.app[VERSION][0]
+        if request.headers.get("If-None-Match") == f'"{version}"':
+            return web.Response(status=304)
+
+        return web.Response(text=version, headers={"ETag": f'"{version}"'})
+
+    app = web.Application()
+    app[REQUESTS] = []
+    app[VERSION] = ["v1"]
+    app.router.add_get("/metadata", metadata)
+    return app
+
+
+def _parse(text: str) -> dict[str, str]:
+    return {"version": text}
+
+
+async def _wait_for_refresh():
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if not asyncio.all_tasks() - {asyncio.current_task()}:
+            break
+
+
+@pytest.mark.asyncio
+async def test_fresh_entry_is_served_from_cache():
+    app = _metadata_app()
+    clock = FakeClock()
+    cache = MetadataCache(MetadataCacheConf(ttl=10), clock)
+    async with TestServer(app) as server:
+        url = str(server.make_url("/metadata"))
+
+        first = await cache.get(url, _parse)
+        clock.now = 10
+        second = await cache.get(url, _parse)
+
+    assert first == second == {"version": "v1"}
+    assert len(app[REQUESTS]) == 1
+    assert (cache.hits, cache.misses, cache.refreshes) == (1, 1, 0)
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_revalidated_in_background():
+    app = _metadata_app()
+    clock = FakeClock()
+    cache = MetadataCache(
+        MetadataCacheConf(ttl=10, stale_while_revalidate=100), clock
+    )
+    async with TestServer(app) as server:
+        url = str(server.make_url("/metadata"))
+
+        first = await cache.get(url, _parse)
+        clock.now = 20
+        # Not modified
+        assert await cache.get(url, _parse) is first
+        await _wait_for_refresh()
+        assert app[REQUESTS][-1].headers["If-None-Match"] == ETAG
+        assert await cache.get(url, _parse) is first
+
+        app[VERSION][0] = "v2"
+        clock.now = 40
+        assert await cache.get(url, _parse) is first
+        await _wait_for_refresh()
+        assert await cache.get(url, _parse) == {"version": "v2"}
+
+    assert len(app[REQUESTS]) == 3
+    assert (cache.hits, cache.misses, cache.refreshes) == (4, 1, 2)
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_revalidated_before_use():
+    app = _metadata_app()
+    clock = FakeClock()
+    cache = MetadataCache(
+        MetadataCacheConf(ttl=10, stale_while_revalidate=10), clock
+    )
+    async with TestServer(app) as server:
+        url = str(server.make_url("/metadata"))
+
+        first = await cache.get(url, _parse)
+        clock.now = 30
+        second = await cache.get(url, _parse)
+
+    assert second is first
+    assert app[REQUESTS][-1].headers["If-None-Match"] == ETAG
+    assert (cache.hits, cache.misses, cache.refreshes) == (0, 2, 0)
+
+
+@pytest.mark.asyncio
+async def test_fresh_entry_is_revalidated_on_demand():
+    app = _metadata_app()
+    cache = MetadataCache(MetadataCacheConf(ttl=10), FakeClock())
+    async with TestServer(app) as server:
+        url = str(server.make_url("/metadata"))
+
+        first = await cache.get(url, _parse)
+        assert await cache.get(url, _parse, revalidate=True) is first
+        app[VERSION][0] = "v2"
+        assert await cache.get(url, _parse, revalidate=True) == {
+            "version": "v2"
+        }
+
+    assert len(app[REQUESTS]) == 3
+    assert app[REQUESTS][1].headers["If-None-Match"] == ETAG
+
+
+@pytest.mark.asyncio
+async def test_size_limit():
+    app = _metadata_app()
+    cache = MetadataCache(MetadataCacheConf(max_entries=1))
+    async with TestServer(app) as server:
+        first_url = str(server.make_url("/metadata"))
+        second_url = str(server.make_url("/metadata?other"))
+
+        await cache.get(first_url, _parse)
+        await cache.get(second_url, _parse)
+        await cache.get(first_url, _parse)
+
+    assert len(app[REQUESTS]) == 3
+    assert cache.misses == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch():
+    app = _metadata_app()
+    cache = MetadataCache(MetadataCacheConf())
+    parse_calls = []
+
+    def parse(text: str) -> dict[str, str]:
+        parse_calls.append(text)
+        return _parse(text)
+
+    async with TestServer(app) as server:
+        url = str(server.make_url("/metadata"))
+
+        results = await asyncio.gather(
+            *(cache.get(url, parse) for _ in range(5))
+        )
+
+    assert all(result is results[0] for result in results)
+    assert len(app[REQUESTS]) == 1
+    assert parse_calls == ["v1"]
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from aidial_assistant.utils.metadata_cache import (
+    MetadataCache,
+    MetadataCacheConf,
+)
+from aidial_assistant.utils.open_ai_plugin import get_open_ai_plugin_infos
+from aidial_assistant.utils.spec_cache import SpecCache
+
+DELAY = 0.2
+SPEC = """openapi: 3.0.1
+info:
+  title: {name}
+  version: v1
+paths: {{}}
+"""
+
+
+def _cache() -> MetadataCache:
+    return MetadataCache(MetadataCacheConf())
+
+
+def _ai_plugin(name: str) -> dict:
+    return {
+        "schema_version": "v1",
+        "name_for_model": name,
+        "name_for_human": name,
+        "description_for_model": name,
+        "description_for_human": name,
+        "auth": {"type": "none"},
+        "api": {"type": "openapi", "url": f"/{name}/openapi.yaml"},
+        "logo_url": "",
+        "contact_email": "",
+        "legal_info_url": "",
+    }
+
+
+def _addons_app(delays: dict[str, float]) -> web.Application:
+    async def ai_plugin(request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        if name not in delays:
+            return web.Response(status=404, text=f"{name} not found")
+
+        await asyncio.sleep(delays[name] / 2)
+        if name == "invalid":
+            return web.json_response({"name": name})
+
+        return web.json_response(_ai_plugin(name))
+
+    async def openapi(request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        await asyncio.sleep(delays[name] / 2)
+        return web.Response(text=SPEC.format(name=name))
+
+    app = web.Application()
+    app.router.add_get("/{name}/.well-known/ai-plugin.json", ai_plugin)
+    app.router.add_get("/{name}/openapi.yaml", openapi)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_addons_are_loaded_concurrently_in_order():
+    names = ["first", "second", "third"]
+    async with TestServer(
+        _addons_app({name: DELAY for name in names})
+    ) as server:
+        urls = [
+            str(server.make_url(f"/{name}/.well-known/ai-plugin.json"))
+            for name in reversed(names)
+        ]
+
+        started_at = time.monotonic()
+        infos = await get_open_ai_plugin_infos(urls, 10, _cache())
+        elapsed = time.monotonic() - started_at
+
+    assert [info.ai_plugin.name_for_model for info in infos] == list(
+        reversed(names)
+    )
+    assert [info.open_api.info.title for info in infos] == list(reversed(names))
+    assert elapsed < DELAY * len(names)
+
+
+@pytest.mark.asyncio
+async def test_error_of_the_first_failed_addon_is_raised():
+    async with TestServer(_addons_app({"invalid": DELAY})) as server:
+        urls = [
+            str(server.make_url(f"/{name}/.well-known/ai-plugin.json"))
+            for name in ["invalid", "missing"]
+        ]
+
+        # The missing addon fails first, but it comes second in the list
+        with pytest.raises(ValidationError):
+            await get_open_ai_plugin_infos(urls, 10, _cache())
+
+
+@pytest.mark.asyncio
+async def test_addon_load_timeout():
+    async with TestServer(_addons_app({"slow": 10})) as server:
+        url = str(server.make_url("/slow/.well-known/ai-plugin.json"))
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_open_ai_plugin_infos([url], 0.1, _cache())
+
+    assert exc_info.value.status_code == 504
+    assert exc_info.value.detail == f"Timed out loading addon {url}"
+
+
+@pytest.mark.asyncio
+async def test_parsed_specs_are_cached_on_disk(tmp_path: Path):
+    async with TestServer(_addons_app({"first": 0})) as server:
+        urls = [str(server.make_url("/first/.well-known/ai-plugin.json"))]
+
+        # Each worker has its own metadata cache, but they share the spec cache
+        [first] = await get_open_ai_plugin_infos(
+            urls, 10, _cache(), SpecCache(tmp_path)
+        )
+        spec_cache = SpecCache(tmp_path)
+        [second] = await get_open_ai_plugin_infos(
+            urls, 10, _cache(), spec_cache
+        )
+
+    assert second.open_api == first.open_api
+    assert second.open_api_hash == first.open_api_hash
+    assert (spec_cache.hits, spec_cache.misses) == (1, 0)
@@ -0,0 +1,77 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aidial_assistant.utils.requests import (
+    HTTPClientConf,
+    aget,
+    close_session,
+    open_session,
+)
+
+
+def _echo_app() -> web.Application:
+    async def echo(request: web.Request) -> web.Response:
+        assert request.transport is not None
+        response = web.json_response(
+            {
+                "peer": list(request.transport.get_extra_info("peername")),
+                "authorization": request.headers.get("Authorization"),
+                "cookie": request.headers.get("Cookie"),
+            }
+        )
+        response.set_cookie("session", request.headers["Authorization"])
+        return response
+
+    app = web.Application()
+    app.router.add_get("/", echo)
+    return app
+
+
+async def _get_all(url: str) -> list[dict]:
+    results = []
+    for token in ["first", "second"]:
+        async with aget(url, {"Authorization": token}) as response:
+            results.append(await response.json())
+
+    return results
+
+
+@pytest.mark.asyncio
+async def test_shared_session_reuses_connections():
+    async with TestServer(_echo_app()) as server:
+        url = str(server.make_url("/"))
+        await open_session(HTTPClientConf())
+        try:
+            first, second = await _get_all(url)
+        finally:
+            await close_session()
+
+    assert first["peer"] == second["peer"]
+    assert first["authorization"] == "first"
+    assert second["authorization"] == "second"
+
+
+@pytest.mark.asyncio
+async def test_session_per_request_without_shared_session():
+    async with TestServer(_echo_app()) as server:
+        first, second = await _get_all(str(server.make_url("/")))
+
+    assert first["peer"] != second["peer"]
+    assert first["authorization"] == "first"
+    assert second["authorization"] == "second"
+
+
+@pytest.mark.asyncio
+async def test_shared_session_does_not_keep_cookies():
+    # The default cookie jar ignores cookies of IP addresses
+    async with TestServer(_echo_app(), host="localhost") as server:
+        url = str(server.make_url("/"))
+        await open_session(HTTPClientConf())
+        try:
+            first, second = await _get_all(url)
+        finally:
+            await close_session()
+
+    assert first["cookie"] is None
+    assert second["cookie"] is None
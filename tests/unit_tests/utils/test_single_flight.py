@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from aidial_assistant.utils.single_flight import SingleFlight
+
+
+class Execution:
+    def __init__(self, result: str | Exception = "result"):
+        self.result = result
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+        if isinstance(self.result, Exception):
+            raise self.result
+
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_coalesced():
+    single_flight: SingleFlight[str, str] = SingleFlight()
+    execution = Execution()
+
+    tasks = [
+        asyncio.create_task(single_flight.run("key", execution))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    execution.release.set()
+
+    assert await asyncio.gather(*tasks) == ["result"] * 3
+    assert execution.calls == 1
+    assert "key" not in single_flight
+
+
+@pytest.mark.asyncio
+async def test_error_is_propagated_to_all_callers():
+    single_flight: SingleFlight[str, str] = SingleFlight()
+    error = ValueError("error")
+    execution = Execution(error)
+
+    tasks = [
+        asyncio.create_task(single_flight.run("key", execution))
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    execution.release.set()
+
+    assert await asyncio.gather(*tasks, return_exceptions=True) == [error] * 2
+
+    # Errors aren't remembered
+    execution.result = "result"
+    assert await single_flight.run("key", execution) == "result"
+    assert execution.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_affect_others():
+    single_flight: SingleFlight[str, str] = SingleFlight()
+    execution = Execution()
+
+    cancelled = asyncio.create_task(single_flight.run("key", execution))
+    waiting = asyncio.create_task(single_flight.run("key", execution))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    execution.release.set()
+
+    assert await waiting == "result"
+    assert cancelled.cancelled()
+    assert not execution.cancelled
+
+
+@pytest.mark.asyncio
+async def test_execution_is_cancelled_without_callers():
+    single_flight: SingleFlight[str, str] = SingleFlight()
+    execution = Execution()
+
+    task = asyncio.create_task(single_flight.run("key", execution))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+
+    assert execution.cancelled
+    assert "key" not in single_flight
@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from langchain.tools import OpenAPISpec
+
+from aidial_assistant.utils.spec_cache import SpecCache
+
+URL = "https://addon.example.com/openapi.yaml"
+SPEC = """openapi: 3.0.1
+info:
+  title: {title}
+  version: v1
+servers:
+  - url: https://addon.example.com/api
+paths:
+  /forecast/{{city}}:
+    get:
+      operationId: getForecast
+      parameters:
+        - name: city
+          in: path
+          required: true
+          schema:
+            type: string
+"""
+
+
+def _spec(title: str) -> OpenAPISpec:
+    return OpenAPISpec.from_text(SPEC.format(title=title))  # type: ignore
+
+
+def test_spec_is_shared_between_instances(tmp_path: Path):
+    spec = _spec("first")
+    SpecCache(tmp_path).put(URL, "v1", spec)
+
+    cache = SpecCache(tmp_path)
+
+    assert cache.get(URL, "v1") == spec
+    assert cache.get(URL, "v2") is None
+    assert cache.get("https://other.example.com", "v1") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_previous_versions_are_removed(tmp_path: Path):
+    cache = SpecCache(tmp_path)
+    cache.put(URL, "v1", _spec("first"))
+    cache.put(URL, "v2", _spec("second"))
+
+    assert cache.get(URL, "v1") is None
+    assert cache.get(URL, "v2") == _spec("second")
+    assert [path.suffix for path in tmp_path.rglob("*.*")] == [".json"]
+
+
+def test_corrupted_entry_is_removed(tmp_path: Path):
+    cache = SpecCache(tmp_path)
+    cache.put(URL, "v1", _spec("first"))
+    [path] = tmp_path.rglob("*.json")
+    path.write_text('{"openapi": "3.0.1"}')
+
+    assert cache.get(URL, "v1") is None
+    assert not path.exists()
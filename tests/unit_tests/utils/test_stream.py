@@ -0,0 +1,64 @@
+import asyncio
+from typing import AsyncIterator
+
+import pytest
+
+from aidial_assistant.utils.stream import PrefetchStream
+
+
+class Source:
+    def __init__(self, error: Exception | None = None):
+        self.error = error
+        self.read = 0
+
+    async def stream(self) -> AsyncIterator[str]:
+        for item in ["a", "b", "c"]:
+            self.read += 1
+            yield item
+        if self.error:
+            raise self.error
+
+
+@pytest.mark.asyncio
+async def test_source_is_read_ahead_of_consumer():
+    source = Source()
+    stream = PrefetchStream(source.stream())
+
+    assert await anext(stream) == "a"
+    await asyncio.sleep(0)
+
+    assert source.read == 3
+    assert stream.finished_at is not None
+    assert [item async for item in stream] == ["b", "c"]
+    assert [item async for item in stream] == []
+
+
+@pytest.mark.asyncio
+async def test_error_is_raised_after_items():
+    error = ValueError("error")
+    stream = PrefetchStream(Source(error).stream())
+
+    items = []
+    with pytest.raises(ValueError) as exc_info:
+        async for item in stream:
+            items.append(item)
+
+    assert items == ["a", "b", "c"]
+    assert exc_info.value is error
+
+
+@pytest.mark.asyncio
+async def test_close_stops_reading():
+    read = asyncio.Event()
+
+    async def endless() -> AsyncIterator[str]:
+        while True:
+            read.set()
+            yield "a"
+            await asyncio.sleep(0.01)
+
+    stream = PrefetchStream(endless())
+    await read.wait()
+    await stream.aclose()
+
+    assert stream.finished_at is not None